@@ -0,0 +1,181 @@
+import logging
+from collections import Counter, defaultdict
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+from clients import get_meta_container
+
+SENTIMENT_BINS = 20  # equal-width bins over [-1, 1]
+RESPONSIBILITY_BINS = 10  # 1-10, 11-20, ..., 91-100
+TOP_HASHTAGS = 20
+SUMMARY_FIELDS = ["id", "granularity", "period", "tweet_count", "sentiment", "responsibility",
+                  "top_hashtags", "updated_through"]
+
+
+def aggregate_ids(created_at):
+    # created_at looks like 2024-07-01T13:45:00.000Z
+    return {"hour": f"agg-hour-{created_at[:13]}", "day": f"agg-day-{created_at[:10]}"}
+
+
+def _contribution(tweet):
+    sentiment = tweet.get("sentiment") or {}
+    social_responsibility = tweet.get("social_responsibility") or {}
+    return {
+        "sentiment": sentiment.get("sentiment_score"),
+        "rating": social_responsibility.get("rating"),
+        "hashtags": sorted(set(tag.lower() for tag in tweet.get("hashtags") or [])),
+        "created_at": tweet["created_at"]
+    }
+
+
+def _sentiment_bin(score):
+    return min(SENTIMENT_BINS - 1, max(0, int((score + 1) / 2 * SENTIMENT_BINS)))
+
+
+def _responsibility_bin(rating):
+    return min(RESPONSIBILITY_BINS - 1, max(0, (int(rating) - 1) // 10))
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _summarize(document):
+    contributions = document["contributions"].values()
+    scores = sorted(c["sentiment"] for c in contributions if c["sentiment"] is not None)
+    ratings = [c["rating"] for c in contributions if c["rating"] is not None]
+    hashtags = Counter(tag for c in contributions for tag in c["hashtags"])
+
+    sentiment_histogram = [0] * SENTIMENT_BINS
+    for score in scores:
+        sentiment_histogram[_sentiment_bin(score)] += 1
+    responsibility_histogram = [0] * RESPONSIBILITY_BINS
+    for rating in ratings:
+        responsibility_histogram[_responsibility_bin(rating)] += 1
+
+    document["tweet_count"] = len(document["contributions"])
+    document["sentiment"] = {
+        "count": len(scores),
+        "sum": sum(scores),
+        "mean": sum(scores) / len(scores) if scores else None,
+        "p10": _percentile(scores, 0.10),
+        "p50": _percentile(scores, 0.50),
+        "p90": _percentile(scores, 0.90),
+        "histogram": sentiment_histogram
+    }
+    document["responsibility"] = {
+        "count": len(ratings),
+        "sum": sum(ratings),
+        "mean": sum(ratings) / len(ratings) if ratings else None,
+        "histogram": responsibility_histogram
+    }
+    document["top_hashtags"] = hashtags.most_common(TOP_HASHTAGS)
+    document["updated_through"] = max(c["created_at"] for c in contributions) if contributions else None
+    return document
+
+
+def _apply(aggregate_id, granularity, tweets, attempts=5):
+    meta_container = get_meta_container()
+    for _ in range(attempts):
+        try:
+            current = meta_container.read_item(item=aggregate_id, partition_key=aggregate_id)
+        except exceptions.CosmosResourceNotFoundError:
+            current = None
+
+        document = dict(current or {"id": aggregate_id, "type": "aggregate", "granularity": granularity,
+                                    "period": aggregate_id.split("-", 2)[2], "contributions": {}})
+        # Keyed by tweet id, so replays of the change feed and re-enriched tweets stay idempotent
+        for tweet in tweets:
+            document["contributions"][tweet["id"]] = _contribution(tweet)
+        _summarize(document)
+
+        try:
+            if current is None:
+                return meta_container.create_item(body=document)
+            return meta_container.replace_item(
+                item=aggregate_id, body=document,
+                etag=current["_etag"], match_condition=MatchConditions.IfNotModified)
+        except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceExistsError):
+            logging.info(f"Aggregate {aggregate_id} changed concurrently, retrying")
+
+    logging.error(f"Could not update aggregate {aggregate_id} after repeated conflicts")
+    return None
+
+
+def update_aggregates(tweets):
+    groups = defaultdict(list)
+    for tweet in tweets:
+        if not tweet.get("created_at"):
+            continue
+        for granularity, aggregate_id in aggregate_ids(tweet["created_at"]).items():
+            groups[(aggregate_id, granularity)].append(tweet)
+
+    for (aggregate_id, granularity), group in groups.items():
+        _apply(aggregate_id, granularity, group)
+    logging.info(f"Updated {len(groups)} aggregate documents from {len(tweets)} changes")
+    return len(groups)
+
+
+def get_aggregates(granularity="day", start=None, end=None):
+    """Fetch the precomputed summaries (without per-tweet contributions) for a period range."""
+    conditions = ["c.type = 'aggregate'", "c.granularity = @granularity"]
+    parameters = [{"name": "@granularity", "value": granularity}]
+    if start:
+        conditions.append("c.period >= @start")
+        parameters.append({"name": "@start", "value": start})
+    if end:
+        conditions.append("c.period < @end")
+        parameters.append({"name": "@end", "value": end})
+    query = (f"SELECT {', '.join(f'c.{field}' for field in SUMMARY_FIELDS)} FROM c "
+             f"WHERE {' AND '.join(conditions)} ORDER BY c.period DESC")
+    return list(get_meta_container().query_items(
+        query=query, parameters=parameters, enable_cross_partition_query=True))
+
+
+def combine_aggregates(aggregates):
+    """Merge period summaries into one, approximating percentiles from the histograms."""
+    sentiment_histogram = [0] * SENTIMENT_BINS
+    responsibility_histogram = [0] * RESPONSIBILITY_BINS
+    hashtags = Counter()
+    totals = Counter()
+    for aggregate in aggregates:
+        totals["tweets"] += aggregate["tweet_count"]
+        totals["sentiment_count"] += aggregate["sentiment"]["count"]
+        totals["sentiment_sum"] += aggregate["sentiment"]["sum"]
+        totals["responsibility_count"] += aggregate["responsibility"]["count"]
+        totals["responsibility_sum"] += aggregate["responsibility"]["sum"]
+        for i, count in enumerate(aggregate["sentiment"]["histogram"]):
+            sentiment_histogram[i] += count
+        for i, count in enumerate(aggregate["responsibility"]["histogram"]):
+            responsibility_histogram[i] += count
+        hashtags.update(dict(aggregate["top_hashtags"]))
+
+    def histogram_percentile(fraction):
+        target = fraction * totals["sentiment_count"]
+        running = 0
+        for i, count in enumerate(sentiment_histogram):
+            running += count
+            if count and running >= target:
+                # Midpoint of the bin
+                return -1 + (i + 0.5) * 2 / SENTIMENT_BINS
+        return None
+
+    return {
+        "tweet_count": totals["tweets"],
+        "sentiment": {
+            "count": totals["sentiment_count"],
+            "mean": totals["sentiment_sum"] / totals["sentiment_count"] if totals["sentiment_count"] else None,
+            "p10": histogram_percentile(0.10),
+            "p50": histogram_percentile(0.50),
+            "p90": histogram_percentile(0.90),
+            "histogram": sentiment_histogram
+        },
+        "responsibility": {
+            "count": totals["responsibility_count"],
+            "mean": (totals["responsibility_sum"] / totals["responsibility_count"]
+                     if totals["responsibility_count"] else None),
+            "histogram": responsibility_histogram
+        },
+        "top_hashtags": hashtags.most_common(TOP_HASHTAGS)
+    }
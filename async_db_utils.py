@@ -0,0 +1,120 @@
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from azure.cosmos import exceptions
+from clients import open_async_cosmos_client
+from cosmos_bulk import (RETRYABLE_STATUS_CODES, MAX_RETRIES, RU_BUDGET, RequestUnitLimiter,
+                         request_charge, retry_after_seconds)
+
+DEFAULT_CONCURRENCY = int(os.environ.get("COSMOS_ASYNC_CONCURRENCY", "32"))
+
+
+def container_name():
+    return os.environ.get("COSMOS_DB_CONTAINER_NAME", "tweets")
+
+
+@asynccontextmanager
+async def open_database():
+    # The aio client is bound to the running event loop, so it is opened per run
+    # rather than cached in the process-wide client registry.
+    async with open_async_cosmos_client() as client:
+        yield client.get_database_client(os.environ.get("COSMOS_DB_DATABASE_NAME", "tweets"))
+
+
+@asynccontextmanager
+async def open_container(name=None):
+    async with open_database() as database:
+        yield database.get_container_client(name or container_name())
+
+
+async def get_partition_key_path(container):
+    properties = await container.read()
+    return properties['partitionKey']['paths'][0]
+
+
+def partition_key_value(document, partition_key_path):
+    value = document
+    for part in partition_key_path.strip('/').split('/'):
+        value = value[part]
+    return value
+
+
+async def _with_retries(operation, stats, limiter, max_retries=MAX_RETRIES):
+    for attempt in range(max_retries + 1):
+        # Reserve the running average charge, then settle against the real one
+        estimate = stats['request_charge'] / max(1, stats['requests']) or 5.0
+        while (delay := limiter.delay_for(estimate)) > 0:
+            await asyncio.sleep(delay)
+        limiter.consume(estimate)
+        stats['requests'] += 1
+
+        headers = {}
+        try:
+            await operation(lambda response_headers, _: headers.update(response_headers))
+            stats['request_charge'] += request_charge(headers)
+            limiter.consume(request_charge(headers) - estimate)
+            return True
+        except exceptions.CosmosHttpResponseError as e:
+            stats['request_charge'] += request_charge(e.headers)
+            limiter.consume(request_charge(e.headers) - estimate)
+            if e.status_code in RETRYABLE_STATUS_CODES and attempt < max_retries:
+                if e.status_code == 429:
+                    stats['throttled'] += 1
+                await asyncio.sleep(retry_after_seconds(e.headers))
+                continue
+            raise
+
+
+async def _iterate(documents):
+    if hasattr(documents, '__aiter__'):
+        async for document in documents:
+            yield document
+    else:
+        for document in documents:
+            yield document
+
+
+async def _run_bounded(documents, make_operation, concurrency, label, ru_budget=None):
+    # A fixed pool of workers pulls from the (possibly async) iterable, so memory
+    # stays bounded no matter how many documents are streamed through.
+    stats = {'succeeded': 0, 'not_found': 0, 'conflicts': 0, 'failed': 0,
+             'throttled': 0, 'requests': 0, 'request_charge': 0.0}
+    limiter = RequestUnitLimiter(ru_budget)
+    source = _iterate(documents)
+    source_lock = asyncio.Lock()
+
+    async def next_document():
+        async with source_lock:
+            return await anext(source, None)
+
+    async def worker():
+        while (document := await next_document()) is not None:
+            try:
+                await _with_retries(make_operation(document), stats, limiter)
+                stats['succeeded'] += 1
+            except exceptions.CosmosResourceNotFoundError:
+                stats['not_found'] += 1
+            except exceptions.CosmosResourceExistsError:
+                stats['conflicts'] += 1
+            except exceptions.CosmosHttpResponseError as e:
+                stats['failed'] += 1
+                logging.error(f"Failed to {label} item {document['id']}: {str(e)}")
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    logging.info(f"Async {label} complete. "
+                 f"Succeeded: {stats['succeeded']}, Failed: {stats['failed']}, "
+                 f"Throttled: {stats['throttled']}, RU consumed: {stats['request_charge']:.1f}")
+    return stats
+
+
+async def delete_items(container, items, partition_key_path=None, concurrency=DEFAULT_CONCURRENCY,
+                       ru_budget=RU_BUDGET):
+    """Delete items given as dicts holding `id` and the partition key field."""
+    partition_key_path = partition_key_path or await get_partition_key_path(container)
+
+    def make_operation(item):
+        return lambda hook: container.delete_item(
+            item=item['id'], partition_key=partition_key_value(item, partition_key_path),
+            response_hook=hook)
+    return await _run_bounded(items, make_operation, concurrency, "delete", ru_budget)
@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import functools
+import tracemalloc
+from datetime import datetime, timezone
+
+# Run from the repository root so the function modules are importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import openai  # noqa: E402
+import requests  # noqa: E402
+import clients  # noqa: E402
+import function_app  # noqa: E402
+import http_transport  # noqa: E402
+import tracing  # noqa: E402
+import metrics  # noqa: E402
+import pipeline  # noqa: E402
+import reference_cache  # noqa: E402
+import near_duplicates  # noqa: E402
+import records  # noqa: E402
+from local_blob import InMemoryBlobServiceClient  # noqa: E402
+from local_cosmos import LocalCosmosClient  # noqa: E402
+from local_queue import InMemoryQueueServiceClient  # noqa: E402
+from fakes import FakeOpenAIClient, FakeTwitterSession, synthetic_timeline  # noqa: E402
+
+SCENARIOS = ["basic", "media_heavy", "reply_heavy"]
+
+# function_app attributes timed as stages (each name is looked up on function_app at call time)
+STAGES = ["load_from_blob", "get_watermark", "enrich_batch", "enrich_tweet", "persist_tweets",
+          "lookup_reference", "referenced_tweet_id_lookup",
+          "analyze_image_with_gpt4o", "advanced_analyze_tweet_content", "analyze_tweet_sentiment",
+          "evaluate_social_responsibility", "save_to_blob", "insert_tweets_into_db", "update_watermark"]
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, name, elapsed):
+        stage = self.stages.setdefault(name, {"calls": 0, "total_s": 0.0, "max_ms": 0.0})
+        stage["calls"] += 1
+        stage["total_s"] += elapsed
+        stage["max_ms"] = max(stage["max_ms"], elapsed * 1000)
+
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - started)
+        return timed
+
+    def report(self):
+        return {name: dict(stage, total_s=round(stage["total_s"], 6),
+                           mean_ms=round(stage["total_s"] * 1000 / stage["calls"], 3),
+                           max_ms=round(stage["max_ms"], 3))
+                for name, stage in self.stages.items()}
+
+
+def _archive(count):
+    if not count:
+        return []
+    return [records.migrate(dict(tweet, image_descriptions=[], image_urls=[], referenced_tweets=[],
+                                 keywords=[], hashtags=[], named_entities=[]))
+            for tweet in synthetic_timeline("basic", count=count, seed=1)["data"]]
+
+
+def _http_stats(twitter, openai_client, cassette):
+    if cassette is not None:
+        return {"http": cassette.stats["requests"]}, {"http_sent": cassette.stats["bytes_sent"],
+                                                      "http_received": cassette.stats["bytes_received"]}, None
+    calls = {"twitter": twitter.stats["requests"], "twitter_lookups": twitter.stats["lookup_requests"],
+             "openai": openai_client.stats["requests"], "openai_vision": openai_client.stats["vision_requests"]}
+    transferred = {"twitter_received": twitter.stats["bytes_received"],
+                   "openai_sent": openai_client.stats["bytes_sent"],
+                   "openai_received": openai_client.stats["bytes_received"]}
+    tokens = openai_client.stats["prompt_tokens"] + openai_client.stats["completion_tokens"]
+    return calls, transferred, tokens
+
+
+def run_scenario(scenario, args, timeline=None):
+    cassette = None
+    if args.cassette:
+        # Replay recorded Twitter/OpenAI exchanges through the real clients
+        cassette = http_transport.Cassette(args.cassette, "replay", time_scale=args.time_scale)
+        twitter = http_transport.install(requests.Session(), cassette)
+        openai_client = openai.Client(api_key="replay", http_client=http_transport.httpx_client(cassette))
+    else:
+        timeline = timeline or synthetic_timeline(scenario, count=args.tweets)
+        twitter = FakeTwitterSession(timeline, latency=args.twitter_latency_ms / 1000)
+        openai_client = FakeOpenAIClient(latency=args.openai_latency_ms / 1000)
+    blob_service = InMemoryBlobServiceClient(latency=args.blob_latency_ms / 1000)
+    cosmos = LocalCosmosClient(default_partition_key_path=args.partition_key_path,
+                               throughput=args.cosmos_throughput, latency=args.cosmos_latency_ms / 1000)
+
+    clients.reset_clients()
+    clients.MANAGE_INDEXING_POLICY = args.indexing_policy == "managed"
+    clients.set_client(clients.HTTP_SESSION, twitter)
+    clients.set_client(clients.OPENAI, openai_client)
+    clients.set_client(clients.BLOB_SERVICE, blob_service)
+    clients.set_client(clients.COSMOS, cosmos)
+    clients.set_client(clients.QUEUE_SERVICE, InMemoryQueueServiceClient())
+    pipeline.PIPELINE_MODE = args.pipeline
+
+    # Seed the archive (and matching Cosmos documents) so load/save costs are realistic
+    archive = _archive(args.archive_size)
+    if archive:
+        function_app.save_to_blob(archive)
+        function_app.insert_tweets_into_db(archive)
+    baseline_blob = dict(blob_service.stats)
+    tweets_container = clients.get_cosmos_container()
+    baseline_cosmos = dict(tweets_container.stats)
+
+    timer = StageTimer()
+    originals = {name: getattr(function_app, name) for name in STAGES}
+    original_get = twitter.get
+    twitter.get = timer.wrap("twitter_http_get", original_get)
+    for name, function in originals.items():
+        setattr(function_app, name, timer.wrap(name, function))
+
+    tracing.reset()
+    metrics.reset()
+    reference_cache.clear()
+    near_duplicates.clear()
+    if args.memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        function_app.main()
+        if pipeline.is_queued():
+            function_app.drain_queues(workers=args.workers)
+    finally:
+        wall_time = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1] if args.memory else None
+        if args.memory:
+            tracemalloc.stop()
+        for name, function in originals.items():
+            setattr(function_app, name, function)
+        twitter.get = original_get
+
+    meta_container = clients.get_meta_container()
+    insert_charge = sum(value for labels, value in metrics.snapshot().get("cosmos_request_charge_total", [])
+                        if dict(labels).get("operation") == "insert")
+    calls, transferred, tokens = _http_stats(twitter, openai_client, cassette)
+    tweets = (len(list(tweets_container.read_all_items())) - len(archive) if timeline is None
+              else len(timeline.get("data", [])))
+    return {
+        "scenario": scenario,
+        "tweets": tweets,
+        "archive_size": args.archive_size,
+        "wall_time_s": round(wall_time, 6),
+        "tweets_per_second": round(tweets / wall_time, 3) if wall_time else None,
+        "peak_memory_bytes": peak_memory,
+        "stages": timer.report(),
+        "trace": tracing.stage_summaries(),
+        "calls": dict(calls, blob=blob_service.stats["requests"] - baseline_blob["requests"],
+                      cosmos=tweets_container.stats["requests"] - baseline_cosmos["requests"]
+                      + meta_container.stats["requests"]),
+        "bytes": dict(transferred,
+                      blob_uploaded=blob_service.stats["bytes_uploaded"] - baseline_blob["bytes_uploaded"],
+                      blob_downloaded=blob_service.stats["bytes_downloaded"] - baseline_blob["bytes_downloaded"]),
+        "openai_tokens": tokens,
+        "cosmos_request_charge": round(
+            tweets_container.stats["request_charge"] - baseline_cosmos["request_charge"]
+            + meta_container.stats["request_charge"], 2),
+        "cosmos_throttled": tweets_container.stats["throttled"] - baseline_cosmos["throttled"],
+        "cosmos_ru_per_insert": round(insert_charge / tweets, 3) if tweets else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the polling pipeline on fakes.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS + ["all"],
+                        help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--fixture", help="Replay a recorded users/:id/tweets response (JSON file)")
+    parser.add_argument("--cassette", help="Replay a cassette recorded with HTTP_CASSETTE_MODE=record")
+    parser.add_argument("--time-scale", type=float, default=0,
+                        help="Multiplier on recorded response times when replaying a cassette")
+    parser.add_argument("--pipeline", choices=["inline", "queued"], default="inline",
+                        help="Run the single-invocation flow or the queue-staged one (drained in-process)")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent enrich workers when queued")
+    parser.add_argument("--tweets", type=int, default=100)
+    parser.add_argument("--archive-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--twitter-latency-ms", type=float, default=0)
+    parser.add_argument("--openai-latency-ms", type=float, default=0)
+    parser.add_argument("--blob-latency-ms", type=float, default=0)
+    parser.add_argument("--cosmos-latency-ms", type=float, default=0)
+    parser.add_argument("--cosmos-throughput", type=float, default=None,
+                        help="Simulated provisioned RU/s (429s above it)")
+    parser.add_argument("--partition-key-path", default="/author_id")
+    parser.add_argument("--indexing-policy", choices=["managed", "default"], default="managed",
+                        help="Index only the queried paths, or every path like a container with no policy set")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="Skip tracemalloc peak-memory tracking (it slows the run)")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    runs = []
+    if args.cassette:
+        for _ in range(args.repeat):
+            runs.append(run_scenario(f"cassette:{os.path.basename(args.cassette)}", args))
+    elif args.fixture:
+        with open(args.fixture) as fixture_file:
+            recorded = json.load(fixture_file)
+        for _ in range(args.repeat):
+            runs.append(run_scenario(f"recorded:{os.path.basename(args.fixture)}", args, recorded))
+    else:
+        scenarios = SCENARIOS if not args.scenario or "all" in args.scenario else args.scenario
+        for scenario in scenarios:
+            for _ in range(args.repeat):
+                runs.append(run_scenario(scenario, args))
+
+    results = {
+        "benchmark": "pipeline",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "scenario")},
+        "results": runs
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    return results
+
+
+if __name__ == "__main__":
+    main()
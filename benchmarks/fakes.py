@@ -0,0 +1,174 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+USER_ID = "44196397"
+
+WORDS = ("rocket launch starship tesla model battery factory production engine orbit mars "
+         "free speech platform algorithm update users great exactly interesting wow true "
+         "autopilot neural network energy solar grid cost reduction team progress").split()
+HASHTAGS = ["SpaceX", "Tesla", "Starship", "AI", "Mars"]
+
+
+# ---------------------------------------------------------------------------
+# Synthetic Twitter responses
+# ---------------------------------------------------------------------------
+
+def _text(rng, words=(6, 30)):
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(*words))).capitalize()
+    if rng.random() < 0.2:
+        text += f" #{rng.choice(HASHTAGS)}"
+    return text
+
+
+def synthetic_timeline(scenario, count=100, seed=7, start=None):
+    """Build a users/:id/tweets response for one of: basic, media_heavy, reply_heavy."""
+    rng = random.Random(seed)
+    start = start or datetime(2024, 7, 1, tzinfo=timezone.utc)
+    tweets, media, referenced = [], [], []
+    for i in range(count):
+        tweet_id = str(1800000000000000000 + seed * 1000000 + i)
+        tweet = {
+            "id": tweet_id,
+            "text": _text(rng),
+            "created_at": (start + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "author_id": USER_ID,
+            "edit_history_tweet_ids": [tweet_id]
+        }
+        if scenario == "media_heavy" or (scenario == "basic" and rng.random() < 0.1):
+            keys = []
+            for m in range(rng.randint(1, 4)):
+                media_key = f"3_{tweet_id}_{m}"
+                keys.append(media_key)
+                if rng.random() < 0.7:
+                    media.append({"media_key": media_key, "type": "photo",
+                                  "url": f"https://pbs.example.com/media/{media_key}.jpg"})
+                else:
+                    media.append({"media_key": media_key, "type": "video",
+                                  "preview_image_url": f"https://pbs.example.com/preview/{media_key}.jpg"})
+            tweet["attachments"] = {"media_keys": keys}
+        if scenario == "reply_heavy" or (scenario == "basic" and rng.random() < 0.3):
+            # A small pool of popular tweets gets referenced over and over
+            ref_id = str(1790000000000000000 + rng.randint(0, 15))
+            kind = rng.choice(["replied_to", "quoted"])
+            tweet["referenced_tweets"] = [{"type": kind, "id": ref_id}]
+            if scenario == "reply_heavy" and rng.random() < 0.5:
+                tweet["text"] = rng.choice(["Exactly", "!!", "Yes", "True", "Interesting", "Wow"])
+            referenced.append({"id": ref_id, "text": _text(rng), "author_id": "12345"})
+        tweets.append(tweet)
+
+    tweets.reverse()  # the API returns newest first
+    response = {"data": tweets, "meta": {"result_count": len(tweets),
+                                         "newest_id": tweets[0]["id"], "oldest_id": tweets[-1]["id"]}}
+    includes = {}
+    if media:
+        includes["media"] = media
+    if referenced:
+        includes["tweets"] = referenced
+    if includes:
+        response["includes"] = includes
+    return response
+
+
+def referenced_tweet_response(tweet_id, seed=11):
+    rng = random.Random(f"{seed}-{tweet_id}")
+    tweet = {"id": tweet_id, "text": _text(rng), "author_id": "12345",
+             "created_at": "2024-06-30T12:00:00.000Z"}
+    response = {"data": tweet, "includes": {"users": [{"id": "12345", "name": "Someone", "username": "someone"}]}}
+    if rng.random() < 0.4:
+        media_key = f"3_{tweet_id}_0"
+        tweet["attachments"] = {"media_keys": [media_key]}
+        response["includes"]["media"] = [{"media_key": media_key, "type": "photo",
+                                          "url": f"https://pbs.example.com/media/{media_key}.jpg"}]
+    return response
+
+
+# ---------------------------------------------------------------------------
+# Fake endpoints
+# ---------------------------------------------------------------------------
+
+class FakeResponse:
+
+    def __init__(self, payload, status_code=200, headers=None):
+        self.content = json.dumps(payload).encode("utf-8")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeTwitterSession:
+    """Serves a timeline response and referenced-tweet lookups in place of requests.Session."""
+
+    def __init__(self, timeline, latency=0.0):
+        self.timeline = timeline
+        self.latency = latency
+        self.stats = {"requests": 0, "bytes_received": 0, "timeline_requests": 0, "lookup_requests": 0}
+        self.rate_limit_remaining = 900
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.stats["requests"] += 1
+        self.rate_limit_remaining -= 1
+        if "/users/" in url:
+            self.stats["timeline_requests"] += 1
+            response = FakeResponse(self.timeline)
+        else:
+            self.stats["lookup_requests"] += 1
+            response = FakeResponse(referenced_tweet_response(url.rstrip("/").rsplit("/", 1)[1]))
+        response.headers = {"x-rate-limit-limit": "900",
+                            "x-rate-limit-remaining": str(self.rate_limit_remaining)}
+        self.stats["bytes_received"] += len(response.content)
+        return response
+
+
+class FakeOpenAIClient:
+    """Answers the three prompt shapes utils.py sends, in the formats it parses."""
+
+    def __init__(self, latency=0.0, seed=3):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "vision_requests": 0, "sentiment_requests": 0,
+                      "responsibility_requests": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                      "bytes_sent": 0, "bytes_received": 0}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.stats["requests"] += 1
+        prompt = json.dumps(messages)
+        system = messages[0]["content"] if messages[0]["role"] == "system" else ""
+        if isinstance(messages[-1]["content"], list):
+            self.stats["vision_requests"] += 1
+            content = "A photo of a rocket on a launch pad at dusk, with engineers in the foreground."
+        elif "sentiment" in system:
+            self.stats["sentiment_requests"] += 1
+            content = (f"Sentiment rating: {self.rng.uniform(-1, 1):.2f}\n"
+                       "Explanation: The tweet is upbeat about engineering progress and "
+                       "celebrates the team's achievement while teasing future plans.\n"
+                       "Key factors: enthusiasm, technology, progress")
+        else:
+            self.stats["responsibility_requests"] += 1
+            content = ("Given his reach, the tweet mostly shares product news without making "
+                       "claims that could move markets or mislead followers. " * 6
+                       + f"\n\nRating: {self.rng.randint(20, 95)}")
+
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += completion_tokens
+        self.stats["bytes_sent"] += len(prompt)
+        self.stats["bytes_received"] += len(content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens))
@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Time budget for one function invocation. The Functions host kills a run at
+# functionTimeout (5 minutes on the Consumption plan unless host.json says
+# otherwise); stages stop starting new work once what is left would not cover
+# the typical cost of the next unit plus SAFETY_MARGIN for committing results.
+FUNCTION_TIMEOUT = float(os.environ.get("FUNCTION_TIMEOUT_SECONDS", "300"))
+SAFETY_MARGIN = float(os.environ.get("RUN_BUDGET_MARGIN_SECONDS", "30"))
+INITIAL_ESTIMATE = float(os.environ.get("RUN_BUDGET_INITIAL_ESTIMATE_SECONDS", "10"))
+SMOOTHING = 0.3
+
+_current = contextvars.ContextVar("run_budget", default=None)
+_estimates = {}  # unit name -> moving average of seconds per unit, kept across warm invocations
+_lock = threading.Lock()
+
+
+class RunBudget:
+
+    def __init__(self, seconds=None, margin=None):
+        self.seconds = FUNCTION_TIMEOUT if seconds is None else seconds
+        self.margin = SAFETY_MARGIN if margin is None else margin
+        self.started = time.monotonic()
+        self.deadline = self.started + self.seconds - self.margin
+        self.exhausted = False
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def can_start(self, unit=None):
+        """True if there is time for one more `unit` of work (by its running estimate)."""
+        if self.remaining() >= estimate(unit):
+            return True
+        self.exhausted = True
+        return False
+
+
+class _Unlimited:
+
+    exhausted = False
+
+    def remaining(self):
+        return float("inf")
+
+    def can_start(self, unit=None):
+        return True
+
+
+UNLIMITED = _Unlimited()
+
+
+def current():
+    """The budget for this invocation, or an unlimited one outside run_budget()."""
+    return _current.get() or UNLIMITED
+
+
+@contextmanager
+def run_budget(seconds=None, margin=None):
+    budget = RunBudget(seconds, margin)
+    token = _current.set(budget)
+    try:
+        yield budget
+    finally:
+        _current.reset(token)
+
+
+def estimate(unit):
+    if unit is None:
+        return 0.0
+    with _lock:
+        return _estimates.get(unit, INITIAL_ESTIMATE)
+
+
+def observe(unit, seconds):
+    with _lock:
+        previous = _estimates.get(unit)
+        _estimates[unit] = seconds if previous is None else previous + SMOOTHING * (seconds - previous)
+
+
+@contextmanager
+def measure(unit):
+    """Time one unit of work to refine its estimate."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(unit, time.monotonic() - started)
@@ -0,0 +1,314 @@
+import os
+import logging
+import threading
+import openai
+from requests import Session
+from requests.adapters import HTTPAdapter
+from azure.core.exceptions import ResourceExistsError
+from azure.core.pipeline.transport import RequestsTransport
+from azure.cosmos import CosmosClient, PartitionKey
+from azure.storage.blob import BlobServiceClient
+import http_transport
+import metrics
+
+# Connection-pool settings shared by every Azure client created in this worker
+POOL_CONNECTIONS = int(os.environ.get("AZURE_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.environ.get("AZURE_POOL_MAXSIZE", "16"))
+CONNECTION_TIMEOUT = int(os.environ.get("AZURE_CONNECTION_TIMEOUT", "10"))
+READ_TIMEOUT = int(os.environ.get("AZURE_READ_TIMEOUT", "60"))
+
+# "azure" talks to the real services; "memory" and "sqlite" use the in-process
+# stand-ins from local_cosmos/local_blob (sqlite also keeps blobs on disk)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "azure")
+LOCAL_STORAGE_PATH = os.environ.get("LOCAL_STORAGE_PATH", ".local_storage")
+
+# Registry keys
+BLOB_SERVICE = "blob_service"
+QUEUE_SERVICE = "queue_service"
+COSMOS = "cosmos"
+OPENAI = "openai"
+HTTP_SESSION = "http_session"
+COSMOS_CONTAINER = "cosmos_container"
+COSMOS_PARTITION_KEY_PATH = "cosmos_partition_key_path"
+COSMOS_META_CONTAINER = "cosmos_meta_container"
+COSMOS_CONTAINER_PROPERTIES = "cosmos_container_properties"
+
+# Small bookkeeping documents (watermarks, checkpoints) live in their own container keyed by /id
+META_CONTAINER_NAME = os.environ.get("COSMOS_DB_META_CONTAINER_NAME", "meta")
+
+# The tweets container indexes only what queries filter or sort on; tweet text,
+# referenced tweets, image descriptions and model prose stay out of the index,
+# which keeps the write charge of every upsert down. Applied on first use unless
+# COSMOS_MANAGE_INDEXING_POLICY is turned off. Cosmos always indexes id and _ts.
+MANAGE_INDEXING_POLICY = os.environ.get("COSMOS_MANAGE_INDEXING_POLICY", "true").lower() == "true"
+TWEETS_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "automatic": True,
+    "includedPaths": [
+        {"path": "/created_at/?"},
+        {"path": "/author_id/?"},
+        {"path": "/enrichment_pending/?"},
+        {"path": "/schema_version/?"},
+        {"path": "/sentiment/sentiment_score/?"},
+        {"path": "/social_responsibility/rating/?"}
+    ],
+    "excludedPaths": [{"path": "/*"}, {"path": "/\"_etag\"/?"}],
+    "compositeIndexes": [
+        # WHERE author_id = @author_id ORDER BY created_at DESC (watermark seeding)
+        [{"path": "/author_id", "order": "ascending"}, {"path": "/created_at", "order": "descending"}],
+        # WHERE enrichment_pending = true ORDER BY created_at DESC (re-enrichment)
+        [{"path": "/enrichment_pending", "order": "ascending"}, {"path": "/created_at", "order": "descending"}],
+        # ORDER BY created_at DESC, id DESC (keyset paging in the query API and dashboard)
+        [{"path": "/created_at", "order": "descending"}, {"path": "/id", "order": "descending"}]
+    ]
+}
+
+_clients = {}
+_ensured_blob_containers = set()
+_ensured_queues = set()
+_lock = threading.RLock()
+
+
+def _build_session():
+    session = Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _build_transport():
+    session = _build_session()
+    return RequestsTransport(session=session, session_owner=False,
+                             connection_timeout=CONNECTION_TIMEOUT,
+                             read_timeout=READ_TIMEOUT)
+
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            logging.info(f"Initializing {name} for this worker")
+            client = factory()
+            _clients[name] = client
+        return client
+
+
+def set_client(name, client):
+    """Register a client (or a test fake) under `name`, replacing any cached one."""
+    with _lock:
+        _clients[name] = client
+        if name == BLOB_SERVICE:
+            _ensured_blob_containers.clear()
+        elif name == QUEUE_SERVICE:
+            _ensured_queues.clear()
+        elif name == COSMOS:
+            _clients.pop(COSMOS_CONTAINER, None)
+            _clients.pop(COSMOS_PARTITION_KEY_PATH, None)
+            _clients.pop(COSMOS_CONTAINER_PROPERTIES, None)
+            _clients.pop(COSMOS_META_CONTAINER, None)
+        elif name == COSMOS_CONTAINER:
+            _clients.pop(COSMOS_PARTITION_KEY_PATH, None)
+            _clients.pop(COSMOS_CONTAINER_PROPERTIES, None)
+
+
+def reset_clients():
+    with _lock:
+        _clients.clear()
+        _ensured_blob_containers.clear()
+        _ensured_queues.clear()
+
+
+def use_local_storage(backend="memory", path=LOCAL_STORAGE_PATH, throughput=None, latency=0.0,
+                      partition_key_path="/id"):
+    """Register in-process Blob, Cosmos and Queue stand-ins in place of the Azure clients."""
+    from local_blob import InMemoryBlobServiceClient, FileSystemBlobServiceClient
+    from local_cosmos import LocalCosmosClient
+    from local_queue import InMemoryQueueServiceClient
+
+    if backend == "memory":
+        blob_service_client = InMemoryBlobServiceClient(latency=latency)
+        cosmos_client = LocalCosmosClient(default_partition_key_path=partition_key_path,
+                                          throughput=throughput, latency=latency)
+    elif backend == "sqlite":
+        os.makedirs(path, exist_ok=True)
+        blob_service_client = FileSystemBlobServiceClient(os.path.join(path, "blobs"), latency=latency)
+        cosmos_client = LocalCosmosClient(path=os.path.join(path, "cosmos.sqlite"),
+                                          default_partition_key_path=partition_key_path,
+                                          throughput=throughput, latency=latency)
+    else:
+        raise ValueError(f"Unknown local storage backend: {backend}")
+
+    # Queued messages are transient, so both backends keep them in memory
+    queue_service_client = InMemoryQueueServiceClient(latency=latency)
+
+    set_client(BLOB_SERVICE, blob_service_client)
+    set_client(COSMOS, cosmos_client)
+    set_client(QUEUE_SERVICE, queue_service_client)
+    logging.info(f"Using {backend} local storage backend")
+    return blob_service_client, cosmos_client
+
+
+def _local_or(name, factory):
+    def create():
+        if STORAGE_BACKEND != "azure":
+            use_local_storage(STORAGE_BACKEND)
+            return _clients[name]
+        return factory()
+    return create
+
+
+def get_blob_service_client():
+    return _get_or_create(BLOB_SERVICE, _local_or(BLOB_SERVICE, lambda: BlobServiceClient.from_connection_string(
+        os.environ["AZURE_STORAGE_CONNECTION_STRING"], transport=_build_transport())))
+
+
+def get_queue_service_client():
+    def factory():
+        # Only the staged pipeline needs the queue SDK
+        from azure.storage.queue import QueueServiceClient, TextBase64EncodePolicy, TextBase64DecodePolicy
+        # The Functions queue trigger expects base64-encoded message bodies
+        return QueueServiceClient.from_connection_string(
+            os.environ["AZURE_STORAGE_CONNECTION_STRING"], transport=_build_transport(),
+            message_encode_policy=TextBase64EncodePolicy(), message_decode_policy=TextBase64DecodePolicy())
+    return _get_or_create(QUEUE_SERVICE, _local_or(QUEUE_SERVICE, factory))
+
+
+def get_cosmos_client():
+    return _get_or_create(COSMOS, _local_or(COSMOS, lambda: CosmosClient(
+        os.environ["COSMOS_DB_ENDPOINT"], os.environ["COSMOS_DB_KEY"],
+        transport=_build_transport())))
+
+
+def open_async_cosmos_client():
+    """A new azure.cosmos.aio client for the running event loop, over the registered Cosmos client.
+
+    aio clients are bound to the loop that opened them, so they are not cached in the
+    registry; callers use the result as an async context manager. Local stand-ins
+    (set_client or use_local_storage) get their async view.
+    """
+    from local_cosmos import LocalCosmosClient, AsyncLocalCosmosClient
+    cosmos_client = _clients.get(COSMOS)
+    if cosmos_client is None and STORAGE_BACKEND != "azure":
+        cosmos_client = get_cosmos_client()
+    if isinstance(cosmos_client, LocalCosmosClient):
+        return AsyncLocalCosmosClient(cosmos_client)
+    from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
+    return AsyncCosmosClient(os.environ["COSMOS_DB_ENDPOINT"], os.environ["COSMOS_DB_KEY"])
+
+
+def get_http_session():
+    # Shared keep-alive session for the Twitter API (recorded/replayed when HTTP_CASSETTE_MODE is set)
+    return _get_or_create(HTTP_SESSION, lambda: http_transport.install(
+        _build_session(), pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE))
+
+
+def get_openai_client():
+    def factory():
+        # The response hook feeds the OpenAI rate-limit headers into /metrics
+        event_hooks = {"response": [metrics.observe_openai_response]}
+        http_client = http_transport.httpx_client(event_hooks=event_hooks)
+        if http_client is None:
+            return openai.Client(api_key=os.environ['OPENAI_API_KEY'],
+                                 http_client=openai.DefaultHttpxClient(event_hooks=event_hooks))
+        # Replays never reach the API, so a key is only needed when recording
+        return openai.Client(api_key=os.environ.get('OPENAI_API_KEY', 'replay'), http_client=http_client)
+    return _get_or_create(OPENAI, factory)
+
+
+def _policy_paths(indexing_policy):
+    # The service echoes policies back with quoting and extra defaults; compare only the paths
+    def paths(key):
+        return sorted(rule["path"].replace('"', '') for rule in indexing_policy.get(key, []))
+    composites = sorted([(part["path"], part.get("order", "ascending")) for part in composite]
+                        for composite in indexing_policy.get("compositeIndexes", []))
+    return paths("includedPaths"), paths("excludedPaths"), composites
+
+
+def apply_indexing_policy(database, container, indexing_policy=TWEETS_INDEXING_POLICY, properties=None):
+    """Replace the container's indexing policy when it differs; True if it was changed."""
+    properties = properties or container.read()
+    if _policy_paths(properties.get("indexingPolicy", {})) == _policy_paths(indexing_policy):
+        return False
+    partition_key = properties["partitionKey"]
+    logging.info(f"Applying the managed indexing policy to container {properties['id']}")
+    # replace_container replaces the whole definition, so the other settings are passed back as they are
+    database.replace_container(
+        container, partition_key=PartitionKey(path=partition_key["paths"][0],
+                                              kind=partition_key.get("kind", "Hash"),
+                                              version=partition_key.get("version", 2)),
+        indexing_policy=indexing_policy,
+        default_ttl=properties.get("defaultTtl"),
+        conflict_resolution_policy=properties.get("conflictResolutionPolicy"),
+        analytical_storage_ttl=properties.get("analyticalStorageTtl"))
+    return True
+
+
+def get_cosmos_container():
+    def factory():
+        database = get_cosmos_client().get_database_client(
+            os.environ.get("COSMOS_DB_DATABASE_NAME", "tweets"))
+        container = database.get_container_client(os.environ.get("COSMOS_DB_CONTAINER_NAME", "tweets"))
+        if MANAGE_INDEXING_POLICY:
+            # The properties read here also serve get_partition_key_path, so a cold start reads them once
+            properties = container.read()
+            if apply_indexing_policy(database, container, properties=properties):
+                properties = dict(properties, indexingPolicy=TWEETS_INDEXING_POLICY)
+            _clients[COSMOS_CONTAINER_PROPERTIES] = properties
+        return container
+    return _get_or_create(COSMOS_CONTAINER, factory)
+
+
+def get_container_properties():
+    container = get_cosmos_container()
+    return _get_or_create(COSMOS_CONTAINER_PROPERTIES, container.read)
+
+
+def get_meta_container():
+    def factory():
+        database = get_cosmos_client().get_database_client(
+            os.environ.get("COSMOS_DB_DATABASE_NAME", "tweets"))
+        return database.create_container_if_not_exists(
+            id=META_CONTAINER_NAME, partition_key=PartitionKey(path="/id"))
+    return _get_or_create(COSMOS_META_CONTAINER, factory)
+
+
+def get_partition_key_path():
+    # Read once from the container properties so callers never hard-code it
+    return _get_or_create(COSMOS_PARTITION_KEY_PATH, lambda: get_container_properties()[
+        'partitionKey']['paths'][0])
+
+
+def ensure_blob_container(container_name):
+    blob_service_client = get_blob_service_client()
+    container_client = blob_service_client.get_container_client(container_name)
+    if container_name in _ensured_blob_containers:
+        return container_client
+    with _lock:
+        if container_name not in _ensured_blob_containers:
+            try:
+                container_client.create_container()
+                logging.info(f"Created blob container {container_name}")
+            except ResourceExistsError:
+                pass
+            _ensured_blob_containers.add(container_name)
+    return container_client
+
+
+def ensure_queue(queue_name):
+    queue_client = get_queue_service_client().get_queue_client(queue_name)
+    if queue_name in _ensured_queues:
+        return queue_client
+    with _lock:
+        if queue_name not in _ensured_queues:
+            try:
+                queue_client.create_queue()
+                logging.info(f"Created queue {queue_name}")
+            except ResourceExistsError:
+                pass
+            _ensured_queues.add(queue_name)
+    return queue_client
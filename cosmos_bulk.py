@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from azure.cosmos import exceptions
+
+MAX_BATCH_OPERATIONS = 100
+MAX_BATCH_BYTES = 1_900_000
+
+RU_BUDGET = float(os.environ.get("COSMOS_RU_BUDGET", "0")) or None
+MAX_CONCURRENCY = int(os.environ.get("COSMOS_BULK_MAX_CONCURRENCY", "8"))
+MAX_RETRIES = int(os.environ.get("COSMOS_BULK_MAX_RETRIES", "10"))
+
+RETRYABLE_STATUS_CODES = {408, 429, 449, 503}
+
+
+@dataclass
+class BulkResult:
+    succeeded: int = 0
+    conflicts: int = 0
+    failed: int = 0
+    throttled: int = 0
+    retries: int = 0
+    request_charge: float = 0.0
+    elapsed: float = 0.0
+    failed_ids: list = field(default_factory=list)
+
+    @property
+    def ru_per_second(self):
+        return self.request_charge / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class _Batch:
+    partition_key: object
+    operations: list
+    attempt: int = 0
+    not_before: float = 0.0
+    estimated_charge: float = 0.0
+
+
+class RequestUnitLimiter:
+    """Token bucket over RU/s; a budget of None never waits."""
+
+    def __init__(self, ru_per_second=None, burst_seconds=1.0):
+        self.rate = ru_per_second
+        self.capacity = ru_per_second * burst_seconds if ru_per_second else None
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, charge):
+        """Seconds until `charge` RUs are available (0 when they are)."""
+        if self.rate is None:
+            return 0.0
+        with self.lock:
+            self._refill()
+            needed = min(charge, self.capacity)
+            if self.tokens >= needed:
+                return 0.0
+            return (needed - self.tokens) / self.rate
+
+    def consume(self, charge):
+        if self.rate is None:
+            return
+        with self.lock:
+            self._refill()
+            self.tokens -= charge
+
+
+def request_charge(headers):
+    try:
+        return float((headers or {}).get('x-ms-request-charge', 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def retry_after_seconds(headers, default_ms=1000):
+    try:
+        return int((headers or {}).get('x-ms-retry-after-ms', default_ms)) / 1000.0
+    except (TypeError, ValueError):
+        return default_ms / 1000.0
+
+
+def chunk_documents(documents, max_operations=MAX_BATCH_OPERATIONS, max_bytes=MAX_BATCH_BYTES):
+    # Transactional batches are capped at 100 operations and 2 MB per request
+    batch, batch_bytes = [], 0
+    for document in documents:
+        size = len(json.dumps(document))
+        if batch and (len(batch) >= max_operations or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(document)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+class BulkWriter:
+    """Writes documents as partition-grouped transactional batches within an RU/s budget.
+
+    Throttled batches are re-queued with the server's retry-after instead of
+    sleeping in a worker, and concurrency is halved on a 429 and grown back
+    while the observed RU rate stays under budget.
+    """
+
+    def __init__(self, container, partition_key_path, ru_budget=RU_BUDGET,
+                 max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.container = container
+        self.partition_key_path = partition_key_path
+        self.limiter = RequestUnitLimiter(ru_budget)
+        self.ru_budget = ru_budget
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.concurrency = self.max_concurrency if ru_budget is None else 1
+        self._charge_per_operation = 10.0
+
+    def partition_key_value(self, document):
+        value = document
+        for part in self.partition_key_path.strip('/').split('/'):
+            value = value[part]
+        return value
+
+    def upsert(self, documents):
+        return self.write(documents, "upsert")
+
+    def create(self, documents):
+        return self.write(documents, "create")
+
+    def delete(self, documents):
+        return self.write(documents, "delete")
+
+    def write(self, documents, operation="upsert"):
+        partitions = defaultdict(list)
+        for document in documents:
+            partitions[self.partition_key_value(document)].append(document)
+
+        queue = deque()
+        for partition_key, partition_documents in partitions.items():
+            for chunk in chunk_documents(partition_documents):
+                queue.append(_Batch(partition_key, [
+                    self._operation(operation, document) for document in chunk]))
+
+        result = BulkResult()
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            in_flight = {}
+            while queue or in_flight:
+                wait_time = self._dispatch(executor, queue, in_flight)
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=wait_time or None,
+                                   return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch = in_flight.pop(future)
+                        self._complete(batch, future, queue, result)
+                elif wait_time:
+                    time.sleep(wait_time)
+        result.elapsed = time.monotonic() - started
+
+        logging.info(f"Bulk {operation} complete. "
+                     f"Succeeded: {result.succeeded}, Conflicts: {result.conflicts}, "
+                     f"Failed: {result.failed}, Throttled: {result.throttled}, "
+                     f"RU consumed: {result.request_charge:.1f} "
+                     f"({result.ru_per_second:.1f} RU/s)")
+        return result
+
+    @staticmethod
+    def _operation(operation, document):
+        if operation == "delete":
+            return ("delete", (document['id'],))
+        return (operation, (document,))
+
+    def _dispatch(self, executor, queue, in_flight):
+        """Start every ready batch that fits; return how long to wait before trying again."""
+        now = time.monotonic()
+        next_ready = None
+        for _ in range(len(queue)):
+            if len(in_flight) >= self.concurrency:
+                break
+            batch = queue.popleft()
+            estimated_charge = self._charge_per_operation * len(batch.operations)
+            delay = max(batch.not_before - now, self.limiter.delay_for(estimated_charge))
+            if delay > 0:
+                queue.append(batch)
+                next_ready = delay if next_ready is None else min(next_ready, delay)
+                continue
+            # Reserve the estimate now and settle against the real charge on completion
+            batch.estimated_charge = estimated_charge
+            self.limiter.consume(estimated_charge)
+            in_flight[executor.submit(self._execute, batch)] = batch
+        return next_ready
+
+    def _execute(self, batch):
+        charges = []
+        try:
+            self.container.execute_item_batch(
+                batch_operations=batch.operations, partition_key=batch.partition_key,
+                response_hook=lambda headers, _: charges.append(request_charge(headers)))
+            return None, sum(charges)
+        except (exceptions.CosmosHttpResponseError, exceptions.CosmosBatchOperationError) as e:
+            return e, sum(charges) or request_charge(e.headers)
+
+    def _complete(self, batch, future, queue, result):
+        error, charge = future.result()
+        result.request_charge += charge
+        self.limiter.consume(charge - batch.estimated_charge)
+        if charge:
+            self._charge_per_operation = (0.8 * self._charge_per_operation
+                                          + 0.2 * charge / len(batch.operations))
+
+        if error is None:
+            result.succeeded += len(batch.operations)
+            has_headroom = self.limiter.delay_for(
+                self._charge_per_operation * len(batch.operations)) == 0
+            if self.concurrency < self.max_concurrency and has_headroom:
+                self.concurrency += 1
+            return
+
+        status_code = self._status_code(error)
+        if status_code == 409:
+            # The batch rolled back as a whole, but only the conflicting operations failed
+            conflicting = self._failed_indexes(error, 409) or set(range(len(batch.operations)))
+            result.conflicts += len(conflicting)
+            remaining = [op for index, op in enumerate(batch.operations) if index not in conflicting]
+            if remaining:
+                queue.append(_Batch(batch.partition_key, remaining, attempt=batch.attempt))
+            return
+        if status_code in RETRYABLE_STATUS_CODES and batch.attempt < self.max_retries:
+            if status_code == 429:
+                result.throttled += 1
+                self.concurrency = max(1, self.concurrency // 2)
+            batch.attempt += 1
+            batch.not_before = time.monotonic() + retry_after_seconds(error.headers)
+            result.retries += 1
+            queue.append(batch)
+            return
+
+        logging.error(f"Batch for partition {batch.partition_key} failed "
+                      f"with status {status_code}: {str(error)}")
+        result.failed += len(batch.operations)
+        result.failed_ids.extend(self._operation_id(op) for op in batch.operations)
+
+    @staticmethod
+    def _status_code(error):
+        # A failed transactional batch reports the status of the operation that broke it
+        if isinstance(error, exceptions.CosmosBatchOperationError):
+            for response in error.operation_responses or []:
+                if response.get('statusCode') not in (None, 424):
+                    return response.get('statusCode')
+        return error.status_code
+
+    @staticmethod
+    def _failed_indexes(error, status_code):
+        responses = getattr(error, 'operation_responses', None) or []
+        return {index for index, response in enumerate(responses)
+                if response.get('statusCode') == status_code}
+
+    @staticmethod
+    def _operation_id(operation):
+        argument = operation[1][0]
+        return argument['id'] if isinstance(argument, dict) else argument
@@ -1,49 +1,164 @@
-import os
 import json
 import logging
-import time
-from azure.cosmos import CosmosClient, exceptions
-from azure.storage.blob import BlobServiceClient
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+from clients import get_blob_service_client, get_cosmos_container, get_meta_container, get_partition_key_path
+from cosmos_bulk import BulkWriter, MAX_BATCH_OPERATIONS
+from tracing import traced, annotate
+import metrics
 
 
-# Cosmos DB configuration
-endpoint = os.environ["COSMOS_DB_ENDPOINT"]
-key = os.environ["COSMOS_DB_KEY"]
-database_name = os.environ["COSMOS_DB_DATABASE_NAME"]
-container_name = os.environ["COSMOS_DB_CONTAINER_NAME"]
+def watermark_id(author_id):
+    return f"watermark-{author_id}"
 
-# Azure Blob Storage configuration
-AZURE_STORAGE_CONNECTION_STRING = os.environ["AZURE_STORAGE_CONNECTION_STRING"]
 
-# Initialize the Cosmos client
-client = CosmosClient(endpoint, key)
-database = client.get_database_client(database_name)
-container = database.get_container_client(container_name)
+def _query_latest_tweet(author_id):
+    # Only used to seed the watermark document the first time an account is polled
+    query = ("SELECT TOP 1 c.id, c.created_at, c.text FROM c "
+             "WHERE c.author_id = @author_id ORDER BY c.created_at DESC")
+    items = list(get_cosmos_container().query_items(
+        query=query,
+        parameters=[{"name": "@author_id", "value": author_id}],
+        enable_cross_partition_query=True
+    ))
+    return items[0] if items else None
 
 
-def get_blob_service_client():
-    return BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+@traced("cosmos.get_watermark")
+def get_watermark(author_id):
+    meta_container = get_meta_container()
+    document_id = watermark_id(author_id)
+    try:
+        return meta_container.read_item(item=document_id, partition_key=document_id)
+    except exceptions.CosmosResourceNotFoundError:
+        pass
+
+    latest_tweet = _query_latest_tweet(author_id)
+    if not latest_tweet:
+        return None
+    logging.info(f"Seeding watermark for {author_id} from tweet {latest_tweet['id']}")
+    watermark = {
+        "id": document_id,
+        "type": "watermark",
+        "author_id": author_id,
+        "latest_id": latest_tweet['id'],
+        "created_at": latest_tweet['created_at'],
+        "text": latest_tweet['text'],
+        "pagination_token": None,
+        "window_start": None
+    }
+    try:
+        return meta_container.create_item(body=watermark)
+    except exceptions.CosmosResourceExistsError:
+        return meta_container.read_item(item=document_id, partition_key=document_id)
 
 
-def get_latest_tweet():
-    query = "SELECT TOP 1 c.id, c.created_at, c.text FROM c ORDER BY c.created_at DESC"
+@traced("cosmos.update_watermark")
+def update_watermark(author_id, tweets, pagination_token=None, window_start=None):
+    """Advance the watermark to the newest of `tweets`; never moves it backwards.
+
+    A pagination token means the fetch window starting at `window_start` has more
+    pages, so the next poll resumes that window instead of starting a new one.
+    """
+    meta_container = get_meta_container()
+    document_id = watermark_id(author_id)
+    newest = max(tweets, key=lambda tweet: int(tweet['id']), default=None)
+
+    for _ in range(5):
+        try:
+            current = meta_container.read_item(item=document_id, partition_key=document_id)
+        except exceptions.CosmosResourceNotFoundError:
+            current = None
+
+        watermark = dict(current or {"id": document_id, "type": "watermark", "author_id": author_id,
+                                     "latest_id": None, "created_at": None, "text": None})
+        if newest and (watermark['latest_id'] is None or int(newest['id']) > int(watermark['latest_id'])):
+            watermark.update(latest_id=newest['id'], created_at=newest['created_at'], text=newest['text'])
+        watermark['pagination_token'] = pagination_token
+        watermark['window_start'] = window_start if pagination_token else None
 
-    items = list(container.query_items(
+        try:
+            if current is None:
+                return meta_container.create_item(body=watermark)
+            # Optimistic concurrency: only replace the version we just read
+            return meta_container.replace_item(
+                item=document_id, body=watermark,
+                etag=current['_etag'], match_condition=MatchConditions.IfNotModified)
+        except exceptions.CosmosAccessConditionFailedError:
+            logging.info("Watermark changed concurrently, retrying update")
+        except exceptions.CosmosResourceExistsError:
+            logging.info("Watermark created concurrently, retrying update")
+
+    logging.error(f"Could not update watermark for {author_id} after repeated conflicts")
+    return None
+
+
+def get_latest_tweet(author_id):
+    watermark = get_watermark(author_id)
+    if watermark and watermark['latest_id']:
+        return watermark['latest_id'], watermark['created_at'], watermark['text']
+    else:
+        return None, None, None
+
+
+def partition_key_value(document, partition_key_path=None):
+    value = document
+    for part in (partition_key_path or get_partition_key_path()).strip('/').split('/'):
+        value = value[part]
+    return value
+
+
+def get_existing_tweet_ids(tweet_ids):
+    if not tweet_ids:
+        return set()
+    container = get_cosmos_container()
+    query = "SELECT VALUE c.id FROM c WHERE ARRAY_CONTAINS(@ids, c.id)"
+    return set(container.query_items(
         query=query,
+        parameters=[{"name": "@ids", "value": list(tweet_ids)}],
         enable_cross_partition_query=True
     ))
 
-    if items:
-        latest_tweet = items[0]
-        return latest_tweet['id'], latest_tweet['created_at'], latest_tweet['text']
-    else:
-        return None, None, None
 
+def get_tweets_needing_enrichment(limit):
+    """Newest tweets with unfinished enrichment stages, including records that predate stage tracking."""
+    container = get_cosmos_container()
+    query = (f"SELECT TOP {int(limit)} * FROM c "
+             "WHERE NOT IS_DEFINED(c.enrichment_pending) OR c.enrichment_pending = true "
+             "ORDER BY c.created_at DESC")
+    items = container.query_items(query=query, enable_cross_partition_query=True)
+    # Drop Cosmos system properties so the records can go back into the archive as-is
+    return [{key: value for key, value in item.items() if not key.startswith('_')} for item in items]
+
+
+def get_bulk_writer(**kwargs):
+    return BulkWriter(get_cosmos_container(), get_partition_key_path(), **kwargs)
+
+
+@traced("cosmos.insert")
+def insert_tweets_into_db(tweets):
+    logging.info(f"Starting insertion of {len(tweets)} tweets")
+
+    unique_tweets = {tweet['id']: tweet for tweet in tweets}
+    skipped_count = len(tweets) - len(unique_tweets)
+
+    result = get_bulk_writer().upsert(list(unique_tweets.values()))
+    annotate(size=len(unique_tweets), request_charge=result.request_charge, throttled=result.throttled)
+    metrics.inc("cosmos_request_charge_total", result.request_charge, operation="insert")
+    metrics.inc("cosmos_throttled_total", result.throttled, operation="insert")
+
+    logging.info(f"Insertion complete. "
+                 f"Upserted: {result.succeeded}, "
+                 f"Skipped (duplicates in input): {skipped_count}, "
+                 f"Errors: {result.failed}, "
+                 f"RU consumed: {result.request_charge:.1f}")
+
+    return result.succeeded, skipped_count, result.failed
 
-def insert_tweets_into_db(blob_name='tweets_data.json', blob_container='tweetdata'):
-    logging.info(f"Starting tweet insertion from blob: {blob_name}")
 
-    # Get blob data
+def insert_tweets_from_blob(blob_name='tweets_data.json', blob_container='tweetdata'):
+    logging.info(f"Starting tweet backfill from blob: {blob_name}")
+
     blob_service_client = get_blob_service_client()
     blob_client = blob_service_client.get_blob_client(
         container=blob_container, blob=blob_name)
@@ -59,61 +174,16 @@ def insert_tweets_into_db(blob_name='tweets_data.json', blob_container='tweetdat
     inserted_count = 0
     skipped_count = 0
     error_count = 0
-
-    # Process tweets in batches
-    batch_size = 100
-    for i in range(0, len(tweets_data), batch_size):
-        batch = tweets_data[i:i+batch_size]
-        tweet_ids = [tweet['id'] for tweet in batch]
-
-        try:
-            # Check for existing tweets in batch
-            query = "SELECT c.id FROM c WHERE c.id IN (" + ",".join(
-                f"'{id}'" for id in tweet_ids) + ")"
-            existing_ids = set([item['id'] for item in container.query_items(
-                query, enable_cross_partition_query=True)])
-
-            for tweet in batch:
-                tweet_id = tweet['id']
-                if tweet_id in existing_ids:
-                    skipped_count += 1
-                    logging.debug(f"Tweet {tweet_id} already exists, skipping")
-                else:
-                    try:
-                        container.create_item(body=tweet)
-                        inserted_count += 1
-                        logging.debug(f"Inserted new tweet {tweet_id}")
-                    except exceptions.CosmosHttpResponseError as e:
-                        if e.status_code == 409:  # Conflict, tweet was inserted by another process
-                            skipped_count += 1
-                            logging.debug(
-                                f"Tweet {tweet_id} was inserted by another process, skipping")
-                        else:
-                            raise
-
-        except exceptions.CosmosHttpResponseError as e:
-            if e.status_code == 429:  # Too Many Requests
-                retry_after = int(e.headers.get(
-                    'x-ms-retry-after-ms', 1000)) / 1000.0
-                logging.warning(
-                    f"Rate limited. Waiting for {retry_after} seconds before retrying.")
-                time.sleep(retry_after)
-                # Decrement i to retry this batch
-                i -= batch_size
-            else:
-                logging.error(f"Error processing batch: {str(e)}")
-                error_count += len(batch)
-
-        except Exception as e:
-            logging.error(f"Unexpected error processing batch: {str(e)}")
-            error_count += len(batch)
-
-        # Log progress
-        if (i + batch_size) % 1000 == 0 or (i + batch_size) >= len(tweets_data):
-            logging.info(f"Processed {i + batch_size}/{len(tweets_data)} tweets. "
-                         f"Inserted: {inserted_count}, Skipped: {skipped_count}, Errors: {error_count}")
-
-    logging.info(f"Insertion complete. "
+    for i in range(0, len(tweets_data), MAX_BATCH_OPERATIONS):
+        batch = tweets_data[i:i+MAX_BATCH_OPERATIONS]
+        existing_ids = get_existing_tweet_ids([tweet['id'] for tweet in batch])
+        inserted, skipped, errors = insert_tweets_into_db(
+            [tweet for tweet in batch if tweet['id'] not in existing_ids])
+        inserted_count += inserted
+        skipped_count += skipped + len(existing_ids)
+        error_count += errors
+
+    logging.info(f"Backfill complete. "
                  f"Inserted: {inserted_count}, "
                  f"Skipped (already exist): {skipped_count}, "
                  f"Errors: {error_count}")
@@ -0,0 +1,86 @@
+import os
+from datetime import datetime, timezone
+from utils import TEXT_MODEL, VISION_MODEL, CONTENT_ANALYZER, IMAGE_ERROR_PREFIX
+
+# Per-stage enrichment status stored on each tweet record as
+#   tweet["enrichment"][stage] = {"status", "attempts", "model", "error", "updated_at", "reused_from"}
+# where reused_from names the near-duplicate tweet an analysis was copied from
+# plus a top-level tweet["enrichment_pending"] flag so the re-enrichment worker can
+# find unfinished tweets with one indexed filter.
+STAGES = ["media", "references", "content", "sentiment", "responsibility"]
+STAGE_MODELS = {
+    "media": VISION_MODEL,
+    "references": VISION_MODEL,  # referenced tweets' images go through the vision model
+    "content": CONTENT_ANALYZER,
+    "sentiment": TEXT_MODEL,
+    "responsibility": TEXT_MODEL,
+}
+# Stages that read another stage's output and must re-run when it changes
+DEPENDENTS = {
+    "media": ["sentiment", "responsibility"],
+    "references": ["content", "sentiment", "responsibility"],
+}
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+MAX_ATTEMPTS = int(os.environ.get("ENRICHMENT_MAX_ATTEMPTS", "5"))
+
+
+def new_status():
+    return {stage: {"status": PENDING, "attempts": 0, "model": None, "error": None, "updated_at": None,
+                    "reused_from": None}
+            for stage in STAGES}
+
+
+def mark(tweet_data, stage, error=None, reused_from=None):
+    state = tweet_data["enrichment"][stage]
+    state.update(status=FAILED if error else DONE, attempts=state["attempts"] + 1,
+                 model=STAGE_MODELS[stage], error=str(error) if error else None,
+                 updated_at=datetime.now(timezone.utc).isoformat(), reused_from=reused_from)
+
+
+def stages_to_run(tweet_data, stale_models=False):
+    """Unfinished stages still under the attempt cap, plus the stages that depend on them.
+
+    With stale_models, finished stages produced by a different model version re-run too.
+    """
+    status = tweet_data["enrichment"]
+    selected = set()
+    for stage in STAGES:
+        state = status[stage]
+        if state["status"] != DONE:
+            if state["attempts"] < MAX_ATTEMPTS:
+                selected.add(stage)
+        elif stale_models and state["model"] != STAGE_MODELS[stage]:
+            selected.add(stage)
+    for stage in list(selected):
+        selected.update(DEPENDENTS.get(stage, []))
+    return [stage for stage in STAGES if stage in selected]
+
+
+def refresh_pending(tweet_data):
+    tweet_data["enrichment_pending"] = bool(stages_to_run(tweet_data))
+    return tweet_data["enrichment_pending"]
+
+
+def infer_status(tweet_data):
+    """Reconstruct stage status for records written before per-stage tracking."""
+    status = new_status()
+
+    def settle(stage, ok, error):
+        status[stage].update(status=DONE if ok else FAILED, attempts=1,
+                             error=None if ok else error)
+
+    descriptions = tweet_data.get("image_descriptions") or []
+    settle("media", len(descriptions) == len(tweet_data.get("image_urls") or []) and not any(
+        description.startswith(IMAGE_ERROR_PREFIX) for description in descriptions),
+        "Image analysis failed or is missing")
+    settle("references", all(reference.get("text") for reference in tweet_data.get("referenced_tweets") or []),
+           "Referenced tweet lookup failed")
+    # Failed analyses used to be stored as empty lists, so an all-empty result is retried
+    settle("content", any(tweet_data.get(field) for field in ("keywords", "hashtags", "named_entities")),
+           "Content analysis failed or is missing")
+    settle("sentiment", "sentiment" in tweet_data, "Sentiment analysis missing")
+    settle("responsibility", "social_responsibility" in tweet_data, "Social responsibility rating missing")
+    return status
@@ -1,17 +1,32 @@
 import logging
 import azure.functions as func
-import requests
 import os
 import json
 from datetime import datetime, timedelta, timezone
-from azure.storage.blob import BlobServiceClient
-from utils import analyze_image_with_gpt4o, evaluate_social_responsibility, analyze_tweet_sentiment, advanced_analyze_tweet_content
-from db_utils import get_latest_tweet, insert_tweets_into_db
+from utils import analyze_image_with_gpt4o, evaluate_social_responsibility, analyze_tweet_sentiment, advanced_analyze_tweet_content, IMAGE_ERROR_PREFIX
+from db_utils import get_watermark, update_watermark, insert_tweets_into_db, get_tweets_needing_enrichment
+from clients import get_blob_service_client, ensure_blob_container, get_http_session
+from aggregates import update_aggregates
+from tracing import span, traced, annotate
+import tracing
+import metrics
+import pipeline
+import lease
+import enrichment
+import budget
+import seen_ids
+import reference_cache
+import near_duplicates
+import records
+import prose_store
+import query_api
 
 app = func.FunctionApp()
 
-BEARER_TOKEN = os.environ["BEARER_TOKEN"]
-AZURE_STORAGE_CONNECTION_STRING = os.environ["AZURE_STORAGE_CONNECTION_STRING"]
+BEARER_TOKEN = os.environ.get("BEARER_TOKEN", "")
+USER_ID = "44196397"  # Elon Musk's Twitter user ID
+ARCHIVE_LEASE_WAIT = int(os.environ.get("ARCHIVE_LEASE_WAIT_SECONDS", "30"))
+REENRICH_BATCH_SIZE = int(os.environ.get("REENRICH_BATCH_SIZE", "50"))
 
 
 @app.schedule(schedule="0 */1 * * * *", arg_name="myTimer", run_on_startup=True, use_monitor=False)
@@ -24,154 +39,436 @@ def timer_trigger(myTimer: func.TimerRequest) -> None:
     logging.info(
         f"AZURE_STORAGE_CONNECTION_STRING configured: {'AZURE_STORAGE_CONNECTION_STRING' in os.environ}")
 
+    run_poll()
+
+    logging.info('Timer trigger function "timer_trigger" completed execution.')
+
+
+def _poll_once():
+    tracing.start_poll()
     try:
         main()
     except Exception as e:
         logging.error(f"An error occurred in main execution: {str(e)}")
-
-    logging.info('Timer trigger function "timer_trigger" completed execution.')
+    tracing.log_poll_summary()
+
+
+def run_poll():
+    """Poll under the single-flight lease; an overlapping tick hands itself over and exits."""
+    with lease.single_flight("poll") as poll_lease, budget.run_budget() as run_budget:
+        if poll_lease is None:
+            logging.info("Another invocation is still polling; handing this tick over to it")
+            lease.request_handoff("poll")
+            metrics.inc("polls_skipped_total")
+            return False
+
+        lease.take_handoff("poll")  # this run already covers any earlier request
+        _poll_once()
+        # A tick that fired while we were busy would otherwise wait for the next minute
+        if lease.take_handoff("poll") and not poll_lease.lost and not run_budget.exhausted:
+            logging.info("Polling again for a tick handed over by an overlapping invocation")
+            metrics.inc("lease_handoffs_total")
+            _poll_once()
+        return True
+
+
+@app.cosmos_db_trigger(arg_name="documents", connection="COSMOS_DB_CONNECTION",
+                       database_name="%COSMOS_DB_DATABASE_NAME%",
+                       container_name="%COSMOS_DB_CONTAINER_NAME%",
+                       lease_container_name="leases",
+                       create_lease_container_if_not_exists=True)
+def aggregates_trigger(documents: func.DocumentList) -> None:
+    logging.info(f"Change feed delivered {len(documents)} documents")
+    try:
+        update_aggregates([document.to_dict() for document in documents])
+        query_api.invalidate("aggregates")
+        metrics.mark_success("aggregates")
+    except Exception as e:
+        logging.error(f"An error occurred updating aggregates: {str(e)}")
+        raise
 
 
-def get_blob_service_client():
-    return BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+@app.route(route="metrics", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def metrics_endpoint(req: func.HttpRequest) -> func.HttpResponse:
+    return func.HttpResponse(metrics.render(), status_code=200,
+                             mimetype="text/plain", charset="utf-8",
+                             headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
 
 
+def api_response(req, scope, load):
+    """Serve `load()` as JSON through the response cache, answering 304 when the client's ETag matches."""
+    key = (req.route_params.get("id"), tuple(sorted(req.params.items())))
+    try:
+        etag, body = query_api.cached(scope, key, load)
+    except query_api.QueryError as e:
+        return func.HttpResponse(json.dumps({"error": str(e)}), status_code=400, mimetype="application/json")
+    if body is None:
+        return func.HttpResponse(json.dumps({"error": "Not found"}), status_code=404, mimetype="application/json")
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={query_api.CACHE_TTL}"}
+    if_none_match = [tag.strip().removeprefix("W/") for tag in req.headers.get("If-None-Match", "").split(",")]
+    if etag in if_none_match or "*" in if_none_match:
+        return func.HttpResponse(status_code=304, headers=headers)
+    return func.HttpResponse(body, status_code=200, mimetype="application/json", headers=headers)
+
+
+@app.route(route="tweets", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def tweets_endpoint(req: func.HttpRequest) -> func.HttpResponse:
+    def load():
+        return query_api.list_tweets(
+            author_id=req.params.get("author_id"),
+            since=query_api.parse_timestamp(req.params.get("since"), "since"),
+            until=query_api.parse_timestamp(req.params.get("until"), "until"),
+            fields=query_api.parse_fields(req.params.get("fields")),
+            page_size=query_api.parse_page_size(req.params.get("page_size")),
+            cursor=req.params.get("cursor"))
+    return api_response(req, "tweets", load)
+
+
+@app.route(route="tweets/{id}", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def tweet_endpoint(req: func.HttpRequest) -> func.HttpResponse:
+    fields = req.params.get("fields")
+    return api_response(req, "tweets", lambda: query_api.get_tweet(
+        req.route_params["id"], query_api.parse_fields(fields) if fields else None))
+
+
+@app.route(route="aggregates", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def aggregates_endpoint(req: func.HttpRequest) -> func.HttpResponse:
+    return api_response(req, "aggregates", lambda: query_api.aggregate_summary(
+        req.params.get("granularity", "day"), req.params.get("start"), req.params.get("end")))
+
+
+@app.queue_trigger(arg_name="message", queue_name=pipeline.ENRICH_QUEUE,
+                   connection="AZURE_STORAGE_CONNECTION_STRING")
+def enrich_trigger(message: func.QueueMessage) -> None:
+    payload = json.loads(message.get_body())
+    tweet_data = enrich_tweet(payload["tweet"], payload["media"])
+    pipeline.enqueue(pipeline.PERSIST_QUEUE, [tweet_data])
+
+
+@app.queue_trigger(arg_name="message", queue_name=pipeline.PERSIST_QUEUE,
+                   connection="AZURE_STORAGE_CONNECTION_STRING")
+def persist_trigger(message: func.QueueMessage) -> None:
+    # Pull whatever else is waiting so one blob rewrite and one bulk insert cover the batch.
+    # If persisting fails, the extra messages reappear after the visibility timeout.
+    extra = pipeline.receive(pipeline.PERSIST_QUEUE, pipeline.PERSIST_BATCH_SIZE - 1)
+    tweets = [json.loads(message.get_body())] + [payload for _, payload in extra]
+    logging.info(f"Persisting a batch of {len(tweets)} enriched tweets")
+    persist_tweets(tweets)
+    pipeline.delete(pipeline.PERSIST_QUEUE, [message for message, _ in extra])
+    metrics.mark_success("persist")
+
+
+@app.schedule(schedule="0 */15 * * * *", arg_name="myTimer", run_on_startup=False, use_monitor=False)
+def reenrich_trigger(myTimer: func.TimerRequest) -> None:
+    with lease.single_flight("reenrich") as reenrich_lease:
+        if reenrich_lease is None:
+            logging.info("Re-enrichment is already running elsewhere")
+            return
+        try:
+            with budget.run_budget():
+                reenrich_tweets()
+            metrics.mark_success("reenrich")
+        except Exception as e:
+            logging.error(f"An error occurred during re-enrichment: {str(e)}")
+
+
+def drain_queues(workers=1):
+    """Run the enrich and persist stages in-process (local storage backend, benchmarks)."""
+    def enrich(payloads):
+        pipeline.enqueue(pipeline.PERSIST_QUEUE,
+                         [enrich_tweet(payload["tweet"], payload["media"]) for payload in payloads])
+
+    enriched = pipeline.process_queue(pipeline.ENRICH_QUEUE, enrich, workers=workers)
+    persisted = pipeline.process_queue(pipeline.PERSIST_QUEUE, persist_tweets,
+                                       batch_size=pipeline.PERSIST_BATCH_SIZE)
+    return enriched, persisted
+
+
+@traced("blob.load")
 def load_from_blob(container_name='tweetdata', blob_name='tweets_data.json'):
     blob_service_client = get_blob_service_client()
     blob_client = blob_service_client.get_blob_client(
         container=container_name, blob=blob_name)
     try:
         download_stream = blob_client.download_blob()
-        return json.loads(download_stream.readall())
+        data = download_stream.readall()
+        annotate(size=len(data))
+        metrics.inc("blob_bytes_total", len(data), direction="download")
+        return json.loads(data)
     except Exception as e:
         logging.warning(f"Error loading data from blob: {str(e)}")
         return []
 
 
+@traced("blob.save")
 def save_to_blob(data, container_name='tweetdata', blob_name='tweets_data.json'):
     logging.info(f"Attempting to save {len(data)} tweets to blob storage")
-    blob_service_client = get_blob_service_client()
-
-    container_client = blob_service_client.get_container_client(container_name)
-    if not container_client.exists():
-        container_client.create_container()
-
-    blob_client = blob_service_client.get_blob_client(
-        container=container_name, blob=blob_name)
+    container_client = ensure_blob_container(container_name)
+    blob_client = container_client.get_blob_client(blob_name)
     try:
-        blob_client.upload_blob(json.dumps(data, indent=4), overwrite=True)
+        serialized = json.dumps(data, separators=(",", ":"))
+        annotate(size=len(serialized))
+        blob_client.upload_blob(serialized, overwrite=True)
+        metrics.inc("blob_bytes_total", len(serialized), direction="upload")
         logging.info(f"Data saved to blob storage")
+        return True
     except Exception as e:
         logging.error(f"Error saving data to blob storage: {str(e)}")
-
-
-def parse_tweets(tweets_response):
-    tweets_data = []
-
-    if 'data' not in tweets_response:
-        logging.warning("No new tweets found.")
-        return tweets_data
-
-    def get_tweet_url(tweet_id):
-        return f"https://x.com/i/web/status/{tweet_id}"
-
-    def process_media(media_keys, includes_media):
-        media_info = []
-        image_descriptions = []
-        image_urls = []
-        for media_key in media_keys:
-            media = next(
-                (m for m in includes_media if m['media_key'] == media_key), None)
-            if media:
-                if media['type'] == 'photo':
-                    image_url = media['url']
-                    media_info.append(f"Image URL: {image_url}")
-                    image_urls.append(image_url)
-                    try:
-                        image_description = analyze_image_with_gpt4o(
-                            image_url, verbose=True)
-                        media_info.append(
-                            f"Image Description: {image_description}")
-                        image_descriptions.append(image_description)
-                    except Exception as e:
-                        media_info.append(f"Error analyzing image: {str(e)}")
-                elif media['type'] == 'video':
-                    preview_url = media.get(
-                        'preview_image_url', 'URL not available')
-                    media_info.append(f"Video Preview URL: {preview_url}")
-                    if preview_url != 'URL not available':
-                        image_urls.append(preview_url)
-                        try:
-                            image_description = analyze_image_with_gpt4o(
-                                preview_url, verbose=True)
-                            media_info.append(
-                                f"Video Preview Description: {image_description}")
-                            image_descriptions.append(image_description)
-                        except Exception as e:
-                            media_info.append(
-                                f"Error analyzing video preview: {str(e)}")
-        return media_info, image_descriptions, image_urls
-
-    includes_media = tweets_response.get('includes', {}).get('media', [])
-
-    for tweet in tweets_response['data']:
+        tracing.mark_error(e)
+        return False
+
+
+def unseen_messages(messages):
+    """Drop tweets the archive already holds before any enrichment is spent on them."""
+    if not messages:
+        return messages
+    index = seen_ids.load(rebuild_from=load_from_blob)
+    if index.rebuilt:
+        store_rebuilt_index()
+    return seen_ids.unseen(messages, index)
+
+
+def store_rebuilt_index():
+    """Store a rebuilt seen-id index so later polls skip the rebuild; left to mark_seen when the archive is busy."""
+    with lease.single_flight("archive") as archive_lease:
+        if archive_lease is None:
+            return
+        # Rebuilt again under the lease so ids a concurrent persist added are not dropped
+        index = seen_ids.load(rebuild_from=load_from_blob)
+        if index.rebuilt:
+            lease.check()
+            seen_ids.save(index)
+
+
+def merge_into_archive(tweets):
+    """Add or replace (by id) tweets in the blob archive; call while holding the archive lease."""
+    archive = []
+    positions = {}
+    # Existing duplicates collapse too, keeping the latest copy in the first one's place;
+    # records from older schema versions are migrated on the way through
+    for tweet in [records.normalize(tweet) for tweet in load_from_blob()] + tweets:
+        if tweet['id'] in positions:
+            archive[positions[tweet['id']]] = tweet
+        else:
+            positions[tweet['id']] = len(archive)
+            archive.append(tweet)
+    lease.check()
+    return save_to_blob(archive)
+
+
+def mark_seen(tweet_ids):
+    """Record persisted tweets in the seen-id index, which is written under the archive lease."""
+    with lease.single_flight("archive", wait=ARCHIVE_LEASE_WAIT) as archive_lease:
+        if archive_lease is None:
+            logging.warning("Archive is busy; seen-id index not updated, saves still deduplicate")
+            return
+        index = seen_ids.load(rebuild_from=load_from_blob)
+        if index.add(tweet_ids) or index.rebuilt:
+            lease.check()
+            seen_ids.save(index)
+
+
+def media_urls(media_keys, includes_media):
+    image_urls = []
+    for media_key in media_keys:
+        media = next(
+            (m for m in includes_media if m['media_key'] == media_key), None)
+        if media:
+            if media['type'] == 'photo':
+                image_urls.append(media['url'])
+            elif media['type'] == 'video' and media.get('preview_image_url'):
+                image_urls.append(media['preview_image_url'])
+    return image_urls
+
+
+@traced("process_media")
+def process_media(tweet_data):
+    image_descriptions = []
+    errors = []
+    for image_url in tweet_data["image_urls"]:
+        image_description = analyze_image_with_gpt4o(image_url, verbose=True)
+        # Failures come back as text; keep them out of the record
+        if image_description.startswith(IMAGE_ERROR_PREFIX):
+            errors.append(image_description)
+        else:
+            image_descriptions.append(image_description)
+    tweet_data["image_descriptions"] = image_descriptions
+    return "; ".join(errors) or None
+
+
+def lookup_reference(tweet_id):
+    """Referenced tweet from the cache, or from the API and vision model on a miss."""
+    ref_data = reference_cache.get(tweet_id)
+    if ref_data is None:
+        ref_data = referenced_tweet_id_lookup(tweet_id)
+        reference_cache.put(tweet_id, ref_data)
+    return ref_data
+
+
+def resolve_references(tweet_data):
+    errors = []
+    for ref in tweet_data["referenced_tweets"]:
+        ref_data = lookup_reference(ref['id'])
+        ref.update(text=ref_data["text"], image_description=ref_data["image_description"],
+                   image_url=ref_data["image_url"])
+        if ref_data.get("error"):
+            errors.append(f"{ref['id']}: {ref_data['error']}")
+        elif ref_data["image_description"].startswith(IMAGE_ERROR_PREFIX):
+            errors.append(f"{ref['id']}: {ref_data['image_description']}")
+    return "; ".join(errors) or None
+
+
+def analyze_content(tweet_data):
+    referenced_text = "".join(ref["text"] for ref in tweet_data["referenced_tweets"])
+    # A failure raises into run_stages, which marks the stage failed for re-enrichment
+    keywords, hashtags, named_entities = advanced_analyze_tweet_content(
+        tweet_data['text'], referenced_text, verbose=True, raise_errors=True)
+    tweet_data["keywords"] = keywords
+    tweet_data["hashtags"] = hashtags
+    tweet_data["named_entities"] = named_entities
+
+
+def analyze_sentiment(tweet_data):
+    sentiment_result = analyze_tweet_sentiment(tweet_data, verbose=True)
+    if 'error' in sentiment_result:
+        return sentiment_result['error']
+    tweet_data["sentiment"] = sentiment_result
+
+
+def evaluate_responsibility(tweet_data):
+    response, rating = evaluate_social_responsibility(
+        tweet_data, verbose=True)
+    if not rating:
+        return response if response.startswith("Error") else "No rating found in the response"
+    tweet_data["social_responsibility"] = {
+        "response": response, "rating": rating}
+
+
+STAGE_HANDLERS = {
+    "media": process_media,
+    "references": resolve_references,
+    "content": analyze_content,
+    "sentiment": analyze_sentiment,
+    "responsibility": evaluate_responsibility,
+}
+
+
+def run_stages(tweet_data, stages):
+    """Run the given enrichment stages in pipeline order, recording each outcome on the record."""
+    run_budget = budget.current()
+    if near_duplicates.REUSABLE.keys() & set(stages):
+        near_duplicates.ensure_seeded(load_from_blob)
+    for stage in enrichment.STAGES:
+        if stage not in stages:
+            continue
+        reused_from = near_duplicates.reuse(tweet_data, stage)
+        if reused_from:
+            enrichment.mark(tweet_data, stage, reused_from=reused_from)
+            continue
+        if not run_budget.can_start(f"stage:{stage}"):
+            # Left pending; the re-enrichment worker finishes it later
+            logging.warning(f"Run budget exhausted before stage {stage} of tweet {tweet_data['id']}")
+            break
+        try:
+            with budget.measure(f"stage:{stage}"):
+                error = STAGE_HANDLERS[stage](tweet_data)
+        except Exception as e:
+            error = str(e)
+        enrichment.mark(tweet_data, stage, error)
+        if error:
+            logging.error(f"Enrichment stage {stage} failed for tweet {tweet_data['id']}: {error}")
+    enrichment.refresh_pending(tweet_data)
+    near_duplicates.remember(tweet_data)
+    return tweet_data
+
+
+def stored_record(tweet_data):
+    """The tweet as persisted: current schema, model prose moved to the prose store."""
+    return prose_store.externalize(records.migrate(tweet_data))
+
+
+def enrich_tweet(tweet, includes_media):
+    with span("tweet", tweet_id=tweet['id']):
         logging.info(f"Processing tweet {tweet['id']}")
         tweet_data = {
             "id": tweet['id'],
             "text": tweet['text'],
             "created_at": tweet['created_at'],
             "author_id": tweet['author_id'],
-            "url": get_tweet_url(tweet['id']),
             "image_descriptions": [],
-            "image_urls": [],
-            "referenced_tweets": []
+            "image_urls": media_urls(tweet.get('attachments', {}).get('media_keys', []), includes_media),
+            "referenced_tweets": [
+                {"type": ref['type'], "id": ref['id'], "text": "", "image_description": "", "image_url": ""}
+                for ref in tweet.get('referenced_tweets', [])],
+            "enrichment": enrichment.new_status()
         }
+        run_stages(tweet_data, enrichment.STAGES)
 
-        if 'attachments' in tweet and 'media_keys' in tweet['attachments']:
-            media_info, image_descriptions, image_urls = process_media(
-                tweet['attachments']['media_keys'], includes_media)
-            tweet_data["image_descriptions"] = image_descriptions
-            tweet_data["image_urls"] = image_urls
-
-        referenced_text = ""
-        if 'referenced_tweets' in tweet:
-            for ref in tweet['referenced_tweets']:
-                ref_data = referenced_tweet_id_lookup(ref['id'])
-                tweet_data["referenced_tweets"].append({
-                    "type": ref['type'],
-                    "id": ref['id'],
-                    "text": ref_data["text"],
-                    "image_description": ref_data["image_description"],
-                    "image_url": ref_data["image_url"]
-                })
-                referenced_text += ref_data["text"]
-
-        keywords, hashtags, named_entities = advanced_analyze_tweet_content(
-            tweet['text'], referenced_text, verbose=True)
-        tweet_data["keywords"] = keywords
-        tweet_data["hashtags"] = hashtags
-        tweet_data["named_entities"] = named_entities
-
-        sentiment_result = analyze_tweet_sentiment(tweet_data, verbose=True)
-        if 'error' not in sentiment_result:
-            tweet_data["sentiment"] = sentiment_result
-        else:
-            logging.error(
-                f"Error in sentiment analysis: {sentiment_result['error']}")
+        metrics.inc("tweets_enriched_total")
+        logging.info(f"Processed and added tweet {tweet['id']}")
+        return stored_record(tweet_data)
 
-        response, rating = evaluate_social_responsibility(
-            tweet_data, verbose=True)
-        if rating:
-            tweet_data["social_responsibility"] = {
-                "response": response, "rating": rating}
 
-        tweets_data.append(tweet_data)
-        logging.info(f"Processed and added tweet {tweet['id']}")
+@traced("enrich_batch")
+def enrich_batch(payloads):
+    """Enrich payloads in order while the run budget allows; returns (enriched, not started)."""
+    run_budget = budget.current()
+    tweets_data = []
+    for index, payload in enumerate(payloads):
+        if not run_budget.can_start("tweet"):
+            logging.warning(f"Run budget exhausted after {len(tweets_data)} tweets; "
+                            f"{len(payloads) - index} left for the next run")
+            return tweets_data, payloads[index:]
+        with budget.measure("tweet"):
+            tweets_data.append(enrich_tweet(payload["tweet"], payload["media"]))
 
     logging.info(f"Total tweets processed: {len(tweets_data)}")
-    return tweets_data
+    return tweets_data, []
+
+
+def persist_tweets(tweets):
+    """Add or replace (by id) enriched tweets in the blob archive and upsert them into Cosmos."""
+    unique_tweets = list({tweet['id']: tweet for tweet in tweets}.values())
+    # Persisters on other instances rewrite the same archive blob, so take turns
+    with lease.single_flight("archive", wait=ARCHIVE_LEASE_WAIT) as archive_lease:
+        if archive_lease is None:
+            raise RuntimeError("Archive is busy; leaving the batch for a retry")
+        saved = merge_into_archive(unique_tweets) if unique_tweets else False
+    inserted_count, skipped_count, error_count = insert_tweets_into_db(unique_tweets)
+    query_api.invalidate("tweets")
+    if error_count:
+        raise RuntimeError(f"{error_count} of {len(unique_tweets)} tweets failed to insert")
+    if saved:
+        mark_seen([tweet['id'] for tweet in unique_tweets])
+    return inserted_count
+
+
+@traced("reenrich")
+def reenrich_tweets(limit=None, stale_models=False):
+    """Re-run only the missing or failed enrichment stages of stored tweets, newest first."""
+    candidates = get_tweets_needing_enrichment(limit or REENRICH_BATCH_SIZE)
+    updated = []
+    run_budget = budget.current()
+    for tweet_data in candidates:
+        if not run_budget.can_start("tweet"):
+            break
+        if "enrichment" not in tweet_data:
+            tweet_data["enrichment"] = enrichment.infer_status(tweet_data)
+        stages = enrichment.stages_to_run(tweet_data, stale_models)
+        if stages:
+            with span("tweet", tweet_id=tweet_data['id']):
+                logging.info(f"Re-enriching tweet {tweet_data['id']}: {', '.join(stages)}")
+                run_stages(tweet_data, stages)
+        else:
+            enrichment.refresh_pending(tweet_data)
+        updated.append(stored_record(tweet_data))
+    if updated:
+        persist_tweets(updated)
+    logging.info(f"Re-enrichment updated {len(updated)} tweets")
+    return len(updated)
 
 
+@traced("twitter.lookup")
 def referenced_tweet_id_lookup(tweet_id):
     url = f"https://api.twitter.com/2/tweets/{tweet_id}"
     params = {
@@ -184,12 +481,15 @@ def referenced_tweet_id_lookup(tweet_id):
         "Authorization": f"Bearer {BEARER_TOKEN}"
     }
 
-    response = requests.get(url, params=params, headers=headers)
+    response = get_http_session().get(url, params=params, headers=headers)
+    annotate(status=response.status_code, size=len(response.content))
+    metrics.observe_twitter_response(response, "lookup")
 
     if response.status_code != 200:
         logging.error(
             f"Failed to fetch referenced tweet {tweet_id}: {response.status_code}")
-        return {"text": "", "image_description": "", "image_url": ""}
+        return {"text": "", "image_description": "", "image_url": "",
+                "error": f"HTTP {response.status_code}"}
 
     ref_tweet_data = response.json()
     tweet = ref_tweet_data['data']
@@ -228,20 +528,23 @@ def referenced_tweet_id_lookup(tweet_id):
     return {"text": tweet['text'], "image_description": media_description, "image_url": image_url}
 
 
+@traced("poll")
 def main():
-    existing_tweets = load_from_blob()
-    tweet_id, created_at, text = get_latest_tweet()
+    watermark = get_watermark(USER_ID)
 
-    if created_at:
+    pagination_token = watermark.get('pagination_token') if watermark else None
+    if pagination_token:
+        # Resume a fetch window that had more than one page of new tweets
+        start_time = datetime.fromisoformat(watermark['window_start'])
+    elif watermark and watermark['created_at']:
         latest_datetime = datetime.strptime(
-            created_at, "%Y-%m-%dT%H:%M:%S.%fZ")
+            watermark['created_at'], "%Y-%m-%dT%H:%M:%S.%fZ")
         start_time = (latest_datetime + timedelta(seconds=1)
                       ).replace(tzinfo=timezone.utc)
     else:
         start_time = (datetime.now(timezone.utc) - timedelta(hours=24))
 
-    user_id = "44196397"  # Elon Musk's Twitter user ID
-    url = f"https://api.twitter.com/2/users/{user_id}/tweets"
+    url = f"https://api.twitter.com/2/users/{USER_ID}/tweets"
     params = {
         "tweet.fields": "attachments,created_at,text,author_id,referenced_tweets",
         "expansions": "attachments.media_keys,referenced_tweets.id",
@@ -250,23 +553,74 @@ def main():
         "max_results": 100,
         "start_time": start_time.isoformat()
     }
+    if pagination_token:
+        params["pagination_token"] = pagination_token
     headers = {
         "Authorization": f"Bearer {BEARER_TOKEN}"
     }
 
     logging.info(f"Fetching tweets since: {start_time.isoformat()}")
-    response = requests.get(url, params=params, headers=headers)
+    with span("twitter.fetch") as fetch_span:
+        response = get_http_session().get(url, params=params, headers=headers)
+        fetch_span.set(status=response.status_code, size=len(response.content))
+    metrics.observe_twitter_response(response, "timeline")
 
     if response.status_code == 200:
         response_json = response.json()
-        new_tweets = parse_tweets(response_json)
-
+        metrics.inc("tweets_fetched_total", len(response_json.get('data', [])))
+        if pipeline.is_queued():
+            # Enrichment and persistence happen in the queue triggers; the watermark
+            # can move as soon as the tweets are safely queued
+            pipeline.enqueue(pipeline.ENRICH_QUEUE, unseen_messages(pipeline.enrichment_messages(response_json)))
+            update_watermark(USER_ID, response_json.get('data', []),
+                             pagination_token=response_json.get(
+                                 'meta', {}).get('next_token'),
+                             window_start=start_time.isoformat())
+            metrics.mark_success("poll")
+            return
+
+        fetched = response_json.get('data', [])
+        if not fetched:
+            logging.warning("No new tweets found.")
+        # Tweets a previous run had no time for go first, then the newest of this fetch
+        carried_over = pipeline.load_carryover()
+        work = unseen_messages(pipeline.newest_first(
+            carried_over + pipeline.enrichment_messages(response_json)))
+        new_tweets, leftover = enrich_batch(work)
+
+        error_count = 0
+        saved = False
         if new_tweets:
-            all_tweets = existing_tweets + new_tweets
-            save_to_blob(all_tweets)
-            insert_tweets_into_db(new_tweets)
+            with lease.single_flight("archive", wait=ARCHIVE_LEASE_WAIT) as archive_lease:
+                if archive_lease is None:
+                    logging.error("Archive is busy; not saving this poll, it will be fetched again")
+                    return
+                saved = merge_into_archive(new_tweets)
+            inserted_count, skipped_count, error_count = insert_tweets_into_db(
+                new_tweets)
+            query_api.invalidate("tweets")
+            if saved and error_count == 0:
+                # Failed inserts stay out of the index so a re-fetch retries them
+                mark_seen([tweet['id'] for tweet in new_tweets])
         else:
             logging.info("No new tweets to save or insert.")
+        if error_count:
+            # The watermark stays put, so this fetch comes back; the stored carryover is
+            # kept too, since its tweets' windows are already behind the watermark
+            logging.warning("Keeping the carryover because some inserts failed")
+        elif leftover or carried_over:
+            # Must be stored before the watermark moves past the tweets it holds
+            pipeline.save_carryover(leftover)
+
+        if error_count:
+            logging.warning(
+                "Not advancing the watermark because some inserts failed")
+        elif fetched or pagination_token:
+            update_watermark(USER_ID, fetched,
+                             pagination_token=response_json.get(
+                                 'meta', {}).get('next_token'),
+                             window_start=start_time.isoformat())
+        metrics.mark_success("poll")
     else:
         logging.error(f"Failed to fetch tweets: {response.status_code}")
         logging.error(f"Response: {response.json()}")
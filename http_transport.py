@@ -0,0 +1,259 @@
+import os
+import gzip
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from collections import defaultdict, deque
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import httpx
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Record/replay for the Twitter and OpenAI traffic. A cassette is a gzip file of
+# JSON lines, one exchange per line, appended as requests complete:
+#   HTTP_CASSETTE_MODE=record  - pass requests through and append them to the cassette
+#   HTTP_CASSETTE_MODE=replay  - answer from the cassette, never touching the network
+# Replayed responses take their recorded duration multiplied by
+# HTTP_CASSETTE_TIME_SCALE (1 = original timing, 0 = instant).
+CASSETTE_MODE = os.environ.get("HTTP_CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.environ.get("HTTP_CASSETTE_PATH", "cassettes/http.jsonl.gz")
+TIME_SCALE = float(os.environ.get("HTTP_CASSETTE_TIME_SCALE", "1.0"))
+
+# Never written to a cassette
+SENSITIVE_HEADERS = {"authorization", "proxy-authorization", "cookie", "set-cookie", "api-key",
+                     "x-api-key", "openai-organization", "openai-project"}
+SENSITIVE_PARAMS = {"api_key", "access_token", "key", "token", "sig"}
+# Describe the bytes as they were on the wire, not the decoded body we store
+DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+_cassettes = {}
+_lock = threading.Lock()
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode when no recorded exchange matches a request."""
+
+
+def _clean_url(url):
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if name.lower() not in SENSITIVE_PARAMS]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def _route(method, url):
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.netloc}{parts.path}"
+
+
+def _body_digest(body):
+    if not body:
+        return None
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+def _clean_headers(headers, dropped=()):
+    return {name: value for name, value in headers.items()
+            if name.lower() not in SENSITIVE_HEADERS and name.lower() not in dropped}
+
+
+def _encode_body(content):
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(entry):
+    if "body_base64" in entry:
+        return base64.b64decode(entry["body_base64"])
+    return entry.get("body", "").encode("utf-8")
+
+
+class Cassette:
+    """Recorded exchanges for one cassette file, shared by every client in the process."""
+
+    def __init__(self, path, mode, time_scale=TIME_SCALE):
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self.stats = {"requests": 0, "bytes_sent": 0, "bytes_received": 0, "misses": 0}
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._by_key = defaultdict(deque)
+        self._by_route = defaultdict(deque)
+        self._used = set()
+        if mode == "replay":
+            self._load()
+
+    def _load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as cassette_file:
+            entries = [json.loads(line) for line in cassette_file if line.strip()]
+        for index, entry in enumerate(entries):
+            self._by_key[self._key(entry["method"], entry["url"], entry.get("body_sha256"))].append(index)
+            self._by_route[_route(entry["method"], entry["url"])].append(index)
+        self._entries = entries
+        logging.info(f"Loaded {len(entries)} recorded exchanges from {self.path}")
+
+    @staticmethod
+    def _key(method, url, digest):
+        return (method.upper(), url, digest)
+
+    def record(self, method, url, request_headers, request_body, status, reason, response_headers,
+               content, elapsed):
+        entry = {
+            "method": method.upper(),
+            "url": _clean_url(url),
+            "request_headers": _clean_headers(request_headers),
+            "body_sha256": _body_digest(request_body),
+            "status": status,
+            "reason": reason,
+            "headers": _clean_headers(response_headers, DROPPED_RESPONSE_HEADERS),
+            "offset": round(time.monotonic() - self._started - elapsed, 6),
+            "elapsed": round(elapsed, 6),
+            **_encode_body(content)
+        }
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._count(request_body, content)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Each append is a complete gzip member, so a crashed run still leaves a readable cassette
+            with gzip.open(self.path, "at", encoding="utf-8") as cassette_file:
+                cassette_file.write(line)
+
+    def play(self, method, url, request_body):
+        """Return the next unused matching exchange, sleeping for its scaled duration."""
+        url = _clean_url(url)
+        with self._lock:
+            # Exact match first; then the next exchange on the same route, because
+            # query strings carry run-dependent values such as start_time
+            index = self._next(self._by_key[self._key(method, url, _body_digest(request_body))])
+            if index is None:
+                index = self._next(self._by_route[_route(method, url)])
+            if index is None:
+                self.stats["misses"] += 1
+                raise CassetteMissError(f"No recorded exchange for {method.upper()} {url} in {self.path}")
+            self._used.add(index)
+            entry = self._entries[index]
+            content = _decode_body(entry)
+            self._count(request_body, content)
+        if self.time_scale:
+            time.sleep(entry["elapsed"] * self.time_scale)
+        return entry, content
+
+    def _next(self, candidates):
+        while candidates and candidates[0] in self._used:
+            candidates.popleft()
+        return candidates.popleft() if candidates else None
+
+    def _count(self, request_body, content):
+        self.stats["requests"] += 1
+        self.stats["bytes_sent"] += len(request_body or b"")
+        self.stats["bytes_received"] += len(content)
+
+
+def get_cassette(path=None, mode=None):
+    path = path or CASSETTE_PATH
+    mode = mode or CASSETTE_MODE
+    with _lock:
+        cassette = _cassettes.get((path, mode))
+        if cassette is None:
+            cassette = Cassette(path, mode)
+            _cassettes[(path, mode)] = cassette
+        return cassette
+
+
+# ---------------------------------------------------------------------------
+# requests (Twitter API)
+# ---------------------------------------------------------------------------
+
+class CassetteAdapter(HTTPAdapter):
+
+    def __init__(self, cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.cassette.mode == "replay":
+            entry, content = self.cassette.play(request.method, request.url, request.body)
+            response = Response()
+            response.status_code = entry["status"]
+            response.reason = entry.get("reason")
+            response.headers = CaseInsensitiveDict(entry["headers"])
+            response.encoding = get_encoding_from_headers(response.headers)
+            response._content = content
+            response.url = request.url
+            response.request = request
+            response.connection = self
+            return response
+
+        started = time.monotonic()
+        response = super().send(request, **kwargs)
+        content = response.content
+        self.cassette.record(request.method, request.url, request.headers, request.body,
+                             response.status_code, response.reason, response.headers, content,
+                             time.monotonic() - started)
+        return response
+
+
+def install(session, cassette=None, **adapter_kwargs):
+    """Route a requests session through the cassette when record/replay is enabled."""
+    if cassette is None:
+        if CASSETTE_MODE == "off":
+            return session
+        cassette = get_cassette()
+    adapter = CassetteAdapter(cassette, **adapter_kwargs)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# ---------------------------------------------------------------------------
+# httpx (OpenAI SDK)
+# ---------------------------------------------------------------------------
+
+class CassetteTransport(httpx.BaseTransport):
+
+    def __init__(self, cassette, transport=None):
+        self.cassette = cassette
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        body = request.read()
+        if self.cassette.mode == "replay":
+            entry, content = self.cassette.play(request.method, str(request.url), body)
+            return httpx.Response(entry["status"], headers=entry["headers"], content=content,
+                                  request=request)
+
+        started = time.monotonic()
+        response = self._transport.handle_request(request)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+        headers = _clean_headers(response.headers, DROPPED_RESPONSE_HEADERS)
+        self.cassette.record(request.method, str(request.url), request.headers, body,
+                             response.status_code, response.reason_phrase, response.headers, content,
+                             time.monotonic() - started)
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    def close(self):
+        self._transport.close()
+
+
+def httpx_client(cassette=None, **client_kwargs):
+    """An httpx.Client for the OpenAI SDK, or None when record/replay is off."""
+    if cassette is None:
+        if CASSETTE_MODE == "off":
+            return None
+        cassette = get_cassette()
+    return httpx.Client(transport=CassetteTransport(cassette), **client_kwargs)
@@ -0,0 +1,119 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from clients import ensure_blob_container
+
+# Single-flight guards built on blob leases. A lease blob per guarded job lives in
+# LEASE_CONTAINER; holding its lease means holding the job. Leases are renewed in
+# the background and expire on their own if the holder dies, so a crashed worker
+# never blocks the next run for longer than LEASE_DURATION.
+LEASE_CONTAINER = os.environ.get("LEASE_CONTAINER_NAME", "locks")
+LEASE_DURATION = int(os.environ.get("LEASE_DURATION_SECONDS", "60"))  # Azure allows 15-60
+
+_active = contextvars.ContextVar("active_leases", default=())
+
+
+class LeaseLostError(Exception):
+    """Raised when a lease could not be renewed, so another worker may now own the job."""
+
+
+class Lease:
+
+    def __init__(self, name, lease_client):
+        self.name = name
+        self.lease_client = lease_client
+        self.acquired_at = datetime.now(timezone.utc)
+        self.lost = False
+        self._stop = threading.Event()
+        self._renewer = threading.Thread(target=self._renew, name=f"lease-{name}", daemon=True)
+        self._renewer.start()
+
+    def _renew(self):
+        while not self._stop.wait(LEASE_DURATION / 3):
+            try:
+                self.lease_client.renew()
+            except HttpResponseError as e:
+                self.lost = True
+                logging.error(f"Lost the {self.name} lease: {str(e)}")
+                return
+
+    def check(self):
+        if self.lost:
+            raise LeaseLostError(f"The {self.name} lease was lost; stopping before writing")
+
+    def release(self):
+        self._stop.set()
+        self._renewer.join()
+        if self.lost:
+            return
+        try:
+            self.lease_client.release()
+        except HttpResponseError as e:
+            logging.warning(f"Could not release the {self.name} lease: {str(e)}")
+
+
+def _lease_blob(name):
+    blob_client = ensure_blob_container(LEASE_CONTAINER).get_blob_client(f"{name}.lock")
+    if not blob_client.exists():
+        try:
+            blob_client.upload_blob(b"", overwrite=False)
+        except ResourceExistsError:
+            pass
+    return blob_client
+
+
+def acquire(name, wait=0, poll_interval=1.0):
+    """Try to take the lease for `name`, waiting up to `wait` seconds; None if it stays taken."""
+    blob_client = _lease_blob(name)
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            return Lease(name, blob_client.acquire_lease(lease_duration=LEASE_DURATION))
+        except HttpResponseError as e:
+            if e.status_code != 409:
+                raise
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(poll_interval)
+
+
+@contextmanager
+def single_flight(name, wait=0):
+    """Yield a Lease while holding the job, or None when another worker holds it."""
+    held = acquire(name, wait=wait)
+    if held is None:
+        yield None
+        return
+    token = _active.set(_active.get() + (held,))
+    try:
+        yield held
+    finally:
+        _active.reset(token)
+        held.release()
+
+
+def check():
+    """Raise LeaseLostError if any lease guarding this context was lost (no-op without one)."""
+    for held in _active.get():
+        held.check()
+
+
+def request_handoff(name):
+    """Leave a marker asking the current holder to run one more pass before releasing."""
+    ensure_blob_container(LEASE_CONTAINER).get_blob_client(f"{name}.handoff").upload_blob(
+        datetime.now(timezone.utc).isoformat().encode("utf-8"), overwrite=True)
+
+
+def take_handoff(name):
+    """Consume a handoff marker; True if an overlapping invocation left one."""
+    blob_client = ensure_blob_container(LEASE_CONTAINER).get_blob_client(f"{name}.handoff")
+    try:
+        blob_client.delete_blob()
+        return True
+    except ResourceNotFoundError:
+        return False
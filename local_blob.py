@@ -0,0 +1,317 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timezone
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+
+# In-process stand-ins for the subset of the Blob SDK this project uses. Byte
+# counters on the service client let benchmarks report storage traffic.
+
+
+def _storage_error(error_class, status_code, error_code, message):
+    error = error_class(message)
+    error.status_code = status_code
+    error.error_code = error_code
+    return error
+
+
+class _Download:
+
+    def __init__(self, data):
+        self._data = data
+        self.size = len(data)
+
+    def readall(self):
+        return self._data
+
+    def content_as_text(self, encoding="UTF-8"):
+        return self._data.decode(encoding)
+
+
+class BlobProperties(dict):
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class LocalBlobLeaseClient:
+
+    def __init__(self, service, container_name, blob_name, lease_id=None):
+        self._service = service
+        self._blob = (container_name, blob_name)
+        self.id = lease_id or str(uuid.uuid4())
+
+    def acquire(self, lease_duration=-1, **kwargs):
+        self._service._lease("acquire", self._blob, self.id, lease_duration)
+
+    def renew(self, **kwargs):
+        self._service._lease("renew", self._blob, self.id)
+
+    def release(self, **kwargs):
+        self._service._lease("release", self._blob, self.id)
+
+    def break_lease(self, **kwargs):
+        self._service._lease("break", self._blob, self.id)
+
+
+class LocalBlobClient:
+
+    def __init__(self, service, container_name, blob_name):
+        self._service = service
+        self.container_name = container_name
+        self.blob_name = blob_name
+
+    def download_blob(self, **kwargs):
+        data = self._service._request("download", self.container_name, self.blob_name)
+        return _Download(data)
+
+    def upload_blob(self, data, overwrite=False, lease=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        elif not isinstance(data, bytes):
+            data = data.read()
+        return self._service._request("upload", self.container_name, self.blob_name,
+                                      data=data, overwrite=overwrite, lease=lease)
+
+    def exists(self, **kwargs):
+        return self._service._request("exists", self.container_name, self.blob_name)
+
+    def delete_blob(self, lease=None, **kwargs):
+        self._service._request("delete", self.container_name, self.blob_name, lease=lease)
+
+    def get_blob_properties(self, **kwargs):
+        return self._service._request("properties", self.container_name, self.blob_name)
+
+    def acquire_lease(self, lease_duration=-1, lease_id=None, **kwargs):
+        lease = LocalBlobLeaseClient(self._service, self.container_name, self.blob_name, lease_id)
+        lease.acquire(lease_duration=lease_duration)
+        return lease
+
+
+class LocalContainerClient:
+
+    def __init__(self, service, container_name):
+        self._service = service
+        self.container_name = container_name
+
+    def create_container(self, **kwargs):
+        self._service._request("create_container", self.container_name)
+
+    def exists(self, **kwargs):
+        return self._service._request("container_exists", self.container_name)
+
+    def get_blob_client(self, blob):
+        return LocalBlobClient(self._service, self.container_name, blob)
+
+    def upload_blob(self, name, data, overwrite=False, **kwargs):
+        blob_client = self.get_blob_client(name)
+        blob_client.upload_blob(data, overwrite=overwrite)
+        return blob_client
+
+    def download_blob(self, blob, **kwargs):
+        return self.get_blob_client(blob).download_blob()
+
+    def delete_blob(self, blob, **kwargs):
+        self.get_blob_client(blob).delete_blob()
+
+    def list_blobs(self, name_starts_with=None, **kwargs):
+        return self._service._request("list", self.container_name, prefix=name_starts_with or "")
+
+
+class LocalBlobServiceClient:
+    """Drop-in for BlobServiceClient; subclasses decide where the bytes live."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.stats = {"requests": 0, "bytes_uploaded": 0, "bytes_downloaded": 0}
+        self._lock = threading.RLock()
+        self._leases = {}  # (container, blob) -> (lease id, monotonic expiry or None)
+
+    # Storage primitives -------------------------------------------------
+    def _container_exists(self, container_name):
+        raise NotImplementedError
+
+    def _create_container(self, container_name):
+        raise NotImplementedError
+
+    def _read(self, container_name, blob_name):
+        raise NotImplementedError
+
+    def _write(self, container_name, blob_name, data):
+        raise NotImplementedError
+
+    def _remove(self, container_name, blob_name):
+        raise NotImplementedError
+
+    def _names(self, container_name):
+        raise NotImplementedError
+
+    # Blob API --------------------------------------------------------------
+    def get_container_client(self, container):
+        return LocalContainerClient(self, container)
+
+    def get_blob_client(self, container, blob):
+        return LocalBlobClient(self, container, blob)
+
+    def _active_lease(self, blob):
+        lease = self._leases.get(blob)
+        if lease and lease[1] is not None and lease[1] <= time.monotonic():
+            return None
+        return lease
+
+    def _lease(self, action, blob, lease_id, lease_duration=-1):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.stats["requests"] += 1
+            if self._read(*blob) is None:
+                raise _storage_error(ResourceNotFoundError, 404, "BlobNotFound", f"Blob {blob[1]} not found")
+            active = self._active_lease(blob)
+            if action == "break":
+                self._leases.pop(blob, None)
+            elif active and active[0] != lease_id:
+                raise _storage_error(ResourceExistsError, 409, "LeaseAlreadyPresent",
+                                     f"Blob {blob[1]} is leased by another client")
+            elif action == "acquire":
+                expiry = None if lease_duration == -1 else time.monotonic() + lease_duration
+                self._leases[blob] = (lease_id, expiry, lease_duration)
+            elif action == "renew":
+                # An expired lease can be renewed as long as nobody else took the blob meanwhile
+                stored = self._leases.get(blob)
+                if stored is None or stored[0] != lease_id:
+                    raise _storage_error(ResourceExistsError, 409, "LeaseIdMismatchWithLeaseOperation",
+                                         f"Lease {lease_id} no longer exists on {blob[1]}")
+                duration = stored[2]
+                self._leases[blob] = (lease_id, None if duration == -1 else time.monotonic() + duration, duration)
+            elif action == "release":
+                self._leases.pop(blob, None)
+
+    def _request(self, action, container_name, blob_name=None, data=None, overwrite=False, prefix="",
+                 lease=None):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.stats["requests"] += 1
+            if action == "create_container":
+                if self._container_exists(container_name):
+                    raise ResourceExistsError(f"Container {container_name} already exists")
+                self._create_container(container_name)
+                return None
+            if action == "container_exists":
+                return self._container_exists(container_name)
+            if not self._container_exists(container_name):
+                if action == "exists":
+                    return False
+                raise ResourceNotFoundError(f"Container {container_name} not found")
+            if action == "list":
+                return [self._properties(container_name, name) for name in sorted(self._names(container_name))
+                        if name.startswith(prefix)]
+
+            existing = self._read(container_name, blob_name)
+            if action == "exists":
+                return existing is not None
+            if action in ("upload", "delete"):
+                active = self._active_lease((container_name, blob_name))
+                lease_id = getattr(lease, "id", lease)
+                if active and active[0] != lease_id:
+                    raise _storage_error(HttpResponseError, 412, "LeaseIdMissing",
+                                         f"Blob {blob_name} is leased; writes need the lease id")
+            if action == "upload":
+                if existing is not None and not overwrite:
+                    raise ResourceExistsError(f"Blob {blob_name} already exists")
+                self._write(container_name, blob_name, data)
+                self.stats["bytes_uploaded"] += len(data)
+                return self._properties(container_name, blob_name)
+            if existing is None:
+                raise ResourceNotFoundError(f"Blob {blob_name} not found")
+            if action == "download":
+                self.stats["bytes_downloaded"] += len(existing)
+                return existing
+            if action == "delete":
+                self._remove(container_name, blob_name)
+                self._leases.pop((container_name, blob_name), None)
+                return None
+            if action == "properties":
+                return self._properties(container_name, blob_name)
+        raise ValueError(f"Unsupported blob action {action}")
+
+    def _properties(self, container_name, blob_name):
+        data = self._read(container_name, blob_name)
+        return BlobProperties(name=blob_name, container=container_name, size=len(data),
+                              etag=f'"{hashlib.md5(data).hexdigest()}"',
+                              last_modified=datetime.now(timezone.utc))
+
+
+class InMemoryBlobServiceClient(LocalBlobServiceClient):
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self._containers = {}
+
+    def _container_exists(self, container_name):
+        return container_name in self._containers
+
+    def _create_container(self, container_name):
+        self._containers[container_name] = {}
+
+    def _read(self, container_name, blob_name):
+        return self._containers[container_name].get(blob_name)
+
+    def _write(self, container_name, blob_name, data):
+        self._containers[container_name][blob_name] = bytes(data)
+
+    def _remove(self, container_name, blob_name):
+        self._containers[container_name].pop(blob_name, None)
+
+    def _names(self, container_name):
+        return list(self._containers[container_name])
+
+
+class FileSystemBlobServiceClient(LocalBlobServiceClient):
+    """Stores each blob as a file under root/<container>/<blob name>."""
+
+    def __init__(self, root, latency=0.0):
+        super().__init__(latency)
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, container_name, blob_name=""):
+        return os.path.join(self.root, container_name, *blob_name.split("/"))
+
+    def _container_exists(self, container_name):
+        return os.path.isdir(self._path(container_name))
+
+    def _create_container(self, container_name):
+        os.makedirs(self._path(container_name), exist_ok=True)
+
+    def _read(self, container_name, blob_name):
+        try:
+            with open(self._path(container_name, blob_name), "rb") as blob_file:
+                return blob_file.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def _write(self, container_name, blob_name, data):
+        path = self._path(container_name, blob_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "wb") as blob_file:
+            blob_file.write(data)
+        os.replace(temporary_path, path)
+
+    def _remove(self, container_name, blob_name):
+        try:
+            os.remove(self._path(container_name, blob_name))
+        except FileNotFoundError:
+            pass
+
+    def _names(self, container_name):
+        base = self._path(container_name)
+        for directory, _, files in os.walk(base):
+            for name in files:
+                yield os.path.relpath(os.path.join(directory, name), base).replace(os.sep, "/")
@@ -0,0 +1,924 @@
+import re
+import json
+import time
+import asyncio
+import uuid
+import base64
+import sqlite3
+import threading
+from types import SimpleNamespace
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+# In-process stand-ins for the subset of the Cosmos container API this project uses.
+# Request charges are a rough model of real RU costs (size, indexed terms, scanned
+# documents) so relative comparisons between runs are meaningful; absolute numbers are not.
+
+# Throttled point operations and queries are retried inside the stand-in, as the SDK's
+# retry policy does (9 attempts by default); only transactional batches see the 429.
+MAX_THROTTLE_RETRIES = 9
+
+DEFAULT_INDEXING_POLICY = {
+    "indexingMode": "consistent",
+    "automatic": True,
+    "includedPaths": [{"path": "/*"}],
+    "excludedPaths": [{"path": "/\"_etag\"/?"}]
+}
+
+UNDEFINED = object()
+
+
+def _error(error_class, status_code, message, headers=None):
+    error = error_class(status_code=status_code, message=message)
+    error.headers = headers or {}
+    return error
+
+
+# ---------------------------------------------------------------------------
+# Query evaluation for the Cosmos SQL subset the project issues
+# ---------------------------------------------------------------------------
+
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<param>@\w+)
+      | (?P<name>[A-Za-z_]\w*)
+      | (?P<symbol>>=|<=|!=|<>|[=<>(),.\[\]*])
+    )""", re.VERBOSE)
+
+_KEYWORDS = {"SELECT", "TOP", "VALUE", "FROM", "WHERE", "ORDER", "BY", "ASC", "DESC", "AND", "OR",
+             "NOT", "AS", "TRUE", "FALSE", "NULL", "OFFSET", "LIMIT"}
+
+
+def _tokenize(query):
+    tokens, position = [], 0
+    query = query.strip()
+    while position < len(query):
+        match = _TOKEN_PATTERN.match(query, position)
+        if not match or match.end() == position:
+            raise _error(exceptions.CosmosHttpResponseError, 400, f"Unsupported query syntax near: {query[position:]}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name" and value.upper() in _KEYWORDS:
+            tokens.append(("keyword", value.upper()))
+        else:
+            tokens.append((kind, value))
+    return tokens
+
+
+def _compare(left, right, operator):
+    if left is UNDEFINED or right is UNDEFINED:
+        return UNDEFINED
+    if operator in ("=", "!=", "<>"):
+        equal = type(left) is type(right) and left == right or (
+            isinstance(left, (int, float)) and isinstance(right, (int, float)) and left == right)
+        return equal if operator == "=" else not equal
+    comparable = (isinstance(left, str) and isinstance(right, str)) or (
+        isinstance(left, (int, float)) and isinstance(right, (int, float))
+        and not isinstance(left, bool) and not isinstance(right, bool))
+    if not comparable:
+        return UNDEFINED
+    return {"<": left < right, ">": left > right, "<=": left <= right, ">=": left >= right}[operator]
+
+
+def _sort_key(value):
+    # Cosmos orders undefined < null < booleans < numbers < strings
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, json.dumps(value, sort_keys=True))
+
+
+_FUNCTIONS = {
+    "ARRAY_CONTAINS": lambda array, value, *_: (
+        UNDEFINED if not isinstance(array, list) else value in array),
+    "ARRAY_LENGTH": lambda array: len(array) if isinstance(array, list) else UNDEFINED,
+    "IS_DEFINED": lambda value: value is not UNDEFINED,
+    "STARTSWITH": lambda value, prefix, *_: (
+        value.startswith(prefix) if isinstance(value, str) and isinstance(prefix, str) else UNDEFINED),
+    "CONTAINS": lambda value, part, *_: (
+        part in value if isinstance(value, str) and isinstance(part, str) else UNDEFINED),
+    "LOWER": lambda value: value.lower() if isinstance(value, str) else UNDEFINED,
+}
+
+
+class _Parser:
+    def __init__(self, query):
+        self.tokens = _tokenize(query)
+        self.position = 0
+        self.alias = "c"
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def accept(self, value):
+        kind, token = self.peek()
+        if token is not None and (token == value) and kind in ("keyword", "symbol"):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, value):
+        if not self.accept(value):
+            raise _error(exceptions.CosmosHttpResponseError, 400,
+                         f"Expected {value} but found {self.peek()[1]}")
+
+    def parse(self):
+        query = {"top": None, "value": None, "star": False, "projection": [], "where": None,
+                 "order_by": [], "offset": 0, "limit": None, "count": False}
+        self.expect("SELECT")
+        if self.accept("TOP"):
+            query["top"] = int(self.next_value())
+        if self.accept("VALUE"):
+            if self.peek()[1] and self.peek()[1].upper() == "COUNT":
+                self.position += 1
+                self.expect("(")
+                self.parse_expression()
+                self.expect(")")
+                query["count"] = True
+            else:
+                query["value"] = self.parse_expression()
+        elif self.accept("*"):
+            query["star"] = True
+        else:
+            while True:
+                start = self.position
+                expression = self.parse_expression()
+                name = next(token.strip("'\"") for kind, token in reversed(self.tokens[start:self.position])
+                            if kind in ("name", "string"))
+                if self.accept("AS"):
+                    name = self.next_value()
+                elif self.position - start == 1 and self.tokens[start][1] == self.alias:
+                    name = self.alias
+                query["projection"].append((name, expression))
+                if not self.accept(","):
+                    break
+        self.expect("FROM")
+        self.alias = self.next_value()
+        if self.accept("WHERE"):
+            query["where"] = self.parse_expression()
+        if self.accept("ORDER"):
+            self.expect("BY")
+            while True:
+                expression = self.parse_expression()
+                descending = self.accept("DESC")
+                if not descending:
+                    self.accept("ASC")
+                query["order_by"].append((expression, descending))
+                if not self.accept(","):
+                    break
+        if self.accept("OFFSET"):
+            query["offset"] = int(self.next_value())
+            self.expect("LIMIT")
+            query["limit"] = int(self.next_value())
+        if self.position != len(self.tokens):
+            raise _error(exceptions.CosmosHttpResponseError, 400,
+                         f"Unsupported query syntax near: {self.peek()[1]}")
+        return query
+
+    def next_value(self):
+        kind, token = self.peek()
+        self.position += 1
+        return token
+
+    def parse_expression(self):
+        left = self.parse_and()
+        while self.accept("OR"):
+            right = self.parse_and()
+            left = (lambda l, r: lambda d, p: l(d, p) is True or r(d, p) is True)(left, right)
+        return left
+
+    def parse_and(self):
+        left = self.parse_not()
+        while self.accept("AND"):
+            right = self.parse_not()
+            left = (lambda l, r: lambda d, p: l(d, p) is True and r(d, p) is True)(left, right)
+        return left
+
+    def parse_not(self):
+        if self.accept("NOT"):
+            operand = self.parse_not()
+            return lambda d, p: (lambda v: UNDEFINED if v is UNDEFINED else not v)(operand(d, p))
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        left = self.parse_primary()
+        kind, token = self.peek()
+        if kind == "symbol" and token in ("=", "!=", "<>", "<", ">", "<=", ">="):
+            self.position += 1
+            right = self.parse_primary()
+            return lambda d, p: _compare(left(d, p), right(d, p), token)
+        return left
+
+    def parse_primary(self):
+        kind, token = self.peek()
+        if self.accept("("):
+            expression = self.parse_expression()
+            self.expect(")")
+            return expression
+        self.position += 1
+        if kind == "string":
+            value = _string_literal(token)
+            return lambda d, p: value
+        if kind == "number":
+            value = float(token) if "." in token else int(token)
+            return lambda d, p: value
+        if kind == "param":
+            return lambda d, p: p.get(token, UNDEFINED)
+        if kind == "keyword" and token in ("TRUE", "FALSE", "NULL"):
+            value = {"TRUE": True, "FALSE": False, "NULL": None}[token]
+            return lambda d, p: value
+        if kind == "name" and self.accept("("):
+            arguments = []
+            if not self.accept(")"):
+                while True:
+                    arguments.append(self.parse_expression())
+                    if not self.accept(","):
+                        break
+                self.expect(")")
+            function = _FUNCTIONS.get(token.upper())
+            if function is None:
+                raise _error(exceptions.CosmosHttpResponseError, 400, f"Unsupported function {token}")
+            return lambda d, p: function(*(argument(d, p) for argument in arguments))
+        if kind == "name" and token == self.alias:
+            path = []
+            while True:
+                if self.accept("."):
+                    path.append(self.next_value())
+                elif self.accept("["):
+                    key_kind, key = self.peek()
+                    self.position += 1
+                    path.append(int(key) if key_kind == "number" else _string_literal(key))
+                    self.expect("]")
+                else:
+                    break
+            return lambda d, p: _resolve(d, path)
+        raise _error(exceptions.CosmosHttpResponseError, 400, f"Unsupported query token {token}")
+
+
+def _string_literal(token):
+    if token.startswith("'"):
+        return token[1:-1].replace("\\'", "'")
+    return json.loads(token)
+
+
+def _resolve(document, path):
+    value = document
+    for part in path:
+        if isinstance(value, dict) and isinstance(part, str) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and isinstance(part, int) and part < len(value):
+            value = value[part]
+        else:
+            return UNDEFINED
+    return value
+
+
+_query_cache = {}
+
+
+def evaluate_query(query, parameters, documents):
+    """Run a Cosmos SQL query over documents; returns (results, documents scanned)."""
+    parsed = _query_cache.get(query)
+    if parsed is None:
+        parsed = _query_cache[query] = _Parser(query).parse()
+    params = {parameter["name"]: parameter["value"] for parameter in parameters or []}
+
+    scanned = 0
+    matched = []
+    for document in documents:
+        scanned += 1
+        if parsed["where"] is None or parsed["where"](document, params) is True:
+            matched.append(document)
+
+    if parsed["order_by"]:
+        for expression, descending in reversed(parsed["order_by"]):
+            matched = [document for document in matched if expression(document, params) is not UNDEFINED]
+            matched.sort(key=lambda document: _sort_key(expression(document, params)), reverse=descending)
+
+    if parsed["count"]:
+        return [len(matched)], scanned
+
+    end = None if parsed["limit"] is None else parsed["offset"] + parsed["limit"]
+    matched = matched[parsed["offset"]:end]
+    if parsed["top"] is not None:
+        matched = matched[:parsed["top"]]
+
+    results = []
+    for document in matched:
+        if parsed["star"]:
+            results.append(document)
+        elif parsed["value"] is not None:
+            value = parsed["value"](document, params)
+            if value is not UNDEFINED:
+                results.append(value)
+        else:
+            projected = {}
+            for name, expression in parsed["projection"]:
+                value = expression(document, params)
+                if value is not UNDEFINED:
+                    projected[name] = value
+            results.append(projected)
+    return results, scanned
+
+
+# ---------------------------------------------------------------------------
+# Request-charge model
+# ---------------------------------------------------------------------------
+
+def _leaf_paths(value, prefix=""):
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from _leaf_paths(child, f"{prefix}/{key}")
+    elif isinstance(value, list):
+        for child in value:
+            yield from _leaf_paths(child, f"{prefix}/[]")
+    else:
+        yield prefix
+
+
+def _rule_matches(rule, path):
+    rule = rule.replace('"', '')
+    if rule.endswith("/?"):
+        return path == rule[:-2]
+    if rule.endswith("/*"):
+        base = rule[:-2]
+        return base == "" or path == base or path.startswith(base + "/")
+    return path == rule
+
+
+def indexed_term_count(document, indexing_policy):
+    if indexing_policy.get("indexingMode") == "none":
+        return 0
+    included = [rule["path"] for rule in indexing_policy.get("includedPaths", [])]
+    excluded = [rule["path"] for rule in indexing_policy.get("excludedPaths", [])]
+    count = 0
+    for path in _leaf_paths({k: v for k, v in document.items() if not k.startswith("_")}):
+        best_include = max((len(rule) for rule in included if _rule_matches(rule, path)), default=-1)
+        best_exclude = max((len(rule) for rule in excluded if _rule_matches(rule, path)), default=-1)
+        if best_include > best_exclude:
+            count += 1
+    return count
+
+
+def _size_kb(document):
+    return len(json.dumps(document)) / 1024
+
+
+def write_charge(document, indexing_policy):
+    return round(5.0 + 1.5 * _size_kb(document) + 0.2 * indexed_term_count(document, indexing_policy), 2)
+
+
+def read_charge(document):
+    return round(max(1.0, _size_kb(document)), 2)
+
+
+def query_charge(scanned, results):
+    returned_kb = sum(_size_kb(result) for result in results if isinstance(result, dict))
+    return round(2.5 + 0.05 * scanned + 0.2 * returned_kb, 2)
+
+
+# ---------------------------------------------------------------------------
+# Containers
+# ---------------------------------------------------------------------------
+
+class _ItemPaged:
+    """Mimics azure.core ItemPaged: iterate items, or by_page() with continuation tokens."""
+
+    def __init__(self, results, page_size, on_page):
+        self._results = results
+        self._page_size = page_size or 100
+        self._on_page = on_page
+
+    def __iter__(self):
+        for page in self.by_page():
+            yield from page
+
+    def by_page(self, continuation_token=None):
+        return _PageIterator(self, continuation_token)
+
+
+class _PageIterator:
+    def __init__(self, paged, continuation_token):
+        self._paged = paged
+        self._offset = json.loads(base64.b64decode(continuation_token))["offset"] if continuation_token else 0
+        self._done = False
+        self.continuation_token = continuation_token
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # An empty result still yields one empty page, as the service does
+        if self._done:
+            raise StopIteration
+        results = self._paged._results
+        page = results[self._offset:self._offset + self._paged._page_size]
+        self._offset += len(page)
+        self._done = self._offset >= len(results)
+        self._paged._on_page(page)
+        self.continuation_token = None if self._done else base64.b64encode(
+            json.dumps({"offset": self._offset}).encode()).decode()
+        return iter(page)
+
+
+class LocalContainer:
+    """Storage-agnostic container behaviour; subclasses provide the document primitives."""
+
+    def __init__(self, container_id, partition_key_path="/id", indexing_policy=None,
+                 throughput=None, latency=0.0, lock=None):
+        self.id = container_id
+        self.partition_key_path = partition_key_path
+        self.indexing_policy = indexing_policy or json.loads(json.dumps(DEFAULT_INDEXING_POLICY))
+        self.throughput = throughput
+        self.latency = latency
+        self.last_response_headers = {}
+        self.settings = {}  # other container properties (defaultTtl, ...), as the service returns them
+        self.stats = {"requests": 0, "request_charge": 0.0, "throttled": 0, "throttle_wait_seconds": 0.0}
+        self._lock = lock or threading.RLock()
+        self._window = (0, 0.0)
+
+    # Storage primitives -------------------------------------------------
+    def _get(self, partition_key, item_id):
+        raise NotImplementedError
+
+    def _put(self, partition_key, document):
+        raise NotImplementedError
+
+    def _remove(self, partition_key, item_id):
+        raise NotImplementedError
+
+    def _scan(self):
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+    # Helpers -------------------------------------------------------------
+    def _partition_key_of(self, document):
+        value = _resolve(document, self.partition_key_path.strip('/').split('/'))
+        return None if value is UNDEFINED else value
+
+    def _charge(self, charge, response_hook=None, result=None, retry=True):
+        """Account for a request; over the throughput it waits out the retry-after (or raises 429
+        when `retry` is off or the retries run out). Call without holding the container lock."""
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            if self.latency:
+                time.sleep(self.latency)
+            with self._lock:
+                self.stats["requests"] += 1
+                retry_after = self._throttle(charge)
+                if retry_after is None:
+                    self.stats["request_charge"] += charge
+                    headers = {"x-ms-request-charge": str(charge), "x-ms-activity-id": str(uuid.uuid4())}
+                    self.last_response_headers = headers
+                    break
+                self.stats["throttled"] += 1
+                headers = {"x-ms-retry-after-ms": str(retry_after), "x-ms-request-charge": "0"}
+                self.last_response_headers = headers
+                if not retry or attempt == MAX_THROTTLE_RETRIES:
+                    raise _error(exceptions.CosmosHttpResponseError, 429,
+                                 "Request rate is large (simulated)", headers)
+                self.stats["throttle_wait_seconds"] += retry_after / 1000
+            time.sleep(retry_after / 1000)
+        if response_hook:
+            response_hook(headers, result)
+        return headers
+
+    def _throttle(self, charge):
+        # Milliseconds until the current one-second window ends when `charge` does not fit, else None
+        if not self.throughput:
+            return None
+        now = time.monotonic()
+        window_start, used = self._window
+        if now - window_start >= 1.0:
+            window_start, used = now, 0.0
+        if used and used + charge > self.throughput:
+            return max(1, int((1.0 - (now - window_start)) * 1000))
+        self._window = (window_start, used + charge)
+        return None
+
+    def _stamp(self, document):
+        stored = json.loads(json.dumps(document))
+        stored["_etag"] = f'"{uuid.uuid4()}"'
+        stored["_ts"] = int(time.time())
+        return stored
+
+    @staticmethod
+    def _copy(document):
+        return json.loads(json.dumps(document))
+
+    def _check_etag(self, existing, etag, match_condition):
+        if match_condition == MatchConditions.IfNotModified and existing["_etag"] != etag:
+            raise _error(exceptions.CosmosAccessConditionFailedError, 412, "Precondition failed")
+
+    # Container API -------------------------------------------------------
+    def read(self, **kwargs):
+        self._charge(1.0, kwargs.get("response_hook"))
+        return {"id": self.id, "partitionKey": {"paths": [self.partition_key_path], "kind": "Hash", "version": 2},
+                "indexingPolicy": self._copy(self.indexing_policy), **self._copy(self.settings)}
+
+    def read_item(self, item, partition_key, **kwargs):
+        with self._lock:
+            document = self._get(partition_key, item)
+        if document is None:
+            self._charge(1.0)
+            raise _error(exceptions.CosmosResourceNotFoundError, 404, f"Item {item} not found")
+        self._charge(read_charge(document), kwargs.get("response_hook"), document)
+        return self._copy(document)
+
+    def create_item(self, body, **kwargs):
+        partition_key = self._partition_key_of(body)
+        # Charged before the lock is taken, so a throttled request waits without blocking others
+        self._charge(write_charge(body, self.indexing_policy), kwargs.get("response_hook"))
+        with self._lock:
+            if self._get(partition_key, body["id"]) is not None:
+                raise _error(exceptions.CosmosResourceExistsError, 409, f"Item {body['id']} already exists")
+            stored = self._stamp(body)
+            self._put(partition_key, stored)
+        return self._copy(stored)
+
+    def upsert_item(self, body, **kwargs):
+        partition_key = self._partition_key_of(body)
+        self._charge(write_charge(body, self.indexing_policy), kwargs.get("response_hook"))
+        with self._lock:
+            stored = self._stamp(body)
+            self._put(partition_key, stored)
+        return self._copy(stored)
+
+    def replace_item(self, item, body, etag=None, match_condition=None, **kwargs):
+        partition_key = self._partition_key_of(body)
+        self._charge(write_charge(body, self.indexing_policy), kwargs.get("response_hook"))
+        with self._lock:
+            existing = self._get(partition_key, item)
+            if existing is None:
+                raise _error(exceptions.CosmosResourceNotFoundError, 404, f"Item {item} not found")
+            self._check_etag(existing, etag, match_condition)
+            stored = self._stamp(body)
+            self._put(partition_key, stored)
+        return self._copy(stored)
+
+    def delete_item(self, item, partition_key, etag=None, match_condition=None, **kwargs):
+        item_id = item["id"] if isinstance(item, dict) else item
+        with self._lock:
+            existing = self._get(partition_key, item_id)
+        if existing is None:
+            self._charge(1.0)
+            raise _error(exceptions.CosmosResourceNotFoundError, 404, f"Item {item_id} not found")
+        self._charge(write_charge(existing, self.indexing_policy), kwargs.get("response_hook"))
+        with self._lock:
+            existing = self._get(partition_key, item_id)
+            if existing is None:
+                raise _error(exceptions.CosmosResourceNotFoundError, 404, f"Item {item_id} not found")
+            self._check_etag(existing, etag, match_condition)
+            self._remove(partition_key, item_id)
+
+    def query_items(self, query, parameters=None, enable_cross_partition_query=None,
+                    partition_key=None, max_item_count=None, **kwargs):
+        with self._lock:
+            documents = [self._copy(document) for document in self._scan()
+                         if partition_key is None or self._partition_key_of(document) == partition_key]
+        results, scanned = evaluate_query(query, parameters, documents)
+        response_hook = kwargs.get("response_hook")
+        pages_served = []
+
+        def on_page(page):
+            # The scan cost is paid by the first page, as with a real query
+            self._charge(query_charge(0 if pages_served else scanned, page), response_hook, page)
+            pages_served.append(len(page))
+        return _ItemPaged(results, max_item_count, on_page)
+
+    def read_all_items(self, max_item_count=None, **kwargs):
+        return self.query_items("SELECT * FROM c", max_item_count=max_item_count, **kwargs)
+
+    def execute_item_batch(self, batch_operations, partition_key, response_hook=None, **kwargs):
+        if len(batch_operations) > 100:
+            raise _error(exceptions.CosmosHttpResponseError, 400, "Batch request has more than 100 operations")
+        with self._lock:
+            staged = {}
+            results = []
+            charge = 0.0
+            for index, (operation, arguments, *_) in enumerate(batch_operations):
+                operation = operation.lower()
+                if operation in ("create", "upsert"):
+                    item_id, body = arguments[0]["id"], arguments[0]
+                elif operation == "replace":
+                    item_id, body = arguments[0], arguments[1]
+                else:
+                    item_id, body = arguments[0], None
+                if body is not None and self._partition_key_of(body) != partition_key:
+                    self._fail_batch(index, len(batch_operations), 400, "Partition key mismatch")
+
+                existing = staged[item_id] if item_id in staged else self._get(partition_key, item_id)
+                if operation == "create" and existing is not None:
+                    self._fail_batch(index, len(batch_operations), 409, f"Item {item_id} already exists")
+                if operation in ("replace", "delete", "read") and existing is None:
+                    self._fail_batch(index, len(batch_operations), 404, f"Item {item_id} not found")
+
+                if operation == "read":
+                    charge += read_charge(existing)
+                    results.append({"statusCode": 200, "resourceBody": self._copy(existing)})
+                elif operation == "delete":
+                    charge += write_charge(existing, self.indexing_policy)
+                    staged[item_id] = None
+                    results.append({"statusCode": 204})
+                else:
+                    charge += write_charge(body, self.indexing_policy)
+                    staged[item_id] = self._stamp(body)
+                    results.append({"statusCode": 201 if existing is None else 200,
+                                    "resourceBody": self._copy(staged[item_id])})
+
+            self._charge(round(charge, 2), response_hook, results, retry=False)
+            for item_id, document in staged.items():
+                if document is None:
+                    self._remove(partition_key, item_id)
+                else:
+                    self._put(partition_key, document)
+        return results
+
+    def _fail_batch(self, index, count, status_code, message):
+        responses = [{"statusCode": 424} for _ in range(count)]
+        responses[index] = {"statusCode": status_code}
+        raise exceptions.CosmosBatchOperationError(
+            error_index=index, headers={"x-ms-request-charge": "0"}, status_code=status_code,
+            message=message, operation_responses=responses)
+
+    def delete_all_items(self):
+        with self._lock:
+            self._clear()
+
+
+class InMemoryContainer(LocalContainer):
+
+    def __init__(self, container_id, **kwargs):
+        super().__init__(container_id, **kwargs)
+        self._documents = {}
+
+    def _get(self, partition_key, item_id):
+        return self._documents.get((json.dumps(partition_key), item_id))
+
+    def _put(self, partition_key, document):
+        self._documents[(json.dumps(partition_key), document["id"])] = document
+
+    def _remove(self, partition_key, item_id):
+        self._documents.pop((json.dumps(partition_key), item_id), None)
+
+    def _scan(self):
+        return list(self._documents.values())
+
+    def _clear(self):
+        self._documents.clear()
+
+
+class SqliteContainer(LocalContainer):
+
+    def __init__(self, container_id, connection, **kwargs):
+        super().__init__(container_id, **kwargs)
+        self._connection = connection
+        self._table = "c_" + re.sub(r"\W", "_", container_id)
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table} "
+            "(pk TEXT NOT NULL, id TEXT NOT NULL, body TEXT NOT NULL, PRIMARY KEY (pk, id))")
+        self._connection.commit()
+
+    def _get(self, partition_key, item_id):
+        row = self._connection.execute(
+            f"SELECT body FROM {self._table} WHERE pk = ? AND id = ?",
+            (json.dumps(partition_key), item_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, partition_key, document):
+        self._connection.execute(
+            f"INSERT OR REPLACE INTO {self._table} (pk, id, body) VALUES (?, ?, ?)",
+            (json.dumps(partition_key), document["id"], json.dumps(document)))
+        self._connection.commit()
+
+    def _remove(self, partition_key, item_id):
+        self._connection.execute(
+            f"DELETE FROM {self._table} WHERE pk = ? AND id = ?", (json.dumps(partition_key), item_id))
+        self._connection.commit()
+
+    def _scan(self):
+        return [json.loads(row[0]) for row in self._connection.execute(f"SELECT body FROM {self._table}")]
+
+    def _clear(self):
+        self._connection.execute(f"DELETE FROM {self._table}")
+        self._connection.commit()
+
+
+# ---------------------------------------------------------------------------
+# Database and client
+# ---------------------------------------------------------------------------
+
+def _container_settings(options):
+    names = {"default_ttl": "defaultTtl", "conflict_resolution_policy": "conflictResolutionPolicy",
+             "analytical_storage_ttl": "analyticalStorageTtl"}
+    return {names[key]: value for key, value in options.items() if key in names and value is not None}
+
+
+class LocalDatabase:
+
+    def __init__(self, database_id, path=None, default_partition_key_path="/id",
+                 throughput=None, latency=0.0):
+        self.id = database_id
+        self.default_partition_key_path = default_partition_key_path
+        self.throughput = throughput
+        self.latency = latency
+        self._containers = {}
+        self._connection = sqlite3.connect(path, check_same_thread=False) if path else None
+        self._lock = threading.RLock()
+
+    def _build(self, container_id, partition_key_path, indexing_policy=None):
+        options = {"partition_key_path": partition_key_path, "indexing_policy": indexing_policy,
+                   "throughput": self.throughput, "latency": self.latency}
+        if self._connection is not None:
+            # One SQLite connection is shared by every container, so they share its lock too
+            return SqliteContainer(container_id, self._connection, lock=self._lock, **options)
+        return InMemoryContainer(container_id, **options)
+
+    def get_container_client(self, container):
+        with self._lock:
+            if container not in self._containers:
+                self._containers[container] = self._build(container, self.default_partition_key_path)
+            return self._containers[container]
+
+    def create_container(self, id, partition_key, indexing_policy=None, **kwargs):
+        with self._lock:
+            if id in self._containers:
+                raise _error(exceptions.CosmosResourceExistsError, 409, f"Container {id} already exists")
+            self._containers[id] = self._build(id, partition_key["paths"][0], indexing_policy)
+            self._containers[id].settings = _container_settings(kwargs)
+            return self._containers[id]
+
+    def create_container_if_not_exists(self, id, partition_key, indexing_policy=None, **kwargs):
+        with self._lock:
+            if id in self._containers:
+                return self._containers[id]
+            return self.create_container(id, partition_key, indexing_policy=indexing_policy, **kwargs)
+
+    def replace_container(self, container, partition_key, indexing_policy=None, **kwargs):
+        container_id = container if isinstance(container, str) else container.id
+        existing = self.get_container_client(container_id)
+        if indexing_policy is not None:
+            existing.indexing_policy = json.loads(json.dumps(indexing_policy))
+        # Replacing a container replaces its whole definition; settings not passed again are reset
+        existing.settings = _container_settings(kwargs)
+        return existing
+
+    def delete_container(self, container):
+        container_id = container if isinstance(container, str) else container.id
+        with self._lock:
+            removed = self._containers.pop(container_id, None)
+            if removed is None:
+                raise _error(exceptions.CosmosResourceNotFoundError, 404, f"Container {container_id} not found")
+            removed.delete_all_items()
+
+
+class LocalCosmosClient:
+    """Drop-in for CosmosClient; pass `path` to persist documents in a SQLite file."""
+
+    def __init__(self, path=None, default_partition_key_path="/id", throughput=None, latency=0.0):
+        self._options = {"path": path, "default_partition_key_path": default_partition_key_path,
+                         "throughput": throughput, "latency": latency}
+        self._databases = {}
+
+    def get_database_client(self, database):
+        if database not in self._databases:
+            self._databases[database] = LocalDatabase(database, **self._options)
+        return self._databases[database]
+
+
+# ---------------------------------------------------------------------------
+# azure.cosmos.aio view of the same stand-in (maintenance jobs)
+# ---------------------------------------------------------------------------
+
+class _AsyncPage:
+    def __init__(self, items):
+        self._items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _AsyncPageIterator:
+    def __init__(self, pages):
+        self._pages = pages
+
+    @property
+    def continuation_token(self):
+        return self._pages.continuation_token
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        page = await asyncio.to_thread(next, self._pages, None)
+        if page is None:
+            raise StopAsyncIteration
+        return _AsyncPage(page)
+
+
+class _AsyncItemPaged:
+    def __init__(self, paged):
+        self._paged = paged
+
+    def by_page(self, continuation_token=None):
+        return _AsyncPageIterator(self._paged.by_page(continuation_token))
+
+    async def __aiter__(self):
+        async for page in self.by_page():
+            async for item in page:
+                yield item
+
+
+class AsyncLocalContainer:
+    """Awaitable wrapper over a LocalContainer; calls run in a thread like real I/O would."""
+
+    def __init__(self, container):
+        self._container = container
+        self.id = container.id
+
+    async def read(self, **kwargs):
+        return await asyncio.to_thread(self._container.read, **kwargs)
+
+    async def read_item(self, item, partition_key, **kwargs):
+        return await asyncio.to_thread(self._container.read_item, item, partition_key, **kwargs)
+
+    async def create_item(self, body, **kwargs):
+        return await asyncio.to_thread(self._container.create_item, body, **kwargs)
+
+    async def upsert_item(self, body, **kwargs):
+        return await asyncio.to_thread(self._container.upsert_item, body, **kwargs)
+
+    async def replace_item(self, item, body, **kwargs):
+        return await asyncio.to_thread(self._container.replace_item, item, body, **kwargs)
+
+    async def delete_item(self, item, partition_key, **kwargs):
+        return await asyncio.to_thread(self._container.delete_item, item, partition_key, **kwargs)
+
+    def query_items(self, query, parameters=None, partition_key=None, max_item_count=None, **kwargs):
+        return _AsyncItemPaged(self._container.query_items(
+            query, parameters=parameters, partition_key=partition_key, max_item_count=max_item_count, **kwargs))
+
+    async def get_throughput(self, **kwargs):
+        if not self._container.throughput:
+            raise _error(exceptions.CosmosResourceNotFoundError, 404, "No throughput offer on the container")
+        return SimpleNamespace(offer_throughput=self._container.throughput, auto_scale_max_throughput=None)
+
+
+class AsyncLocalDatabase:
+
+    def __init__(self, database):
+        self._database = database
+        self.id = database.id
+
+    def get_container_client(self, container):
+        return AsyncLocalContainer(self._database.get_container_client(container))
+
+    async def create_container(self, id, partition_key, indexing_policy=None, **kwargs):
+        kwargs.pop("offer_throughput", None)
+        return AsyncLocalContainer(await asyncio.to_thread(
+            self._database.create_container, id, partition_key, indexing_policy=indexing_policy, **kwargs))
+
+    async def create_container_if_not_exists(self, id, partition_key, indexing_policy=None, **kwargs):
+        kwargs.pop("offer_throughput", None)
+        return AsyncLocalContainer(await asyncio.to_thread(
+            self._database.create_container_if_not_exists, id, partition_key,
+            indexing_policy=indexing_policy, **kwargs))
+
+    async def delete_container(self, container):
+        container_id = container if isinstance(container, str) else container.id
+        await asyncio.to_thread(self._database.delete_container, container_id)
+
+
+class AsyncLocalCosmosClient:
+    """Drop-in for azure.cosmos.aio.CosmosClient over the databases of a LocalCosmosClient."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def get_database_client(self, database):
+        return AsyncLocalDatabase(self._client.get_database_client(database))
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
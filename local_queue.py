@@ -0,0 +1,127 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+# In-process stand-in for the subset of the Queue SDK the staged pipeline uses.
+# Messages become invisible when received and reappear after the visibility
+# timeout unless deleted, like Azure Storage queues.
+
+
+class QueueMessage:
+
+    def __init__(self, content):
+        self.id = uuid.uuid4().hex
+        self.content = content
+        self.inserted_on = datetime.now(timezone.utc)
+        self.dequeue_count = 0
+        self.pop_receipt = None
+        self.visible_at = 0.0
+
+
+class QueueProperties(dict):
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class LocalQueueClient:
+
+    def __init__(self, service, queue_name):
+        self._service = service
+        self.queue_name = queue_name
+
+    def _queue(self):
+        queue = self._service._queues.get(self.queue_name)
+        if queue is None:
+            raise ResourceNotFoundError(f"Queue {self.queue_name} not found")
+        return queue
+
+    def create_queue(self, **kwargs):
+        with self._service._lock:
+            if self.queue_name in self._service._queues:
+                raise ResourceExistsError(f"Queue {self.queue_name} already exists")
+            self._service._queues[self.queue_name] = OrderedDict()
+
+    def send_message(self, content, visibility_timeout=None, **kwargs):
+        self._service._tick("sent")
+        message = QueueMessage(content)
+        message.visible_at = time.monotonic() + (visibility_timeout or 0)
+        with self._service._lock:
+            self._queue()[message.id] = message
+            self._service.stats["bytes_sent"] += len(content)
+        return message
+
+    def receive_messages(self, messages_per_page=None, visibility_timeout=30, max_messages=None, **kwargs):
+        self._service._tick("received")
+        limit = max_messages or messages_per_page or 1
+        now = time.monotonic()
+        received = []
+        with self._service._lock:
+            for message in self._queue().values():
+                if len(received) >= limit:
+                    break
+                if message.visible_at <= now:
+                    message.dequeue_count += 1
+                    message.pop_receipt = uuid.uuid4().hex
+                    message.visible_at = now + visibility_timeout
+                    received.append(message)
+        return received
+
+    def delete_message(self, message, pop_receipt=None, **kwargs):
+        self._service._tick("deleted")
+        message_id = getattr(message, "id", message)
+        pop_receipt = pop_receipt or getattr(message, "pop_receipt", None)
+        with self._service._lock:
+            queue = self._queue()
+            stored = queue.get(message_id)
+            if stored is None or stored.pop_receipt != pop_receipt:
+                raise ResourceNotFoundError(f"Message {message_id} not found or receipt expired")
+            del queue[message_id]
+
+    def peek_messages(self, max_messages=1, **kwargs):
+        now = time.monotonic()
+        with self._service._lock:
+            return [message for message in self._queue().values() if message.visible_at <= now][:max_messages]
+
+    def get_queue_properties(self, **kwargs):
+        with self._service._lock:
+            return QueueProperties(name=self.queue_name, approximate_message_count=len(self._queue()))
+
+    def clear_messages(self, **kwargs):
+        with self._service._lock:
+            self._queue().clear()
+
+
+class InMemoryQueueServiceClient:
+    """Drop-in for QueueServiceClient; queues live for the life of the process."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.stats = {"requests": 0, "sent": 0, "received": 0, "deleted": 0, "bytes_sent": 0}
+        self._queues = {}
+        self._lock = threading.RLock()
+
+    def _tick(self, action):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats[action] += 1
+
+    def get_queue_client(self, queue, **kwargs):
+        return LocalQueueClient(self, queue)
+
+    def create_queue(self, name, **kwargs):
+        queue_client = self.get_queue_client(name)
+        queue_client.create_queue()
+        return queue_client
+
+    def list_queues(self, **kwargs):
+        with self._lock:
+            return [QueueProperties(name=name) for name in sorted(self._queues)]
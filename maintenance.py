@@ -0,0 +1,243 @@
+import os
+import json
+import logging
+from azure.cosmos import PartitionKey, exceptions
+from async_db_utils import (open_database, open_container, container_name, get_partition_key_path,
+                            delete_items, DEFAULT_CONCURRENCY)
+from clients import get_blob_service_client, get_cosmos_container
+from cosmos_bulk import RU_BUDGET
+from db_utils import get_bulk_writer
+import records
+import prose_store
+import lease
+
+DEDUPE_CHECKPOINT_PATH = "dedupe_checkpoint.json"
+
+# Above this many documents dropping and recreating the container is cheaper than deleting items
+RECREATE_THRESHOLD = int(os.environ.get("COSMOS_PURGE_RECREATE_THRESHOLD", "50000"))
+ARCHIVE_LEASE_WAIT = int(os.environ.get("ARCHIVE_LEASE_WAIT_SECONDS", "30"))
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as checkpoint_file:
+            return json.load(checkpoint_file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path, checkpoint):
+    # Write then rename so a crash never leaves a half-written checkpoint behind
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, path)
+
+
+def _field_selector(partition_key_path):
+    return "c" + "".join(f'["{part}"]' for part in partition_key_path.strip('/').split('/'))
+
+
+def _item_with_partition_key(item, partition_key_path):
+    # Rebuild the nested partition key field so delete_items can resolve it
+    document = {"id": item['id']}
+    target = document
+    parts = partition_key_path.strip('/').split('/')
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    target[parts[-1]] = item.get('pk')
+    return document
+
+
+async def _delete_copies(container, items, partition_key_path, concurrency, ru_budget):
+    return await delete_items(
+        container, [_item_with_partition_key(item, partition_key_path) for item in items],
+        partition_key_path=partition_key_path, concurrency=concurrency, ru_budget=ru_budget)
+
+
+async def remove_duplicate_tweets(checkpoint_path=DEDUPE_CHECKPOINT_PATH, page_size=1000,
+                                  concurrency=DEFAULT_CONCURRENCY, ru_budget=RU_BUDGET):
+    """Delete all but the most recent copy of every tweet id, resumably.
+
+    Items are scanned in id order, so copies of an id are adjacent and only
+    the current group is held in memory. Progress is checkpointed by the last
+    fully processed id after each page.
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    last_id = checkpoint.get('last_id', "")
+    scanned = checkpoint.get('scanned', 0)
+    duplicates_found = checkpoint.get('duplicates_found', 0)
+    total_removed = checkpoint.get('removed', 0)
+    if last_id:
+        logging.info(f"Resuming duplicate removal after id {last_id}")
+
+    async with open_container() as container:
+        partition_key_path = await get_partition_key_path(container)
+        query = (f"SELECT c.id, c._ts, {_field_selector(partition_key_path)} AS pk FROM c "
+                 "WHERE c.id > @last_id ORDER BY c.id")
+        pages = container.query_items(
+            query=query, parameters=[{"name": "@last_id", "value": last_id}],
+            max_item_count=page_size).by_page()
+
+        group = []
+        async for page in pages:
+            to_delete = []
+            async for item in page:
+                scanned += 1
+                if group and item['id'] != group[0]['id']:
+                    if len(group) > 1:
+                        duplicates_found += 1
+                        to_delete.extend(_stale_copies(group))
+                    last_id = group[0]['id']
+                    group = []
+                group.append(item)
+
+            if to_delete:
+                stats = await _delete_copies(container, to_delete, partition_key_path, concurrency, ru_budget)
+                total_removed += stats['succeeded'] + stats['not_found']
+                if stats['failed']:
+                    # Leave the checkpoint where it was so the failed groups are retried
+                    logging.error(f"{stats['failed']} deletes failed; stopping so the run can be resumed")
+                    return total_removed
+
+            save_checkpoint(checkpoint_path, {
+                'last_id': last_id, 'scanned': scanned,
+                'duplicates_found': duplicates_found, 'removed': total_removed})
+            logging.info(f"Scanned {scanned} items, removed {total_removed} duplicates so far")
+
+        if len(group) > 1:
+            duplicates_found += 1
+            stats = await _delete_copies(container, _stale_copies(group), partition_key_path,
+                                         concurrency, ru_budget)
+            total_removed += stats['succeeded'] + stats['not_found']
+
+    logging.info(f"Total items scanned: {scanned}")
+    logging.info(f"Total duplicate groups found: {duplicates_found}")
+    logging.info(f"Total duplicate items removed: {total_removed}")
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return total_removed
+
+
+def _stale_copies(group):
+    # Keep the most recently written copy (highest _ts)
+    group = sorted(group, key=lambda item: item['_ts'], reverse=True)
+    logging.info(f"Found {len(group)} copies of tweet ID: {group[0]['id']}")
+    return group[1:]
+
+
+async def _count_items(container):
+    async for count in container.query_items(query="SELECT VALUE COUNT(1) FROM c"):
+        return count
+    return 0
+
+
+async def _recreate_container(database, container, properties):
+    try:
+        throughput = await container.get_throughput()
+        offer_throughput = throughput if throughput.auto_scale_max_throughput else throughput.offer_throughput
+    except exceptions.CosmosResourceNotFoundError:
+        # Throughput is provisioned on the database and shared
+        offer_throughput = None
+
+    logging.info(f"Recreating container {properties['id']}")
+    await database.delete_container(properties['id'])
+    await database.create_container(
+        id=properties['id'],
+        partition_key=PartitionKey(path=properties['partitionKey']['paths'],
+                                   kind=properties['partitionKey'].get('kind', 'Hash'),
+                                   version=properties['partitionKey'].get('version', 2)),
+        indexing_policy=properties.get('indexingPolicy'),
+        default_ttl=properties.get('defaultTtl'),
+        unique_key_policy=properties.get('uniqueKeyPolicy'),
+        conflict_resolution_policy=properties.get('conflictResolutionPolicy'),
+        analytical_storage_ttl=properties.get('analyticalStorageTtl'),
+        offer_throughput=offer_throughput)
+
+
+async def purge_container(strategy="auto", concurrency=DEFAULT_CONCURRENCY, ru_budget=RU_BUDGET):
+    """Remove every document, either item by item or by recreating the container.
+
+    strategy is "delete", "recreate" or "auto" (recreate above RECREATE_THRESHOLD items).
+    """
+    async with open_database() as database:
+        container = database.get_container_client(container_name())
+        properties = await container.read()
+        partition_key_path = properties['partitionKey']['paths'][0]
+        count = await _count_items(container)
+        logging.info(f"Container {properties['id']} holds {count} documents "
+                     f"(partition key {partition_key_path})")
+
+        if strategy == "recreate" or (strategy == "auto" and count >= RECREATE_THRESHOLD):
+            await _recreate_container(database, container, properties)
+            return count
+
+        async def items():
+            query = f"SELECT c.id, {_field_selector(partition_key_path)} AS pk FROM c"
+            async for item in container.query_items(query=query, max_item_count=1000):
+                yield _item_with_partition_key(item, partition_key_path)
+
+        stats = await delete_items(container, items(), partition_key_path=partition_key_path,
+                                   concurrency=concurrency, ru_budget=ru_budget)
+        return stats['succeeded'] + stats['not_found']
+
+
+def reseed_from_blob(blob_name='tweets_data.json', blob_container='tweetdata', ru_budget=RU_BUDGET):
+    blob_client = get_blob_service_client().get_blob_client(
+        container=blob_container, blob=blob_name)
+    tweets_data = json.loads(blob_client.download_blob().readall())
+    logging.info(f"Loaded {len(tweets_data)} tweets from blob {blob_name}")
+
+    unique_tweets = {tweet['id']: tweet for tweet in tweets_data}
+    result = get_bulk_writer(ru_budget=ru_budget).upsert(list(unique_tweets.values()))
+    logging.info(f"Reseeded {result.succeeded} tweets "
+                 f"({result.failed} failed, {result.request_charge:.1f} RU)")
+    return result
+
+
+def migrate_records(page_size=100, ru_budget=RU_BUDGET):
+    """Rewrite Cosmos documents from older schema versions in the current one.
+
+    Migrated documents drop out of the query's filter, so an interrupted run
+    picks up where it stopped when started again.
+    """
+    query = ("SELECT * FROM c WHERE NOT IS_DEFINED(c.schema_version) "
+             "OR c.schema_version < @schema_version")
+    if prose_store.is_enabled():
+        # Records migrated while the prose store was off still carry their prose inline
+        query += " OR IS_DEFINED(c.sentiment.explanation) OR IS_DEFINED(c.social_responsibility.response)"
+    pages = get_cosmos_container().query_items(
+        query=query, parameters=[{"name": "@schema_version", "value": records.SCHEMA_VERSION}],
+        enable_cross_partition_query=True, max_item_count=page_size).by_page()
+    writer = get_bulk_writer(ru_budget=ru_budget)
+    migrated = failed = 0
+    request_charge = 0.0
+    for page in pages:
+        result = writer.upsert([prose_store.externalize(records.migrate(item)) for item in page])
+        migrated += result.succeeded
+        failed += result.failed
+        request_charge += result.request_charge
+        logging.info(f"Migrated {migrated} documents so far")
+    logging.info(f"Migrated {migrated} documents to schema version {records.SCHEMA_VERSION} "
+                 f"({failed} failed, {request_charge:.1f} RU)")
+    return migrated
+
+
+def migrate_archive(blob_name='tweets_data.json', blob_container='tweetdata'):
+    """Rewrite the blob archive in the current schema with its prose out of line.
+
+    Saves migrate the archive as they go but leave prose inline, to keep polls
+    from uploading the prose of every old record at once.
+    """
+    blob_client = get_blob_service_client().get_blob_client(
+        container=blob_container, blob=blob_name)
+    with lease.single_flight("archive", wait=ARCHIVE_LEASE_WAIT) as archive_lease:
+        if archive_lease is None:
+            raise RuntimeError("The archive is locked by a running poll; try again shortly")
+        data = blob_client.download_blob().readall()
+        tweets_data = [prose_store.externalize(records.normalize(tweet)) for tweet in json.loads(data)]
+        serialized = json.dumps(tweets_data, separators=(",", ":"))
+        lease.check()
+        blob_client.upload_blob(serialized, overwrite=True)
+    logging.info(f"Migrated {len(tweets_data)} archived tweets: {len(data)} -> {len(serialized)} bytes")
+    return len(tweets_data)
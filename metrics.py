@@ -0,0 +1,164 @@
+import time
+import threading
+from collections import defaultdict, deque
+import tracing
+
+# In-process counters and gauges rendered in Prometheus text format by the
+# /metrics route. Module state lives as long as the worker, so values accumulate
+# across warm invocations and reset on a cold start (Prometheus handles that
+# for counters via rate()).
+PREFIX = "elontracker_"
+RATE_WINDOW_SECONDS = 60
+
+METRICS = {
+    "tweets_fetched_total": ("counter", "Tweets returned by the Twitter timeline endpoint"),
+    "tweets_enriched_total": ("counter", "Tweets that completed enrichment"),
+    "tweets_skipped_total": ("counter", "Fetched tweets dropped before enrichment, by reason"),
+    "llm_calls_total": ("counter", "OpenAI completions by pipeline stage"),
+    "llm_tokens_total": ("counter", "OpenAI tokens by pipeline stage and kind"),
+    "cosmos_request_charge_total": ("counter", "Cosmos DB request units consumed by operation"),
+    "cosmos_throttled_total": ("counter", "Cosmos DB requests throttled with 429"),
+    "blob_bytes_total": ("counter", "Blob storage bytes by direction"),
+    "cache_requests_total": ("counter", "Cache lookups by cache and result"),
+    "polls_skipped_total": ("counter", "Timer ticks that found another poll holding the lease"),
+    "lease_handoffs_total": ("counter", "Extra polls run for ticks handed over by overlapping invocations"),
+    "tweets_fetched_per_minute": ("gauge", "Tweets fetched in the last minute"),
+    "tweets_enriched_per_minute": ("gauge", "Tweets enriched in the last minute"),
+    "cache_hit_ratio": ("gauge", "Hits over lookups since the worker started"),
+    "rate_limit_remaining": ("gauge", "Remaining quota reported by the API's rate-limit headers"),
+    "rate_limit_limit": ("gauge", "Quota size reported by the API's rate-limit headers"),
+    "rate_limit_reset_timestamp_seconds": ("gauge", "When the Twitter rate-limit window resets"),
+    "queue_depth": ("gauge", "Messages waiting in a pipeline queue"),
+    "carryover_tweets": ("gauge", "Fetched tweets left for the next run when the time budget ran out"),
+    "last_success_timestamp_seconds": ("gauge", "Unix time of the last successful run of a job"),
+    "stage_duration_seconds": ("summary", "Pipeline stage latency from tracing spans"),
+}
+PER_MINUTE = {"tweets_fetched_total": "tweets_fetched_per_minute",
+              "tweets_enriched_total": "tweets_enriched_per_minute"}
+
+_counters = defaultdict(float)
+_gauges = {}
+_windows = defaultdict(deque)
+_lock = threading.Lock()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += amount
+        if name in PER_MINUTE:
+            now = time.time()
+            _windows[name].append((now, amount))
+            _trim(_windows[name], now)
+
+
+def _trim(window, now):
+    # Also done on every increment, so an unscraped worker does not keep a growing backlog
+    while window and window[0][0] < now - RATE_WINDOW_SECONDS:
+        window.popleft()
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def mark_success(job):
+    set_gauge("last_success_timestamp_seconds", time.time(), job=job)
+
+
+def record_cache(cache, hit):
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def observe_twitter_response(response, endpoint):
+    headers = response.headers
+    for header, metric in (("x-rate-limit-remaining", "rate_limit_remaining"),
+                           ("x-rate-limit-limit", "rate_limit_limit"),
+                           ("x-rate-limit-reset", "rate_limit_reset_timestamp_seconds")):
+        value = headers.get(header)
+        if value is not None:
+            set_gauge(metric, float(value), api="twitter", endpoint=endpoint, quota="requests")
+
+
+def observe_openai_response(response):
+    """httpx response hook for the OpenAI client."""
+    headers = response.headers
+    for quota in ("requests", "tokens"):
+        remaining = headers.get(f"x-ratelimit-remaining-{quota}")
+        limit = headers.get(f"x-ratelimit-limit-{quota}")
+        if remaining is not None:
+            set_gauge("rate_limit_remaining", float(remaining), api="openai", endpoint="chat", quota=quota)
+        if limit is not None:
+            set_gauge("rate_limit_limit", float(limit), api="openai", endpoint="chat", quota=quota)
+
+
+def _value(value):
+    return str(int(value)) if float(value).is_integer() else repr(round(float(value), 9))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for name, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def snapshot():
+    """Counters and gauges (including derived ones) as {name: [(labels, value)]}."""
+    now = time.time()
+    series = defaultdict(list)
+    with _lock:
+        for (name, labels), value in _counters.items():
+            series[name].append((labels, value))
+        for (name, labels), value in _gauges.items():
+            series[name].append((labels, value))
+        for name, window in _windows.items():
+            _trim(window, now)
+            series[PER_MINUTE[name]].append(((), sum(amount for _, amount in window)))
+        lookups = defaultdict(lambda: [0.0, 0.0])
+        for (name, labels), value in _counters.items():
+            if name == "cache_requests_total":
+                label_map = dict(labels)
+                lookups[label_map["cache"]][label_map["result"] == "hit"] += value
+        for cache, (misses, hits) in lookups.items():
+            series["cache_hit_ratio"].append(((("cache", cache),), hits / (hits + misses)))
+    return series
+
+
+def render():
+    lines = []
+    series = snapshot()
+    for name, (metric_type, description) in METRICS.items():
+        if name == "stage_duration_seconds":
+            continue
+        if not series.get(name):
+            continue
+        lines.append(f"# HELP {PREFIX}{name} {description}")
+        lines.append(f"# TYPE {PREFIX}{name} {metric_type}")
+        for labels, value in sorted(series[name]):
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {_value(value)}")
+
+    stages = tracing.stage_summaries()
+    if stages:
+        name = f"{PREFIX}stage_duration_seconds"
+        lines.append(f"# HELP {name} {METRICS['stage_duration_seconds'][1]}")
+        lines.append(f"# TYPE {name} summary")
+        for stage, summary in stages.items():
+            for quantile, label in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99")):
+                value = summary[f"{quantile}_ms"] / 1000
+                lines.append(f'{name}{{stage="{stage}",quantile="{label}"}} {_value(value)}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {_value(summary["total_s"])}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {summary["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _windows.clear()
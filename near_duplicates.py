@@ -0,0 +1,185 @@
+import os
+import re
+import json
+import struct
+import hashlib
+import logging
+import functools
+import threading
+from collections import OrderedDict, defaultdict
+from nltk.tokenize import word_tokenize
+from enrichment import STAGE_MODELS, DONE
+import metrics
+
+# Near-duplicate index for reusing model analyses across repeated content.
+# Tweets are tokenized the way the content analyzer does it (links dropped,
+# lowercased), shingled into word pairs and MinHashed; LSH banding finds
+# candidates among the WINDOW most recently analyzed tweets that share the same
+# referenced tweets and images. A candidate whose estimated Jaccard similarity
+# reaches THRESHOLD donates its sentiment and responsibility analyses.
+NUM_PERM = 64
+BANDS = 16  # 16 bands of 4 rows: pairs at 0.9 similarity collide with probability > 0.99
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 2
+THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+WINDOW = int(os.environ.get("NEAR_DUPLICATE_WINDOW", "5000"))
+# Stage -> the tweet field holding its analysis
+REUSABLE = {"sentiment": "sentiment", "responsibility": "social_responsibility"}
+
+# Each 64-byte BLAKE2b digest yields 16 independent 32-bit hash values; one salt per 16 permutations
+_SALTS = [index.to_bytes(16, "big") for index in range(NUM_PERM // 16)]
+_ROW = struct.Struct(">16I")
+_URL = re.compile(r"https?://\S+")
+
+_entries = OrderedDict()  # tweet id -> {"signature", "bands", "analyses"}
+_buckets = defaultdict(set)  # band key -> tweet ids
+_seeded = False
+_lock = threading.Lock()
+
+
+def shingles(text):
+    tokens = [token.lower() for token in word_tokenize(_URL.sub(" ", text))]
+    if len(tokens) < SHINGLE_SIZE:
+        return {tuple(tokens)} if tokens else set()
+    return {tuple(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def _hashes(shingle):
+    data = " ".join(shingle).encode("utf-8")
+    values = ()
+    for salt in _SALTS:
+        values += _ROW.unpack(hashlib.blake2b(data, digest_size=64, salt=salt).digest())
+    return values
+
+
+def signature(shingle_set):
+    return tuple(map(min, zip(*(_hashes(shingle) for shingle in shingle_set))))
+
+
+@functools.lru_cache(maxsize=256)
+def fingerprint(text):
+    """MinHash signature of a tweet's text, or None when it has no tokens (cached: each
+    tweet is checked for every reusable stage and then indexed)."""
+    shingle_set = shingles(text)
+    return signature(shingle_set) if shingle_set else None
+
+
+def similarity(first, second):
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERM
+
+
+def context_key(tweet_data):
+    """Analyses are only shared between tweets with the same referenced tweets and images."""
+    references = sorted((ref.get("type"), ref["id"]) for ref in tweet_data.get("referenced_tweets") or [])
+    context = json.dumps([references, sorted(tweet_data.get("image_urls") or [])])
+    return hashlib.blake2b(context.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _band_keys(tweet_data, tweet_signature):
+    context = context_key(tweet_data)
+    return [(context, band, tweet_signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+def _analyses(tweet_data):
+    status = tweet_data.get("enrichment") or {}
+    analyses = {}
+    for stage, field in REUSABLE.items():
+        state = status.get(stage) or {}
+        if field in tweet_data and state.get("status") == DONE and state.get("model") == STAGE_MODELS[stage]:
+            analyses[stage] = tweet_data[field]
+    return analyses
+
+
+def remember(tweet_data):
+    """Index a tweet's finished analyses, evicting the oldest entries beyond WINDOW."""
+    try:
+        return _remember(tweet_data)
+    except Exception as e:
+        logging.warning(f"Could not index tweet {tweet_data.get('id')} for near-duplicate reuse: {str(e)}")
+        return False
+
+
+def _remember(tweet_data):
+    analyses = _analyses(tweet_data)
+    if not analyses:
+        return False
+    tweet_signature = fingerprint(tweet_data["text"])
+    if tweet_signature is None:
+        return False
+    bands = _band_keys(tweet_data, tweet_signature)
+    with _lock:
+        _forget(tweet_data["id"])
+        _entries[tweet_data["id"]] = {"signature": tweet_signature, "bands": bands, "analyses": analyses}
+        for band in bands:
+            _buckets[band].add(tweet_data["id"])
+        while len(_entries) > WINDOW:
+            _forget(next(iter(_entries)))
+    return True
+
+
+def _forget(tweet_id):
+    entry = _entries.pop(tweet_id, None)
+    if entry is None:
+        return
+    for band in entry["bands"]:
+        _buckets[band].discard(tweet_id)
+        if not _buckets[band]:
+            del _buckets[band]
+
+
+def reuse(tweet_data, stage):
+    """Copy `stage`'s analysis from a near-duplicate onto the tweet; returns the provenance or None."""
+    if stage not in REUSABLE:
+        return None
+    try:
+        tweet_signature = fingerprint(tweet_data["text"])
+    except Exception as e:
+        # The stage then runs its model call as usual
+        logging.warning(f"Could not fingerprint tweet {tweet_data.get('id')}: {str(e)}")
+        return None
+    if tweet_signature is None:
+        return None
+    best_id, best_similarity = None, 0.0
+    with _lock:
+        candidates = set()
+        for band in _band_keys(tweet_data, tweet_signature):
+            candidates.update(_buckets.get(band, ()))
+        candidates.discard(tweet_data["id"])
+        for candidate in candidates:
+            entry = _entries[candidate]
+            if stage not in entry["analyses"]:
+                continue
+            score = similarity(tweet_signature, entry["signature"])
+            if score >= THRESHOLD and score > best_similarity:
+                best_id, best_similarity = candidate, score
+        if best_id is None:
+            metrics.record_cache(f"near_duplicate_{stage}", False)
+            return None
+        tweet_data[REUSABLE[stage]] = json.loads(json.dumps(_entries[best_id]["analyses"][stage]))
+    metrics.record_cache(f"near_duplicate_{stage}", True)
+    logging.info(f"Reusing {stage} of tweet {best_id} for near-duplicate {tweet_data['id']} "
+                 f"(similarity {best_similarity:.2f})")
+    return {"tweet_id": best_id, "similarity": round(best_similarity, 3)}
+
+
+def ensure_seeded(load_archive):
+    """Fill an empty index from the newest archived tweets once per worker (cold start)."""
+    global _seeded
+    with _lock:
+        if _seeded:
+            return
+        _seeded = True
+    try:
+        for tweet_data in load_archive()[-WINDOW:]:
+            _remember(tweet_data)
+    except Exception as e:
+        logging.warning(f"Stopped seeding the near-duplicate index: {str(e)}")
+    logging.info(f"Near-duplicate index seeded with {len(_entries)} tweets")
+
+
+def clear():
+    global _seeded
+    with _lock:
+        _entries.clear()
+        _buckets.clear()
+        _seeded = False
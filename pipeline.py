@@ -0,0 +1,144 @@
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from azure.core.exceptions import ResourceNotFoundError
+from clients import ensure_queue, ensure_blob_container
+from tracing import span
+import metrics
+
+# Staged pipeline: the timer fetches and enqueues one message per tweet on the
+# enrich queue, queue-triggered workers enrich and forward to the persist
+# queue, and the persister writes in batches. PIPELINE_MODE=inline keeps the
+# original single-invocation flow.
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "inline").lower()
+ENRICH_QUEUE = os.environ.get("ENRICH_QUEUE_NAME", "tweets-enrich")
+PERSIST_QUEUE = os.environ.get("PERSIST_QUEUE_NAME", "tweets-persist")
+PERSIST_BATCH_SIZE = int(os.environ.get("PERSIST_BATCH_SIZE", "32"))  # 32 is the receive maximum
+VISIBILITY_TIMEOUT = int(os.environ.get("QUEUE_VISIBILITY_TIMEOUT", "300"))
+MAX_DEQUEUE_COUNT = 5  # host.json default; the Functions host poisons after this many attempts
+# Inline runs that hit their time budget park the remaining payloads here for the next run
+CARRYOVER_CONTAINER = "tweetdata"
+CARRYOVER_BLOB = "carryover.json"
+
+
+def is_queued():
+    return PIPELINE_MODE == "queued"
+
+
+def enrichment_messages(tweets_response):
+    """One self-contained payload per tweet: the tweet plus only the media it references."""
+    includes_media = tweets_response.get('includes', {}).get('media', [])
+    media_by_key = {media['media_key']: media for media in includes_media}
+    messages = []
+    for tweet in tweets_response.get('data', []):
+        media_keys = tweet.get('attachments', {}).get('media_keys', [])
+        messages.append({"tweet": tweet,
+                         "media": [media_by_key[key] for key in media_keys if key in media_by_key]})
+    return messages
+
+
+def newest_first(payloads):
+    """Drop duplicate tweets and order newest first, so a short budget spends itself on fresh ones."""
+    by_id = {payload["tweet"]["id"]: payload for payload in payloads}
+    return sorted(by_id.values(), key=lambda payload: int(payload["tweet"]["id"]), reverse=True)
+
+
+def load_carryover():
+    blob_client = ensure_blob_container(CARRYOVER_CONTAINER).get_blob_client(CARRYOVER_BLOB)
+    try:
+        payloads = json.loads(blob_client.download_blob().readall())
+    except ResourceNotFoundError:
+        return []
+    if payloads:
+        logging.info(f"Resuming {len(payloads)} tweets carried over from an earlier run")
+    return payloads
+
+
+def save_carryover(payloads):
+    blob_client = ensure_blob_container(CARRYOVER_CONTAINER).get_blob_client(CARRYOVER_BLOB)
+    blob_client.upload_blob(json.dumps(payloads), overwrite=True)
+    metrics.set_gauge("carryover_tweets", len(payloads))
+
+
+def enqueue(queue_name, payloads):
+    if not payloads:
+        return 0
+    queue_client = ensure_queue(queue_name)
+    with span("queue.enqueue", queue=queue_name) as enqueue_span:
+        size = 0
+        for payload in payloads:
+            body = json.dumps(payload)
+            size += len(body)
+            queue_client.send_message(body)
+        enqueue_span.set(size=size, messages=len(payloads))
+    logging.info(f"Enqueued {len(payloads)} messages on {queue_name}")
+    record_depth(queue_name)
+    return len(payloads)
+
+
+def record_depth(queue_name):
+    try:
+        depth = ensure_queue(queue_name).get_queue_properties().approximate_message_count
+    except ResourceNotFoundError:
+        depth = 0
+    metrics.set_gauge("queue_depth", depth, queue=queue_name)
+    return depth
+
+
+def receive(queue_name, max_messages=1, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Receive up to max_messages as (message, payload) pairs."""
+    queue_client = ensure_queue(queue_name)
+    messages = queue_client.receive_messages(max_messages=max_messages, visibility_timeout=visibility_timeout)
+    return [(message, json.loads(message.content)) for message in messages]
+
+
+def delete(queue_name, messages):
+    queue_client = ensure_queue(queue_name)
+    for message in messages:
+        try:
+            queue_client.delete_message(message)
+        except ResourceNotFoundError:
+            # Visibility expired and another worker picked it up; it will be handled again
+            logging.warning(f"Message {message.id} on {queue_name} was already released")
+
+
+def _poison(queue_name, message, payload):
+    enqueue(f"{queue_name}-poison", [payload])
+    delete(queue_name, [message])
+    logging.error(f"Moved message {message.id} to {queue_name}-poison after {message.dequeue_count} attempts")
+
+
+def process_queue(queue_name, handler, batch_size=1, workers=1, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Drain a queue in-process, the way the queue triggers would (local runs and benchmarks).
+
+    `handler` gets a list of payloads; messages are deleted when it returns and
+    left to reappear after the visibility timeout when it raises.
+    """
+    handled = 0
+
+    def run(batch):
+        try:
+            handler([payload for _, payload in batch])
+        except Exception as e:
+            logging.error(f"Handler for {queue_name} failed: {str(e)}")
+            for message, payload in batch:
+                if message.dequeue_count >= MAX_DEQUEUE_COUNT:
+                    _poison(queue_name, message, payload)
+            return 0
+        delete(queue_name, [message for message, _ in batch])
+        return len(batch)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batches = []
+            for _ in range(workers):
+                batch = receive(queue_name, batch_size, visibility_timeout)
+                if not batch:
+                    break
+                batches.append(batch)
+            if not batches:
+                break
+            handled += sum(executor.map(run, batches))
+    record_depth(queue_name)
+    return handled
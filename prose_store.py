@@ -0,0 +1,82 @@
+import os
+import hashlib
+import logging
+import functools
+import threading
+from azure.core.exceptions import ResourceExistsError
+from clients import ensure_blob_container
+import metrics
+
+# Side-car store for model prose. The sentiment explanation and the social
+# responsibility response are most of a record's bytes but are only read when a
+# single tweet is shown, so records keep a content address ("sha256:<hex>") and
+# the text lives in one blob per distinct piece of prose. Identical prose (reused
+# near-duplicate analyses, repeated stock answers) is stored once.
+# PROSE_STORE=inline keeps the text in the records.
+PROSE_STORE = os.environ.get("PROSE_STORE", "blob").lower()
+PROSE_CONTAINER = os.environ.get("PROSE_CONTAINER_NAME", "tweetprose")
+# Record section -> field moved out of line (stored next to it as <field>_ref)
+PROSE_FIELDS = {"sentiment": "explanation", "social_responsibility": "response"}
+
+_written = set()  # refs this worker knows are stored, to skip the upload
+_lock = threading.Lock()
+
+
+def is_enabled():
+    return PROSE_STORE == "blob"
+
+
+def _blob_name(ref):
+    digest = ref.split(":", 1)[1]
+    return f"{digest[:2]}/{digest}.txt"
+
+
+def put(text):
+    ref = f"sha256:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+    with _lock:
+        if ref in _written:
+            return ref
+    data = text.encode("utf-8")
+    try:
+        ensure_blob_container(PROSE_CONTAINER).get_blob_client(_blob_name(ref)).upload_blob(data, overwrite=False)
+        metrics.inc("blob_bytes_total", len(data), direction="upload")
+    except ResourceExistsError:
+        pass  # same content, already stored
+    with _lock:
+        _written.add(ref)
+    return ref
+
+
+@functools.lru_cache(maxsize=1024)
+def get(ref):
+    data = ensure_blob_container(PROSE_CONTAINER).get_blob_client(_blob_name(ref)).download_blob().readall()
+    metrics.inc("blob_bytes_total", len(data), direction="download")
+    return data.decode("utf-8")
+
+
+def externalize(record):
+    """Move the record's prose into the store, leaving refs; a no-op when the store is off."""
+    if not is_enabled():
+        return record
+    for section, name in PROSE_FIELDS.items():
+        block = record.get(section)
+        if block and name in block:
+            text = block.pop(name)
+            if text:
+                block[f"{name}_ref"] = put(text)
+    return record
+
+
+def resolve(record):
+    """Copy of the record with its prose loaded back inline (for display)."""
+    resolved = dict(record)
+    for section, name in PROSE_FIELDS.items():
+        block = record.get(section)
+        if block and block.get(f"{name}_ref"):
+            block = dict(block)
+            try:
+                block[name] = get(block[f"{name}_ref"])
+            except Exception as e:
+                logging.warning(f"Could not load {section} prose for tweet {record.get('id')}: {str(e)}")
+            resolved[section] = block
+    return resolved
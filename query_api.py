@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import fields
+from datetime import datetime, timezone
+from azure.cosmos import exceptions
+from clients import get_cosmos_container, get_partition_key_path
+from aggregates import get_aggregates, combine_aggregates
+from records import TweetRecord, tweet_url
+import prose_store
+import metrics
+
+# Read path behind the HTTP query endpoints. Every query projects only the fields
+# asked for and reads one bounded page; serialized responses are kept in an
+# in-process LRU per scope ("tweets", "aggregates") until the scope is
+# invalidated by a write on this worker or CACHE_TTL passes (writes on other
+# workers). The ETag is a hash of the body, so it matches across workers.
+CACHE_SIZE = int(os.environ.get("API_CACHE_SIZE", "256"))
+CACHE_TTL = int(os.environ.get("API_CACHE_TTL_SECONDS", "60"))
+PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", "25"))
+MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", "100"))
+
+# Fields rebuilt for responses rather than stored (the compact schema dropped them)
+DERIVED_FIELDS = {"url": lambda tweet: tweet_url(tweet["id"])}
+TWEET_FIELDS = [f.name for f in fields(TweetRecord)] + list(DERIVED_FIELDS)
+DEFAULT_FIELDS = ["id", "text", "created_at", "author_id", "url", "hashtags", "sentiment",
+                  "social_responsibility"]
+GRANULARITIES = ("hour", "day")
+
+_cache = {}  # scope -> OrderedDict of key -> (stored_at, etag, body)
+_generations = defaultdict(int)  # bumped by invalidate(), so a load racing a write is not kept
+_lock = threading.Lock()
+
+
+class QueryError(ValueError):
+    """A request parameter that cannot be served; reported to the caller as a 400."""
+
+
+def parse_fields(value):
+    if not value:
+        return DEFAULT_FIELDS
+    requested = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in TWEET_FIELDS]
+    if unknown:
+        raise QueryError(f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [name for name in dict.fromkeys(requested) if name != "id"]
+
+
+def parse_timestamp(value, name):
+    """ISO 8601 time as the created_at format stored with tweets, so the strings compare in order."""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise QueryError(f"{name} must be an ISO 8601 time")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc)
+    return f"{moment:%Y-%m-%dT%H:%M:%S}.{moment.microsecond // 1000:03d}Z"
+
+
+def parse_page_size(value):
+    if not value:
+        return PAGE_SIZE
+    try:
+        page_size = int(value)
+    except ValueError:
+        raise QueryError("page_size must be an integer")
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise QueryError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    return page_size
+
+
+def _stored(fields):
+    return [name for name in fields if name not in DERIVED_FIELDS]
+
+
+def _with_derived(tweet, fields=None):
+    for name, derive in DERIVED_FIELDS.items():
+        if fields is None or name in fields:
+            tweet[name] = derive(tweet)
+    return tweet
+
+
+def _query_key(fields, parameters):
+    return hashlib.sha256(json.dumps([fields, parameters]).encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(query_key, last_row):
+    # Keyset position of the last row served: pages stay stable across partitions and writes
+    data = json.dumps({"q": query_key, "created_at": last_row["created_at"], "id": last_row["id"]})
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, query_key):
+    # A cursor only continues the query it came from; other filters or fields are rejected
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise QueryError("cursor is not valid")
+    if not isinstance(data, dict) or data.get("q") != query_key or not {"created_at", "id"} <= data.keys():
+        raise QueryError("cursor does not belong to this query")
+    return data["created_at"], data["id"]
+
+
+def list_tweets(author_id=None, since=None, until=None, fields=None, page_size=PAGE_SIZE, cursor=None):
+    """One page of tweets, newest first, created in [since, until), with the next page's cursor."""
+    fields = fields or DEFAULT_FIELDS
+    conditions = []
+    parameters = []
+    if author_id:
+        conditions.append("c.author_id = @author_id")
+        parameters.append({"name": "@author_id", "value": author_id})
+    if since:
+        conditions.append("c.created_at >= @since")
+        parameters.append({"name": "@since", "value": since})
+    if until:
+        conditions.append("c.created_at < @until")
+        parameters.append({"name": "@until", "value": until})
+    query_key = _query_key(fields, parameters)
+    if cursor:
+        # Ties on created_at are broken by id, matching the ORDER BY
+        after_created_at, after_id = decode_cursor(cursor, query_key)
+        conditions.append("(c.created_at < @after_created_at "
+                          "OR (c.created_at = @after_created_at AND c.id < @after_id))")
+        parameters = parameters + [{"name": "@after_created_at", "value": after_created_at},
+                                   {"name": "@after_id", "value": after_id}]
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    # created_at is always read for the cursor and dropped again when it was not asked for
+    projection = ", ".join(f"c.{name}" for name in dict.fromkeys(_stored(fields) + ["created_at"]))
+    query = (f"SELECT TOP {page_size + 1} {projection} FROM c "
+             f"{where}ORDER BY c.created_at DESC, c.id DESC")
+
+    # With tweets partitioned by account, an account's listing stays in one partition
+    partition_key = author_id if author_id and get_partition_key_path() == "/author_id" else None
+    rows = list(get_cosmos_container().query_items(
+        query=query, parameters=parameters, enable_cross_partition_query=True,
+        partition_key=partition_key))
+    next_cursor = encode_cursor(query_key, rows[page_size - 1]) if len(rows) > page_size else None
+    rows = rows[:page_size]
+    for row in rows:
+        if "created_at" not in fields:
+            row.pop("created_at", None)
+        _with_derived(row, fields)
+    return {"tweets": rows, "next_cursor": next_cursor}
+
+
+def get_tweet(tweet_id, fields=None):
+    """A single tweet with its prose loaded inline, or None."""
+    if get_partition_key_path() == "/id":
+        try:
+            tweet = get_cosmos_container().read_item(item=tweet_id, partition_key=tweet_id)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+        if fields:
+            tweet = {name: tweet[name] for name in _stored(fields) if name in tweet}
+    else:
+        projection = ", ".join(f"c.{name}" for name in _stored(fields)) if fields else "*"
+        items = list(get_cosmos_container().query_items(
+            query=f"SELECT {projection} FROM c WHERE c.id = @id",
+            parameters=[{"name": "@id", "value": tweet_id}], enable_cross_partition_query=True))
+        if not items:
+            return None
+        tweet = items[0]
+    tweet = {key: value for key, value in tweet.items() if not key.startswith("_")}
+    return _with_derived(prose_store.resolve(tweet), fields)
+
+
+def aggregate_summary(granularity="day", start=None, end=None):
+    """Period summaries in [start, end), newest first, and their combination."""
+    if granularity not in GRANULARITIES:
+        raise QueryError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    periods = get_aggregates(granularity, start, end)
+    return {"granularity": granularity, "periods": periods, "overall": combine_aggregates(periods)}
+
+
+def etag(body):
+    return f'"{hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def cached(scope, key, load):
+    """(etag, body) for `key`, calling `load` on a miss; a load returning None is cached as not found."""
+    now = time.monotonic()
+    with _lock:
+        entries = _cache.setdefault(scope, OrderedDict())
+        entry = entries.get(key)
+        if entry is not None and now - entry[0] < CACHE_TTL:
+            entries.move_to_end(key)
+            metrics.record_cache(f"api_{scope}", True)
+            return entry[1], entry[2]
+        generation = _generations[scope]
+    metrics.record_cache(f"api_{scope}", False)
+    result = load()
+    body = None if result is None else json.dumps(result, separators=(",", ":"))
+    entry = (now, etag(body) if body is not None else None, body)
+    with _lock:
+        if _generations[scope] != generation:
+            return entry[1], entry[2]
+        entries = _cache.setdefault(scope, OrderedDict())
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > CACHE_SIZE:
+            entries.popitem(last=False)
+    return entry[1], entry[2]
+
+
+def invalidate(scope=None):
+    """Drop cached responses for `scope`, or for every scope."""
+    with _lock:
+        for name in list(_cache) if scope is None else [scope]:
+            _cache.pop(name, None)
+            _generations[name] += 1
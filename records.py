@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field, fields, asdict
+
+# Stored tweet record, shared by the blob archive and the Cosmos container.
+# Version 1 is everything written before the schema was versioned: it carried a
+# url derivable from the id and a sentiment block repeating the tweet id, the
+# tweet text and the whole prompt context. Version 2 keeps only what is not
+# derivable. Version 3 lets the model prose (sentiment explanation and
+# responsibility response) live out of line in the prose store, leaving a
+# content-address in explanation_ref / response_ref. migrate() upgrades older
+# records on read or in maintenance runs.
+SCHEMA_VERSION = 3
+
+
+def tweet_url(tweet_id):
+    return f"https://x.com/i/web/status/{tweet_id}"
+
+
+@dataclass(slots=True)
+class ReferencedTweet:
+    type: str
+    id: str
+    text: str = ""
+    image_url: str = ""
+    image_description: str = ""
+
+
+@dataclass(slots=True)
+class Sentiment:
+    sentiment_score: float
+    explanation: str = None
+    explanation_ref: str = None
+    key_factors: list = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class SocialResponsibility:
+    rating: int
+    response: str = None
+    response_ref: str = None
+
+
+@dataclass(slots=True)
+class TweetRecord:
+    id: str
+    text: str
+    created_at: str
+    author_id: str
+    image_urls: list = field(default_factory=list)
+    image_descriptions: list = field(default_factory=list)
+    referenced_tweets: list = field(default_factory=list)
+    # Analyses stay None (and are left out of the stored document) until their stage succeeds
+    keywords: list = None
+    hashtags: list = None
+    named_entities: list = None
+    sentiment: Sentiment = None
+    social_responsibility: SocialResponsibility = None
+    enrichment: dict = None
+    enrichment_pending: bool = True
+    schema_version: int = SCHEMA_VERSION
+
+    @classmethod
+    def from_dict(cls, data):
+        record = _build(cls, data)
+        record.referenced_tweets = [_build(ReferencedTweet, ref) for ref in record.referenced_tweets]
+        if record.sentiment is not None:
+            record.sentiment = _build(Sentiment, record.sentiment)
+        if record.social_responsibility is not None:
+            record.social_responsibility = _build(SocialResponsibility, record.social_responsibility)
+        record.schema_version = SCHEMA_VERSION
+        return record
+
+    def to_dict(self):
+        record = _without_none(asdict(self))
+        for name in ("sentiment", "social_responsibility"):
+            if name in record:
+                record[name] = _without_none(record[name])
+        return record
+
+
+def _without_none(data):
+    return {key: value for key, value in data.items() if value is not None}
+
+
+def _build(cls, data):
+    # Unknown keys (removed fields, Cosmos system properties) are dropped
+    return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
+
+
+def is_current(data):
+    return data.get("schema_version") == SCHEMA_VERSION
+
+
+def migrate(data):
+    """Rebuild a record of any version in the current schema, dropping fields it no longer keeps.
+
+    Freshly enriched records go through here too, which strips the prompt context
+    and other copies the analyzers return.
+    """
+    if "enrichment" not in data:
+        # Imported here so the dashboard can use this module without the analyzers
+        import enrichment
+        data = dict(data, enrichment=enrichment.infer_status(data))
+        data["enrichment_pending"] = bool(enrichment.stages_to_run(data))
+    return TweetRecord.from_dict(data).to_dict()
+
+
+def normalize(data):
+    """Current-schema form of a record; records already at SCHEMA_VERSION come back unchanged."""
+    return data if is_current(data) else migrate(data)
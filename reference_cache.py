@@ -0,0 +1,91 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from azure.cosmos import exceptions
+from clients import get_meta_container
+from utils import VISION_MODEL, IMAGE_ERROR_PREFIX
+import metrics
+
+# Resolved referenced tweets (text, image url, image description), cached in two
+# tiers: an in-process LRU shared by every tweet this worker enriches, and a
+# "ref-<id>" document per tweet in the meta container that survives restarts.
+# Entries record the vision model that described the image and are ignored once
+# that model changes.
+LRU_SIZE = int(os.environ.get("REFERENCE_CACHE_SIZE", "1024"))
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+
+
+def reference_id(tweet_id):
+    return f"ref-{tweet_id}"
+
+
+def _usable(entry):
+    return entry is not None and entry.get("model") == VISION_MODEL
+
+
+def _cacheable(ref_data):
+    # Failed lookups and failed image descriptions are retried, not remembered
+    if ref_data.get("error") or not ref_data.get("text"):
+        return False
+    if ref_data["image_url"] and not ref_data["image_description"]:
+        return False
+    return not ref_data["image_description"].startswith(IMAGE_ERROR_PREFIX)
+
+
+def _remember(tweet_id, entry):
+    with _lock:
+        _lru[tweet_id] = entry
+        _lru.move_to_end(tweet_id)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def get(tweet_id):
+    """The cached lookup result for `tweet_id`, or None on a miss in both tiers."""
+    with _lock:
+        entry = _lru.get(tweet_id)
+        if _usable(entry):
+            _lru.move_to_end(tweet_id)
+    metrics.record_cache("reference_memory", _usable(entry))
+    if _usable(entry):
+        return entry
+
+    document_id = reference_id(tweet_id)
+    try:
+        entry = get_meta_container().read_item(item=document_id, partition_key=document_id)
+    except exceptions.CosmosResourceNotFoundError:
+        entry = None
+    except exceptions.CosmosHttpResponseError as e:
+        logging.warning(f"Could not read cached reference {tweet_id}: {str(e)}")
+        entry = None
+    metrics.record_cache("reference_store", _usable(entry))
+    if not _usable(entry):
+        return None
+    _remember(tweet_id, entry)
+    return entry
+
+
+def put(tweet_id, ref_data):
+    """Cache a successful lookup in both tiers; failures are left uncached."""
+    if not _cacheable(ref_data):
+        return False
+    entry = {"id": reference_id(tweet_id), "type": "referenced_tweet", "tweet_id": tweet_id,
+             "text": ref_data["text"], "image_url": ref_data["image_url"],
+             "image_description": ref_data["image_description"], "model": VISION_MODEL,
+             "cached_at": datetime.now(timezone.utc).isoformat()}
+    _remember(tweet_id, entry)
+    try:
+        get_meta_container().upsert_item(body=entry)
+    except exceptions.CosmosHttpResponseError as e:
+        logging.warning(f"Could not store cached reference {tweet_id}: {str(e)}")
+    return True
+
+
+def clear():
+    """Empty the in-process tier (tests and benchmarks)."""
+    with _lock:
+        _lru.clear()
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import threading
+import streamlit as st
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aggregates import get_aggregates, combine_aggregates  # noqa: E402
+from clients import get_cosmos_container  # noqa: E402
+from prose_store import resolve  # noqa: E402
+
+# Data access for the dashboard. Loaders ask Cosmos only for the fields a view
+# shows and keep results for CACHE_TTL seconds, so a rerun costs a few small
+# reads instead of the whole archive blob plus a SELECT * over the corpus.
+PAGE_SIZE = int(os.environ.get("DASHBOARD_PAGE_SIZE", "25"))
+CACHE_TTL = int(os.environ.get("DASHBOARD_CACHE_TTL_SECONDS", "60"))
+RECENT_LIMIT = int(os.environ.get("DASHBOARD_RECENT_LIMIT", "50"))
+
+# Fields behind a tweet card; prose comes from the prose store when a card is drawn
+CARD_FIELDS = ["id", "text", "created_at", "author_id", "image_urls", "image_descriptions",
+               "referenced_tweets", "keywords", "hashtags", "named_entities", "sentiment",
+               "social_responsibility"]
+# Table column -> Cosmos path
+TABLE_COLUMNS = {"id": "c.id", "created_at": "c.created_at", "text": "c.text",
+                 "sentiment_score": "c.sentiment.sentiment_score",
+                 "responsibility_rating": "c.social_responsibility.rating"}
+
+
+def _query(query, parameters=None, page_size=None):
+    return get_cosmos_container().query_items(
+        query=query, parameters=parameters or [], enable_cross_partition_query=True,
+        max_item_count=page_size)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def tweet_page(after=None, page_size=PAGE_SIZE):
+    """One page of the tweet table, newest first, as (rows, position to pass for the next page or None).
+
+    Pages by keyset (the created_at and id of the previous page's last row), which
+    stays correct across partitions where a continuation token may not.
+    """
+    columns = ", ".join(f"{path} AS {name}" for name, path in TABLE_COLUMNS.items())
+    where, parameters = "", []
+    if after:
+        where = "WHERE c.created_at < @created_at OR (c.created_at = @created_at AND c.id < @id) "
+        parameters = [{"name": "@created_at", "value": after[0]}, {"name": "@id", "value": after[1]}]
+    rows = list(_query(f"SELECT TOP {page_size + 1} {columns} FROM c {where}"
+                       "ORDER BY c.created_at DESC, c.id DESC", parameters))
+    if len(rows) <= page_size:
+        return rows, None
+    last = rows[page_size - 1]
+    return rows[:page_size], (last["created_at"], last["id"])
+
+
+class _RecentTweets:
+
+    def __init__(self):
+        self.tweets = {}
+        self.last_ts = None
+        self.refreshed = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        fields = ", ".join(f"c.{name}" for name in CARD_FIELDS + ["_ts"])
+        if self.last_ts is None:
+            changed = _query(f"SELECT TOP {RECENT_LIMIT} {fields} FROM c ORDER BY c.created_at DESC")
+        else:
+            # Only documents written since the last refresh: new tweets and re-enriched ones
+            changed = _query(f"SELECT TOP {RECENT_LIMIT} {fields} FROM c WHERE c._ts >= @ts ORDER BY c._ts DESC",
+                             [{"name": "@ts", "value": self.last_ts}])
+        for tweet in changed:
+            self.tweets[tweet["id"]] = tweet
+            self.last_ts = max(self.last_ts or 0, tweet["_ts"])
+        newest = sorted(self.tweets.values(), key=lambda tweet: tweet["created_at"], reverse=True)
+        self.tweets = {tweet["id"]: tweet for tweet in newest[:RECENT_LIMIT]}
+        self.refreshed = time.monotonic()
+
+
+@st.cache_resource
+def _recent_tweets():
+    return _RecentTweets()
+
+
+def recent_tweets(limit=5):
+    """The newest tweets with their card fields, refreshed incrementally every CACHE_TTL seconds."""
+    feed = _recent_tweets()
+    with feed.lock:
+        if time.monotonic() - feed.refreshed >= CACHE_TTL:
+            feed.refresh()
+        newest = sorted(feed.tweets.values(), key=lambda tweet: tweet["created_at"], reverse=True)
+    return newest[:limit]
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def tweet_with_prose(tweet):
+    return resolve(tweet)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def overall_aggregates(granularity="day"):
+    return combine_aggregates(get_aggregates(granularity))
@@ -1,33 +1,34 @@
 import os
-from azure.cosmos import CosmosClient
+import sys
+import asyncio
+import argparse
+import logging
 from dotenv import load_dotenv
 
+logging.basicConfig(level=logging.INFO)
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Cosmos DB configuration
-endpoint = os.getenv("COSMOS_DB_ENDPOINT")
-key = os.getenv("COSMOS_DB_KEY")
-database_name = os.getenv("COSMOS_DB_DATABASE_NAME")
-container_name = os.getenv("COSMOS_DB_CONTAINER_NAME")
-
-# Initialize the Cosmos client
-client = CosmosClient(endpoint, key)
-database = client.get_database_client(database_name)
-container = database.get_container_client(container_name)
-
-
-def delete_all_documents():
-    query = "SELECT c.id, c.author_id FROM c"
-    items = list(container.query_items(
-        query=query,
-        enable_cross_partition_query=True
-    ))
-
-    for item in items:
-        container.delete_item(item=item['id'], partition_key=item['author_id'])
-        print(f"Deleted document with id: {item['id']}")
+# Run from the repository root so the shared data-access modules are importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from maintenance import purge_container, reseed_from_blob  # noqa: E402
 
 
 if __name__ == "__main__":
-    delete_all_documents()
+    parser = argparse.ArgumentParser(description="Purge the tweets container and optionally reload it.")
+    parser.add_argument("--strategy", choices=["auto", "delete", "recreate"], default="auto")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--ru-budget", type=float, default=None,
+                        help="RU/s the purge and reseed may consume (default: COSMOS_RU_BUDGET or unlimited)")
+    parser.add_argument("--reseed", action="store_true",
+                        help="Reload every tweet from the archive blob after purging")
+    parser.add_argument("--blob-name", default="tweets_data.json")
+    args = parser.parse_args()
+
+    budget = {"ru_budget": args.ru_budget} if args.ru_budget else {}
+    removed = asyncio.run(purge_container(strategy=args.strategy, concurrency=args.concurrency, **budget))
+    print(f"Purged {removed} documents")
+    if args.reseed:
+        result = reseed_from_blob(blob_name=args.blob_name, **budget)
+        print(f"Reseeded {result.succeeded} documents using {result.request_charge:.1f} RU")
@@ -0,0 +1,90 @@
+import sys
+import heapq
+import bisect
+import logging
+from array import array
+from azure.core.exceptions import ResourceNotFoundError
+from clients import ensure_blob_container
+import metrics
+
+# Sorted ids of every tweet in the archive, stored next to it as packed
+# little-endian unsigned 64-bit integers (8 bytes a tweet). Polls drop tweets
+# found here before any API or model call, and saves keep it in step with the
+# archive. The archive itself stays authoritative: a missing or unreadable index
+# is rebuilt from it.
+INDEX_CONTAINER = "tweetdata"
+INDEX_BLOB = "tweets_data.ids"
+
+
+class SeenIndex:
+
+    def __init__(self, ids=(), rebuilt=False):
+        self.ids = array("Q", sorted({int(tweet_id) for tweet_id in ids}))
+        self.rebuilt = rebuilt  # built from the archive and not stored yet
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, tweet_id):
+        tweet_id = int(tweet_id)
+        position = bisect.bisect_left(self.ids, tweet_id)
+        return position < len(self.ids) and self.ids[position] == tweet_id
+
+    def add(self, tweet_ids):
+        new_ids = sorted({int(tweet_id) for tweet_id in tweet_ids if tweet_id not in self})
+        if new_ids:
+            self.ids = array("Q", heapq.merge(self.ids, new_ids))
+        return len(new_ids)
+
+    def to_bytes(self):
+        ids = array("Q", self.ids)
+        if sys.byteorder == "big":
+            ids.byteswap()
+        return ids.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        index = cls()
+        index.ids.frombytes(data)
+        if sys.byteorder == "big":
+            index.ids.byteswap()
+        return index
+
+
+def _blob_client():
+    return ensure_blob_container(INDEX_CONTAINER).get_blob_client(INDEX_BLOB)
+
+
+def load(rebuild_from=None):
+    """Load the index; when it is missing or corrupt, rebuild it from `rebuild_from()` (the archive).
+
+    A rebuilt index is only kept in memory; the caller holding the archive lease stores it.
+    """
+    try:
+        data = _blob_client().download_blob().readall()
+        if len(data) % 8 == 0:
+            return SeenIndex.from_bytes(data)
+        logging.warning(f"Seen-id index has {len(data)} bytes, not a whole number of ids")
+    except ResourceNotFoundError:
+        logging.info("No seen-id index yet")
+    if rebuild_from is None:
+        return SeenIndex()
+    index = SeenIndex((tweet['id'] for tweet in rebuild_from()), rebuilt=True)
+    logging.info(f"Rebuilt the seen-id index from the archive with {len(index)} ids")
+    return index
+
+
+def save(index):
+    data = index.to_bytes()
+    _blob_client().upload_blob(data, overwrite=True)
+    index.rebuilt = False
+    metrics.inc("blob_bytes_total", len(data), direction="upload")
+
+
+def unseen(payloads, index):
+    """Drop payloads whose tweet is already in the index."""
+    fresh = [payload for payload in payloads if payload["tweet"]["id"] not in index]
+    if len(fresh) < len(payloads):
+        metrics.inc("tweets_skipped_total", len(payloads) - len(fresh), reason="seen")
+        logging.info(f"Skipping {len(payloads) - len(fresh)} tweets that are already archived")
+    return fresh
@@ -0,0 +1,30 @@
+import pytest
+from azure.cosmos import PartitionKey
+import clients
+
+
+@pytest.fixture
+def cosmos(monkeypatch):
+    monkeypatch.setattr(clients, "MANAGE_INDEXING_POLICY", True)
+    clients.reset_clients()
+    _, cosmos_client = clients.use_local_storage("memory")
+    yield cosmos_client
+    clients.reset_clients()
+
+
+def test_indexing_policy_keeps_other_container_settings(cosmos):
+    cosmos.get_database_client("tweets").create_container(
+        "tweets", partition_key=PartitionKey(path="/author_id"), default_ttl=3600)
+
+    properties = clients.get_cosmos_container().read()
+
+    assert properties["defaultTtl"] == 3600
+    assert clients._policy_paths(properties["indexingPolicy"]) == clients._policy_paths(
+        clients.TWEETS_INDEXING_POLICY)
+
+
+def test_cold_start_reads_container_properties_once(cosmos):
+    container = clients.get_cosmos_container()
+
+    assert clients.get_partition_key_path() == "/id"
+    assert container.stats["requests"] == 1
@@ -0,0 +1,35 @@
+from azure.cosmos import PartitionKey
+from cosmos_bulk import BulkWriter
+from local_cosmos import LocalCosmosClient
+
+
+def make_container():
+    database = LocalCosmosClient().get_database_client("tweets")
+    return database.create_container_if_not_exists("tweets", partition_key=PartitionKey(path="/author_id"))
+
+
+def tweet(tweet_id, author_id="44196397"):
+    return {"id": tweet_id, "author_id": author_id, "text": f"tweet {tweet_id}"}
+
+
+def test_create_writes_the_rest_of_a_batch_with_one_conflict():
+    container = make_container()
+    container.create_item(body=tweet("2"))
+
+    result = BulkWriter(container, "/author_id").create([tweet(str(i)) for i in range(5)])
+
+    assert result.conflicts == 1
+    assert result.succeeded == 4
+    assert result.failed == 0
+    stored = {item["id"] for item in container.query_items("SELECT c.id FROM c", enable_cross_partition_query=True)}
+    assert stored == {"0", "1", "2", "3", "4"}
+
+
+def test_create_counts_every_conflict_once():
+    container = make_container()
+    for tweet_id in ("1", "3"):
+        container.create_item(body=tweet(tweet_id))
+
+    result = BulkWriter(container, "/author_id").create([tweet(str(i)) for i in range(5)])
+
+    assert (result.succeeded, result.conflicts, result.failed) == (3, 2, 0)
@@ -0,0 +1,78 @@
+import pytest
+
+try:
+    import function_app
+    import enrichment
+except LookupError:
+    pytest.skip("NLTK corpora are not installed", allow_module_level=True)
+
+import clients
+import near_duplicates
+import reference_cache
+from fakes import FakeTwitterSession, FakeOpenAIClient, synthetic_timeline
+
+TWEET_COUNT = 3
+
+
+@pytest.fixture(autouse=True)
+def local_storage():
+    clients.reset_clients()
+    clients.use_local_storage("memory")
+    clients.set_client(clients.HTTP_SESSION, FakeTwitterSession(synthetic_timeline("basic", count=TWEET_COUNT)))
+    clients.set_client(clients.OPENAI, FakeOpenAIClient())
+    reference_cache.clear()
+    near_duplicates.clear()
+    yield
+    clients.reset_clients()
+
+
+@pytest.fixture
+def stage_calls(monkeypatch):
+    calls = []
+    for stage, handler in function_app.STAGE_HANDLERS.items():
+        def recording(tweet_data, stage=stage, handler=handler):
+            calls.append(stage)
+            return handler(tweet_data)
+        monkeypatch.setitem(function_app.STAGE_HANDLERS, stage, recording)
+    return calls
+
+
+def stored_tweets():
+    return list(clients.get_cosmos_container().query_items(
+        "SELECT * FROM c", enable_cross_partition_query=True))
+
+
+def test_failed_stage_is_retried_alone_by_reenrichment(monkeypatch, stage_calls):
+    analyze = function_app.advanced_analyze_tweet_content
+
+    def failing(*args, **kwargs):
+        raise RuntimeError("tokenizer unavailable")
+    monkeypatch.setattr(function_app, "advanced_analyze_tweet_content", failing)
+
+    function_app.main()
+
+    tweets = stored_tweets()
+    assert len(tweets) == TWEET_COUNT
+    for tweet in tweets:
+        assert tweet["enrichment"]["content"]["status"] == enrichment.FAILED
+        assert "tokenizer unavailable" in tweet["enrichment"]["content"]["error"]
+        assert tweet["enrichment"]["sentiment"]["status"] == enrichment.DONE
+        assert tweet["enrichment_pending"] is True
+
+    monkeypatch.setattr(function_app, "advanced_analyze_tweet_content", analyze)
+    stage_calls.clear()
+
+    assert function_app.reenrich_tweets() == TWEET_COUNT
+
+    assert stage_calls == ["content"] * TWEET_COUNT
+    for tweet in stored_tweets():
+        assert tweet["enrichment"]["content"]["status"] == enrichment.DONE
+        assert tweet["enrichment"]["content"]["attempts"] == 2
+        assert tweet["enrichment_pending"] is False
+        assert "keywords" in tweet
+
+
+def test_empty_legacy_content_analysis_is_retried():
+    status = enrichment.infer_status({"text": "hello", "keywords": [], "hashtags": [], "named_entities": []})
+
+    assert status["content"]["status"] == enrichment.FAILED
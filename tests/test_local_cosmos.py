@@ -0,0 +1,62 @@
+import pytest
+from azure.cosmos import PartitionKey, exceptions
+from local_cosmos import LocalCosmosClient
+
+
+def make_container(throughput=None):
+    database = LocalCosmosClient(throughput=throughput).get_database_client("tweets")
+    return database.create_container_if_not_exists("tweets", partition_key=PartitionKey(path="/id"))
+
+
+def tweet(tweet_id, created_at="2024-07-01T00:00:00.000Z"):
+    return {"id": tweet_id, "text": f"tweet {tweet_id} " * 50, "created_at": created_at}
+
+
+def test_throttled_point_operations_and_queries_are_retried():
+    container = make_container(throughput=10)
+
+    for i in range(2):
+        container.upsert_item(body=tweet(str(i)))
+    items = list(container.query_items("SELECT c.id FROM c", enable_cross_partition_query=True))
+
+    assert len(items) == 2
+    assert container.stats["throttled"] > 0
+    assert container.stats["throttle_wait_seconds"] > 0
+
+
+def test_throttled_batch_raises_429():
+    container = make_container(throughput=10)
+    container.upsert_item(body=tweet("0"))
+
+    with pytest.raises(exceptions.CosmosHttpResponseError) as raised:
+        container.execute_item_batch(batch_operations=[("upsert", (tweet("1"),))], partition_key="1")
+
+    assert raised.value.status_code == 429
+    assert "x-ms-retry-after-ms" in raised.value.headers
+
+
+def test_failed_batch_is_atomic():
+    container = make_container()
+    container.create_item(body=tweet("1"))
+
+    with pytest.raises(exceptions.CosmosBatchOperationError) as raised:
+        container.execute_item_batch(batch_operations=[("upsert", (dict(tweet("1"), text="new"),)),
+                                                       ("create", (tweet("1"),))], partition_key="1")
+
+    assert [response["statusCode"] for response in raised.value.operation_responses] == [424, 409]
+    assert container.read_item("1", partition_key="1")["text"] == tweet("1")["text"]
+
+
+def test_query_pages_resume_from_continuation_token():
+    container = make_container()
+    for i in range(5):
+        container.upsert_item(body=tweet(str(i), f"2024-07-01T00:0{i}:00.000Z"))
+    query = "SELECT c.id FROM c ORDER BY c.created_at DESC"
+
+    pages = container.query_items(query, enable_cross_partition_query=True, max_item_count=2).by_page()
+    first = list(next(pages))
+    rest = container.query_items(query, enable_cross_partition_query=True,
+                                 max_item_count=2).by_page(pages.continuation_token)
+
+    assert [item["id"] for item in first] == ["4", "3"]
+    assert [item["id"] for page in rest for item in page] == ["2", "1", "0"]
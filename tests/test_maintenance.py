@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from azure.cosmos import PartitionKey
+import clients
+import maintenance
+
+
+@pytest.fixture
+def container(monkeypatch):
+    monkeypatch.setattr(clients, "MANAGE_INDEXING_POLICY", False)
+    clients.reset_clients()
+    _, cosmos_client = clients.use_local_storage("memory")
+    cosmos_client.get_database_client("tweets").create_container(
+        "tweets", partition_key=PartitionKey(path="/author_id"), default_ttl=3600)
+    yield clients.get_cosmos_container()
+    clients.reset_clients()
+
+
+def stored(container):
+    return sorted((item["id"], item["author_id"]) for item in container.query_items(
+        "SELECT c.id, c.author_id FROM c", enable_cross_partition_query=True))
+
+
+def test_remove_duplicate_tweets_keeps_one_copy_per_id(container, tmp_path):
+    # Copies of an id in different partitions are what a partition key change leaves behind
+    for tweet_id, author_id in [("1", "a"), ("1", "b"), ("2", "a"), ("3", "a"), ("3", "b"), ("3", "c")]:
+        container.upsert_item(body={"id": tweet_id, "author_id": author_id, "text": "tweet"})
+
+    removed = asyncio.run(maintenance.remove_duplicate_tweets(
+        checkpoint_path=str(tmp_path / "checkpoint.json"), page_size=2, concurrency=2))
+
+    assert removed == 3
+    assert [tweet_id for tweet_id, _ in stored(container)] == ["1", "2", "3"]
+
+
+@pytest.mark.parametrize("strategy", ["delete", "recreate"])
+def test_purge_container_empties_it_and_keeps_its_settings(container, strategy):
+    for i in range(5):
+        container.upsert_item(body={"id": str(i), "author_id": "a", "text": "tweet"})
+
+    assert asyncio.run(maintenance.purge_container(strategy=strategy, concurrency=2)) == 5
+
+    container = clients.get_cosmos_client().get_database_client("tweets").get_container_client("tweets")
+    assert stored(container) == []
+    assert container.read()["defaultTtl"] == 3600
+    assert container.read()["partitionKey"]["paths"] == ["/author_id"]
+
+
+def test_recreate_keeps_every_container_setting(monkeypatch):
+    monkeypatch.setattr(clients, "MANAGE_INDEXING_POLICY", False)
+    clients.reset_clients()
+    _, cosmos_client = clients.use_local_storage("memory")
+    conflict_resolution_policy = {"mode": "LastWriterWins", "conflictResolutionPath": "/_ts"}
+    cosmos_client.get_database_client("tweets").create_container(
+        "tweets", partition_key=PartitionKey(path="/author_id"),
+        indexing_policy={"indexingMode": "consistent", "includedPaths": [{"path": "/created_at/?"}],
+                         "excludedPaths": [{"path": "/*"}]},
+        default_ttl=3600, conflict_resolution_policy=conflict_resolution_policy, analytical_storage_ttl=-1)
+    container = clients.get_cosmos_container()
+    before = container.read()
+    container.upsert_item(body={"id": "1", "author_id": "a", "text": "tweet"})
+
+    try:
+        assert asyncio.run(maintenance.purge_container(strategy="recreate")) == 1
+        after = clients.get_cosmos_client().get_database_client("tweets").get_container_client("tweets").read()
+    finally:
+        clients.reset_clients()
+
+    assert after == before
+    assert after["conflictResolutionPolicy"] == conflict_resolution_policy
+    assert after["analyticalStorageTtl"] == -1
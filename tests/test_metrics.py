@@ -0,0 +1,14 @@
+import metrics
+
+
+def test_rate_window_is_trimmed_without_a_scrape(monkeypatch):
+    metrics.reset()
+    now = [1000.0]
+    monkeypatch.setattr(metrics.time, "time", lambda: now[0])
+    for _ in range(100):
+        metrics.inc("tweets_fetched_total")
+        now[0] += 1
+
+    assert len(metrics._windows["tweets_fetched_total"]) <= metrics.RATE_WINDOW_SECONDS + 1
+    assert metrics.snapshot()["tweets_fetched_per_minute"] == [((), metrics.RATE_WINDOW_SECONDS)]
+    metrics.reset()
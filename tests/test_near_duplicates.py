@@ -0,0 +1,52 @@
+import pytest
+
+try:
+    import near_duplicates
+    from enrichment import STAGE_MODELS, DONE
+except LookupError:
+    pytest.skip("NLTK corpora are not installed", allow_module_level=True)
+
+
+def analyzed_tweet(tweet_id, text):
+    return {"id": tweet_id, "text": text, "referenced_tweets": [], "image_urls": [],
+            "sentiment": {"sentiment_score": 0.5},
+            "enrichment": {"sentiment": {"status": DONE, "model": STAGE_MODELS["sentiment"]}}}
+
+
+@pytest.fixture(autouse=True)
+def empty_index():
+    near_duplicates.clear()
+    near_duplicates.fingerprint.cache_clear()
+    yield
+    near_duplicates.clear()
+    near_duplicates.fingerprint.cache_clear()
+
+
+def test_reuse_copies_the_analysis_of_a_near_duplicate():
+    text = "Starship launch went great today and the team made excellent progress on the engines"
+    assert near_duplicates.remember(analyzed_tweet("1", text))
+
+    tweet = {"id": "2", "text": text + " !", "referenced_tweets": [], "image_urls": []}
+    assert near_duplicates.reuse(tweet, "sentiment")["tweet_id"] == "1"
+    assert tweet["sentiment"] == {"sentiment_score": 0.5}
+
+
+def test_tokenizer_failure_falls_back_to_the_model(monkeypatch):
+    text = "Starship launch went great today and the team made excellent progress on the engines"
+    tokenize = near_duplicates.word_tokenize
+
+    def missing_punkt(text):
+        raise LookupError("Resource punkt not found")
+    monkeypatch.setattr(near_duplicates, "word_tokenize", missing_punkt)
+
+    assert near_duplicates.remember(analyzed_tweet("1", text)) is False
+    assert near_duplicates.reuse({"id": "2", "text": text}, "sentiment") is None
+    near_duplicates.ensure_seeded(lambda: [analyzed_tweet("3", text)])
+    assert len(near_duplicates._entries) == 0
+
+    # Nothing was indexed while the tokenizer failed, so a working one finds no match either
+    monkeypatch.setattr(near_duplicates, "word_tokenize", tokenize)
+    near_duplicates.fingerprint.cache_clear()
+    tweet = {"id": "4", "text": text, "referenced_tweets": [], "image_urls": []}
+    assert near_duplicates.reuse(tweet, "sentiment") is None
+    assert "sentiment" not in tweet
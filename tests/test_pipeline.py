@@ -0,0 +1,133 @@
+import pytest
+from azure.cosmos import exceptions
+
+try:
+    import function_app
+except LookupError:
+    pytest.skip("NLTK corpora are not installed", allow_module_level=True)
+
+import clients
+import db_utils
+import pipeline
+import near_duplicates
+import reference_cache
+from fakes import FakeTwitterSession, FakeOpenAIClient, synthetic_timeline, USER_ID
+
+TWEET_COUNT = 20
+NEWEST_CREATED_AT = "2024-07-01T00:19:00.000Z"
+
+
+@pytest.fixture(autouse=True)
+def local_storage():
+    clients.reset_clients()
+    clients.use_local_storage("memory")
+    clients.set_client(clients.HTTP_SESSION, FakeTwitterSession(synthetic_timeline("basic", count=TWEET_COUNT)))
+    clients.set_client(clients.OPENAI, FakeOpenAIClient())
+    reference_cache.clear()
+    near_duplicates.clear()
+    yield
+    clients.reset_clients()
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    monkeypatch.setattr(pipeline, "PIPELINE_MODE", "queued")
+
+
+def stored_watermark():
+    document_id = db_utils.watermark_id(USER_ID)
+    try:
+        return clients.get_meta_container().read_item(item=document_id, partition_key=document_id)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+
+
+def stored_tweet_ids():
+    return set(clients.get_cosmos_container().query_items(
+        "SELECT VALUE c.id FROM c", enable_cross_partition_query=True))
+
+
+def test_queued_poll_hands_tweets_from_enrich_to_persist(queued):
+    function_app.main()
+
+    assert pipeline.record_depth(pipeline.ENRICH_QUEUE) == TWEET_COUNT
+    assert stored_tweet_ids() == set()
+
+    assert function_app.drain_queues() == (TWEET_COUNT, TWEET_COUNT)
+
+    assert pipeline.record_depth(pipeline.ENRICH_QUEUE) == 0
+    assert pipeline.record_depth(pipeline.PERSIST_QUEUE) == 0
+    assert len(stored_tweet_ids()) == TWEET_COUNT
+    archive = function_app.load_from_blob()
+    assert len(archive) == TWEET_COUNT
+    assert all(tweet["enrichment"]["sentiment"]["status"] == "done" for tweet in archive)
+
+
+def test_queued_poll_keeps_watermark_when_enqueue_fails(queued, monkeypatch):
+    def unavailable(queue_name, payloads):
+        raise RuntimeError("queue unavailable")
+    monkeypatch.setattr(pipeline, "enqueue", unavailable)
+
+    with pytest.raises(RuntimeError):
+        function_app.main()
+
+    assert stored_watermark() is None
+
+
+def test_failing_message_is_retried_then_poisoned():
+    pipeline.enqueue(pipeline.ENRICH_QUEUE, [{"tweet": {"id": "1"}, "media": []}])
+    attempts = []
+
+    def failing(payloads):
+        attempts.append(payloads)
+        raise RuntimeError("enrichment failed")
+
+    assert pipeline.process_queue(pipeline.ENRICH_QUEUE, failing, visibility_timeout=0) == 0
+
+    assert len(attempts) == pipeline.MAX_DEQUEUE_COUNT
+    assert pipeline.record_depth(pipeline.ENRICH_QUEUE) == 0
+    assert pipeline.receive(f"{pipeline.ENRICH_QUEUE}-poison")[0][1] == {"tweet": {"id": "1"}, "media": []}
+
+
+def test_transient_failure_is_retried_without_poisoning():
+    pipeline.enqueue(pipeline.PERSIST_QUEUE, [{"id": "1"}])
+    attempts = []
+
+    def flaky(payloads):
+        attempts.append(payloads)
+        if len(attempts) == 1:
+            raise RuntimeError("archive is busy")
+
+    assert pipeline.process_queue(pipeline.PERSIST_QUEUE, flaky, visibility_timeout=0) == 1
+
+    assert len(attempts) == 2
+    assert pipeline.record_depth(pipeline.PERSIST_QUEUE) == 0
+    assert pipeline.record_depth(f"{pipeline.PERSIST_QUEUE}-poison") == 0
+
+
+def test_inline_watermark_advances_only_after_persist(monkeypatch):
+    insert = function_app.insert_tweets_into_db
+    monkeypatch.setattr(function_app, "insert_tweets_into_db", lambda tweets: (0, 0, len(tweets)))
+
+    function_app.main()
+
+    assert stored_watermark() is None
+    assert stored_tweet_ids() == set()
+
+    monkeypatch.setattr(function_app, "insert_tweets_into_db", insert)
+    function_app.main()
+
+    assert stored_watermark()["created_at"] == NEWEST_CREATED_AT
+    assert len(stored_tweet_ids()) == TWEET_COUNT
+
+
+def test_carryover_is_kept_when_inserts_fail(monkeypatch):
+    carried = {"tweet": {"id": "99", "text": "Carried over from an earlier run", "author_id": USER_ID,
+                         "created_at": "2024-06-30T23:00:00.000Z"}, "media": []}
+    pipeline.save_carryover([carried])
+    monkeypatch.setattr(function_app, "insert_tweets_into_db", lambda tweets: (0, 0, len(tweets)))
+
+    function_app.main()
+
+    assert pipeline.load_carryover() == [carried]
+    assert stored_watermark() is None
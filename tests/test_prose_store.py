@@ -0,0 +1,67 @@
+import pytest
+
+import clients
+import maintenance
+import prose_store
+import records
+
+
+@pytest.fixture(autouse=True)
+def local_storage(monkeypatch):
+    monkeypatch.setattr(clients, "MANAGE_INDEXING_POLICY", False)
+    monkeypatch.setattr(prose_store, "PROSE_STORE", "blob")
+    clients.reset_clients()
+    clients.use_local_storage("memory")
+    prose_store._written.clear()
+    prose_store.get.cache_clear()
+    yield
+    clients.reset_clients()
+    prose_store._written.clear()
+    prose_store.get.cache_clear()
+
+
+def record(tweet_id, explanation, response):
+    return {"id": tweet_id, "text": "tweet", "created_at": "2024-07-01T00:00:00.000Z", "author_id": "1",
+            "enrichment": {}, "enrichment_pending": False,
+            "sentiment": {"sentiment_score": 0.5, "explanation": explanation},
+            "social_responsibility": {"rating": 7, "response": response}}
+
+
+def stored_prose():
+    return list(clients.ensure_blob_container(prose_store.PROSE_CONTAINER).list_blobs())
+
+
+def test_identical_prose_is_stored_once_and_resolves_inline():
+    first = prose_store.externalize(record("1", "Upbeat", "Rating: 7"))
+    second = prose_store.externalize(record("2", "Upbeat", "Rating: 7"))
+
+    assert "explanation" not in first["sentiment"]
+    assert first["sentiment"]["explanation_ref"] == second["sentiment"]["explanation_ref"]
+    assert first["social_responsibility"]["response_ref"].startswith("sha256:")
+    assert len(stored_prose()) == 2
+
+    prose_store._written.clear()
+    prose_store.get.cache_clear()
+    resolved = prose_store.resolve(second)
+    assert resolved["sentiment"]["explanation"] == "Upbeat"
+    assert resolved["social_responsibility"]["response"] == "Rating: 7"
+    assert "explanation" not in second["sentiment"]
+
+
+def test_migrate_records_moves_inline_prose_to_refs():
+    container = clients.get_cosmos_container()
+    legacy = record("1", "Upbeat", "Rating: 7")
+    legacy["url"] = records.tweet_url("1")
+    legacy["keywords"] = [["tweet", 1]]
+    legacy["sentiment"]["tweet_id"] = "1"
+    container.upsert_item(body=legacy)
+
+    assert maintenance.migrate_records() == 1
+
+    migrated = container.read_item(item="1", partition_key="1")
+    assert migrated["schema_version"] == records.SCHEMA_VERSION
+    assert "url" not in migrated and "tweet_id" not in migrated["sentiment"]
+    assert "explanation" not in migrated["sentiment"] and "response" not in migrated["social_responsibility"]
+    resolved = prose_store.resolve(migrated)
+    assert resolved["sentiment"]["explanation"] == "Upbeat"
+    assert resolved["social_responsibility"]["response"] == "Rating: 7"
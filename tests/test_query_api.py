@@ -0,0 +1,56 @@
+import pytest
+import clients
+import query_api
+
+
+@pytest.fixture(params=["/author_id", "/id"])
+def tweets(request):
+    clients.reset_clients()
+    clients.use_local_storage("memory", partition_key_path=request.param)
+    container = clients.get_cosmos_container()
+    for i in range(12):
+        # Pairs of tweets share a created_at, so pages must break ties by id
+        container.upsert_item(body={"id": str(100 + i), "author_id": "44196397", "text": f"tweet {i}",
+                                    "created_at": f"2024-07-01T00:{i // 2:02d}:00.000Z"})
+    container.upsert_item(body={"id": "200", "author_id": "12345", "text": "other account",
+                                "created_at": "2024-07-01T00:00:30.000Z"})
+    yield
+    clients.reset_clients()
+
+
+def test_cursor_pages_through_every_tweet_once_newest_first(tweets):
+    ids, cursor = [], None
+    while True:
+        page = query_api.list_tweets(author_id="44196397", fields=["id", "text"], page_size=5, cursor=cursor)
+        assert all(set(row) == {"id", "text"} for row in page["tweets"])
+        ids += [row["id"] for row in page["tweets"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert ids == [str(100 + i) for i in reversed(range(12))]
+
+
+def test_time_range_is_half_open(tweets):
+    page = query_api.list_tweets(since="2024-07-01T00:01:00.000Z", until="2024-07-01T00:02:00.000Z",
+                                 fields=["id"])
+    assert [row["id"] for row in page["tweets"]] == ["103", "102"]
+
+
+def test_cursor_only_continues_its_own_query(tweets):
+    cursor = query_api.list_tweets(author_id="44196397", fields=["id"], page_size=5)["next_cursor"]
+    with pytest.raises(query_api.QueryError):
+        query_api.list_tweets(author_id="12345", fields=["id"], page_size=5, cursor=cursor)
+
+
+def test_get_tweet_projects_fields(tweets):
+    assert query_api.get_tweet("103", ["id", "text"]) == {"id": "103", "text": "tweet 3"}
+    assert query_api.get_tweet("999") is None
+
+
+def test_responses_rebuild_the_tweet_url(tweets):
+    url = "https://x.com/i/web/status/103"
+    assert query_api.get_tweet("103")["url"] == url
+    assert query_api.get_tweet("103", ["id", "url"]) == {"id": "103", "url": url}
+    page = query_api.list_tweets(until="2024-07-01T00:02:00.000Z", page_size=1)
+    assert page["tweets"][0]["url"] == "https://x.com/i/web/status/103"
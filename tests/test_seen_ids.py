@@ -0,0 +1,39 @@
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+
+import clients
+import seen_ids
+
+
+@pytest.fixture(autouse=True)
+def local_storage():
+    clients.reset_clients()
+    clients.use_local_storage("memory")
+    yield
+    clients.reset_clients()
+
+
+def stored_index_exists():
+    try:
+        seen_ids._blob_client().download_blob().readall()
+    except ResourceNotFoundError:
+        return False
+    return True
+
+
+def test_rebuilt_index_is_not_stored_by_load():
+    index = seen_ids.load(rebuild_from=lambda: [{"id": "1"}, {"id": "2"}])
+
+    assert index.rebuilt
+    assert "1" in index and "2" in index
+    assert not stored_index_exists()
+
+
+def test_saved_index_loads_without_rebuild():
+    index = seen_ids.load(rebuild_from=lambda: [{"id": "1"}])
+    seen_ids.save(index)
+
+    assert not index.rebuilt
+    loaded = seen_ids.load(rebuild_from=lambda: pytest.fail("index was rebuilt"))
+    assert not loaded.rebuilt
+    assert "1" in loaded
@@ -0,0 +1,273 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import functools
+import contextvars
+from collections import deque
+
+# Lightweight spans for the polling pipeline.
+#   TRACING_MODE=off    - span()/traced() do nothing beyond one global check
+#   TRACING_MODE=local  - durations, sizes and outcomes go into in-process histograms
+#                         and a per-poll span log (default)
+#   TRACING_MODE=otel   - as local, and also exported as OpenTelemetry spans and
+#                         histograms when opentelemetry-api is installed
+TRACING_MODE = os.environ.get("TRACING_MODE", "local").lower()
+POLL_SPAN_LIMIT = int(os.environ.get("TRACING_POLL_SPAN_LIMIT", "5000"))
+
+# Geometric bucket bounds in seconds: 0.1ms up to ~15 minutes, 20% apart
+BUCKET_BOUNDS = []
+_bound = 0.0001
+while _bound < 900:
+    BUCKET_BOUNDS.append(_bound)
+    _bound *= 1.2
+
+_current = contextvars.ContextVar("tracing_current_span", default=None)
+_histograms = {}
+_poll_spans = deque(maxlen=POLL_SPAN_LIMIT)
+_lock = threading.Lock()
+_enabled = TRACING_MODE != "off"
+_otel_trace = None
+_otel_tracer = None
+_otel_histogram = None
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; memory stays constant however long the worker lives."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sizes = 0
+
+    def observe(self, duration, error=False, size=None):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if error:
+            self.errors += 1
+        if size:
+            self.sizes += size
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        target = fraction * self.count
+        running = 0
+        for index, count in enumerate(self.buckets):
+            running += count
+            if count and running >= target:
+                # Upper bound of the bucket, capped by the largest value actually seen
+                return min(BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_s": round(self.total, 6),
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else None,
+            "p50_ms": _ms(self.percentile(0.50)),
+            "p95_ms": _ms(self.percentile(0.95)),
+            "p99_ms": _ms(self.percentile(0.99)),
+            "max_ms": _ms(self.max),
+            "size_total": self.sizes
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+class Span:
+
+    __slots__ = ("name", "parent", "tweet_id", "attributes", "outcome", "started", "duration", "_otel")
+
+    def __init__(self, name, parent=None, tweet_id=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.tweet_id = tweet_id or (parent.tweet_id if parent else None)
+        self.attributes = attributes or {}
+        self.outcome = "ok"
+        self.started = None
+        self.duration = None
+        self._otel = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error):
+        self.outcome = "error"
+        self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+    def record(self):
+        return {"name": self.name, "parent": self.parent.name if self.parent else None,
+                "tweet_id": self.tweet_id, "duration_ms": _ms(self.duration),
+                "outcome": self.outcome, **self.attributes}
+
+
+class _NoopSpan:
+
+    __slots__ = ()
+    tweet_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def fail(self, error):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class span:
+    """Context manager timing one stage: `with span("blob.save", size=n) as s: ...`."""
+
+    __slots__ = ("_span", "_token")
+
+    def __init__(self, name, tweet_id=None, **attributes):
+        self._span = Span(name, _current.get(), tweet_id, attributes) if _enabled else None
+
+    def __enter__(self):
+        current = self._span
+        if current is None:
+            return _NOOP_SPAN
+        self._token = _current.set(current)
+        if _otel_tracer is not None:
+            parent = current.parent._otel if current.parent else None
+            current._otel = _otel_tracer.start_span(
+                current.name, context=_otel_trace.set_span_in_context(parent) if parent else None)
+        current.started = time.perf_counter()
+        return current
+
+    def __exit__(self, exc_type, exc, traceback):
+        current = self._span
+        if current is None:
+            return False
+        current.duration = time.perf_counter() - current.started
+        _current.reset(self._token)
+        if exc is not None:
+            current.fail(exc)
+        _finish(current)
+        return False
+
+
+def traced(name, size=None):
+    """Decorator form of span(); `size` maps the return value to a byte/item count."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with span(name) as current:
+                result = function(*args, **kwargs)
+                if size is not None:
+                    current.set(size=size(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def current_span():
+    return (_current.get() if _enabled else None) or _NOOP_SPAN
+
+
+def annotate(**attributes):
+    """Attach attributes (token counts, sizes, ...) to the innermost active span."""
+    current_span().set(**attributes)
+
+
+def mark_error(error):
+    """Flag the innermost span as failed when the code handles the exception itself."""
+    current_span().fail(error)
+
+
+def _finish(current):
+    key = current.name
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(current.duration, current.outcome == "error", current.attributes.get("size"))
+        _poll_spans.append(current.record())
+    if current._otel is not None:
+        _export_otel(current)
+
+
+def _export_otel(current):
+    from opentelemetry.trace import Status, StatusCode
+    otel_span = current._otel
+    for name, value in current.attributes.items():
+        if isinstance(value, (str, bool, int, float)):
+            otel_span.set_attribute(name, value)
+    if current.tweet_id:
+        otel_span.set_attribute("tweet.id", current.tweet_id)
+    if current.outcome == "error":
+        otel_span.set_status(Status(StatusCode.ERROR, current.attributes.get("error")))
+    otel_span.end()
+    _otel_histogram.record(current.duration * 1000, {"stage": current.name, "outcome": current.outcome})
+
+
+def configure(mode=None):
+    """Switch tracing mode at runtime (benchmarks, tests); returns the active mode."""
+    global TRACING_MODE, _enabled, _otel_trace, _otel_tracer, _otel_histogram
+    TRACING_MODE = (mode or TRACING_MODE).lower()
+    _enabled = TRACING_MODE != "off"
+    _otel_trace = _otel_tracer = _otel_histogram = None
+    if TRACING_MODE == "otel":
+        try:
+            from opentelemetry import trace, metrics
+        except ImportError:
+            logging.warning("TRACING_MODE=otel but opentelemetry-api is not installed; tracing locally")
+            return TRACING_MODE
+        _otel_trace = trace
+        _otel_tracer = trace.get_tracer("elon_tweet_tracker")
+        _otel_histogram = metrics.get_meter("elon_tweet_tracker").create_histogram(
+            "pipeline.stage.duration", unit="ms", description="Duration of each pipeline stage")
+    return TRACING_MODE
+
+
+def stage_summaries():
+    with _lock:
+        return {name: histogram.summary() for name, histogram in sorted(_histograms.items())}
+
+
+def poll_spans():
+    with _lock:
+        return list(_poll_spans)
+
+
+def start_poll():
+    """Clear the per-poll span log; histograms keep accumulating across warm invocations."""
+    with _lock:
+        _poll_spans.clear()
+
+
+def log_poll_summary():
+    if not _enabled:
+        return
+    spans = poll_spans()
+    totals = {}
+    for record in spans:
+        if record["parent"] is not None and record["name"] != "tweet":
+            stage = totals.setdefault(record["name"], [0, 0.0, 0])
+            stage[0] += 1
+            stage[1] += record["duration_ms"]
+            stage[2] += record["outcome"] == "error"
+    for name, (calls, total_ms, errors) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        logging.info(f"Stage {name}: {calls} calls, {total_ms:.1f} ms total, {errors} errors")
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _poll_spans.clear()
+
+
+configure()
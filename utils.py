@@ -1,7 +1,6 @@
 from collections import Counter
 import logging
 import os
-import openai
 import re
 import json
 import nltk
@@ -9,16 +8,16 @@ from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from nltk import pos_tag, ne_chunk
 from nltk.chunk import tree2conlltags
+from clients import get_openai_client
+from tracing import traced, annotate, mark_error
+import metrics
 
 # Load environment variables from .env file
 
 
-# Retrieve OpenAI API key from environment variables
-openai_api_key = os.environ['OPENAI_API_KEY']
+# The OpenAI client is created on first use from OPENAI_API_KEY (see clients.py)
 logging.info(f"OPEN_AI_KEY configured: {'OPEN_AI_KEY' in os.environ}")
 
-client = openai.Client(api_key=openai_api_key)
-
 # Ensure the stopwords corpus is downloaded
 nltk.download('stopwords', quiet=True)
 nltk.download('punkt', quiet=True)
@@ -28,8 +27,24 @@ nltk.download('words', quiet=True)
 
 stop_words = set(stopwords.words('english'))
 
+TEXT_MODEL = "gpt-4o"
+VISION_MODEL = "gpt-4-vision-preview"
+CONTENT_ANALYZER = f"nltk-{nltk.__version__}"
+IMAGE_ERROR_PREFIX = "Error analyzing image"
+
+
+def _record_usage(completion, stage):
+    metrics.inc("llm_calls_total", stage=stage)
+    usage = getattr(completion, "usage", None)
+    if usage:
+        annotate(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        metrics.inc("llm_tokens_total", usage.prompt_tokens, stage=stage, kind="prompt")
+        metrics.inc("llm_tokens_total", usage.completion_tokens, stage=stage, kind="completion")
+
 
-def advanced_analyze_tweet_content(tweet_text, referenced_text="", verbose=False):
+@traced("nltk.analyze")
+def advanced_analyze_tweet_content(tweet_text, referenced_text="", verbose=False, raise_errors=False):
+    """Keywords, hashtags and named entities; empty lists on failure unless raise_errors is set."""
     if verbose:
         logging.debug(
             f"Analyzing tweet content: {tweet_text} {referenced_text}")
@@ -59,12 +74,16 @@ def advanced_analyze_tweet_content(tweet_text, referenced_text="", verbose=False
         return final_keywords, hashtags, named_entities
 
     except Exception as e:
+        mark_error(e)
         if verbose:
             logging.error(
                 f"An error occurred while analyzing tweet content: {e}")
+        if raise_errors:
+            raise
         return [], [], []
 
 
+@traced("openai.sentiment")
 def analyze_tweet_sentiment(tweet_data, verbose=False):
     if verbose:
         logging.debug(f"Analyzing sentiment for tweet: {tweet_data['id']}")
@@ -97,13 +116,14 @@ def analyze_tweet_sentiment(tweet_data, verbose=False):
         Key factors: [List of key factors]
         """
 
-        completion = client.chat.completions.create(
-            model="gpt-4o",
+        completion = get_openai_client().chat.completions.create(
+            model=TEXT_MODEL,
             messages=[
                 {"role": "system", "content": "You are a sentiment analysis expert specializing in analyzing Elon Musk's tweets."},
                 {"role": "user", "content": prompt}
             ]
         )
+        _record_usage(completion, "sentiment")
 
         response = completion.choices[0].message.content
 
@@ -139,6 +159,7 @@ def analyze_tweet_sentiment(tweet_data, verbose=False):
 
         return result
     except Exception as e:
+        mark_error(e)
         if verbose:
             logging.error(
                 f"An error occurred while analyzing tweet sentiment: {e}")
@@ -148,12 +169,13 @@ def analyze_tweet_sentiment(tweet_data, verbose=False):
         }
 
 
+@traced("openai.vision")
 def analyze_image_with_gpt4o(image_url, verbose=False):
     if verbose:
         logging.debug(f"Analyzing image: {image_url}")
     try:
-        response = client.chat.completions.create(
-            model="gpt-4-vision-preview",
+        response = get_openai_client().chat.completions.create(
+            model=VISION_MODEL,
             messages=[
                 {
                     "role": "user",
@@ -165,6 +187,7 @@ def analyze_image_with_gpt4o(image_url, verbose=False):
             ],
             max_tokens=300,
         )
+        _record_usage(response, "vision")
 
         image_description = response.choices[0].message.content
 
@@ -174,11 +197,13 @@ def analyze_image_with_gpt4o(image_url, verbose=False):
 
         return image_description
     except Exception as e:
+        mark_error(e)
         if verbose:
             logging.error(f"An error occurred while analyzing the image: {e}")
-        return f"Error analyzing image: {str(e)}"
+        return f"{IMAGE_ERROR_PREFIX}: {str(e)}"
 
 
+@traced("openai.responsibility")
 def evaluate_social_responsibility(tweet_data, verbose=False):
     if verbose:
         logging.debug(
@@ -193,8 +218,8 @@ def evaluate_social_responsibility(tweet_data, verbose=False):
             for ref_tweet in tweet_data['referenced_tweets']:
                 content += f"Referenced tweet: {ref_tweet['text']}\n"
 
-        completion = client.chat.completions.create(
-            model="gpt-4o",
+        completion = get_openai_client().chat.completions.create(
+            model=TEXT_MODEL,
             messages=[
                 {
                     "role": "system",
@@ -206,6 +231,7 @@ def evaluate_social_responsibility(tweet_data, verbose=False):
                 },
             ],
         )
+        _record_usage(completion, "responsibility")
         if verbose:
             logging.debug("Social responsibility evaluation complete")
 
@@ -222,6 +248,7 @@ def evaluate_social_responsibility(tweet_data, verbose=False):
 
         return response, rating
     except Exception as e:
+        mark_error(e)
         if verbose:
             logging.error(
                 f"An error occurred while evaluating social responsibility: {e}")